@@ -1 +1,79 @@
 """ The intuis integration """
+from __future__ import annotations
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import (
+    CONF_CLIENT_ID,
+    CONF_CLIENT_SECRET,
+    CONF_PASSWORD,
+    CONF_USERNAME,
+)
+from homeassistant.core import HomeAssistant
+
+from config_flow import COMMAND_QUEUES, DOMAIN, PROBE_RESULTS
+from intuis_command_queue import CommandQueue
+from intuis_latency import CommandTracker
+from intuis_netatmo import IntuisNetatmo
+from intuis_token_store import TokenStore
+
+PLATFORMS = ["climate"]
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up IntuisNetatmo from a config entry."""
+    client = IntuisNetatmo(
+        username=entry.data[CONF_USERNAME],
+        password=entry.data[CONF_PASSWORD],
+        client_id=entry.data[CONF_CLIENT_ID],
+        client_secret=entry.data[CONF_CLIENT_SECRET],
+    )
+
+    # Tokens survive restarts, so setup does not log in again while they are valid
+    client.token_store = TokenStore(hass.config.path(".storage", "intuis_tokens.json"))
+
+    # Time how long commands take to show up in the polled status, see diagnostics
+    client.command_tracker = CommandTracker()
+
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    probe = domain_data.get(PROBE_RESULTS, {}).pop(entry.unique_id, None)
+    if probe:
+        # Reuse the login and topology validated by the config flow
+        await hass.async_add_executor_job(client.set_token, probe["token"])
+        await hass.async_add_executor_job(client.load_homesdata, probe["homesdata"])
+        await hass.async_add_executor_job(client.get_homestatus)
+    else:
+        await hass.async_add_executor_job(client.pull_data)
+
+    # Only climate entities are exposed, so later polls only ask for heaters
+    client.status_device_types = ["NMH"]
+
+    domain_data[entry.entry_id] = client
+
+    # Commands that fail during a cloud outage are kept on disk and replayed
+    command_queue = await hass.async_add_executor_job(
+        CommandQueue,
+        client,
+        hass.config.path(".storage", f"intuis_commands_{client.home_id}.jsonl"),
+    )
+    command_queue.start()
+    domain_data.setdefault(COMMAND_QUEUES, {})[entry.entry_id] = command_queue
+
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    return True
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload a config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload a config entry."""
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unloaded:
+        hass.data[DOMAIN].pop(entry.entry_id, None)
+        command_queue = hass.data[DOMAIN].get(COMMAND_QUEUES, {}).pop(entry.entry_id, None)
+        if command_queue is not None:
+            await hass.async_add_executor_job(command_queue.stop, 5)
+    return unloaded
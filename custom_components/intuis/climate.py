@@ -2,7 +2,8 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 import voluptuous as vol
 
@@ -23,16 +24,40 @@ from homeassistant.const import (
     TEMP_CELSIUS,
     UnitOfTemperature,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import entity_platform
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
 
+from config_flow import (
+    COMMAND_QUEUES,
+    CONF_REQUEST_QUOTA,
+    CONF_TEMPERATURE_DEADBAND,
+    DEFAULT_REQUEST_QUOTA,
+    DOMAIN,
+)
+from intuis_budget import PollPlanner
+from intuis_command_queue import COMMANDS, DROPPED, QUEUED, CommandQueue
 from intuis_netatmo import IntuisNetatmo
 
 _LOGGER = logging.getLogger(__name__)
 
+# How often entities are refreshed from one shared status poll, at most;
+# config entries poll less often if their request quota requires it
+SCAN_INTERVAL = timedelta(seconds=60)
+# Length of the window the request quota applies to
+QUOTA_WINDOW = timedelta(hours=1)
+# How often the watchdog looks for stale rooms to refresh on their own
+WATCHDOG_INTERVAL = timedelta(seconds=60)
+
 # Configuration schema
 CONFIG_SCHEMA = vol.Schema({
     vol.Required(CONF_USERNAME): cv.string,
@@ -79,12 +104,13 @@ async def async_setup_platform(
     )
 
     # Pull initial data
-    client.pull_data()
+    await hass.async_add_executor_job(client.pull_data)
 
-    # Create climate entities for each room
+    # Create climate entities for each room, sharing one status poll
+    coordinator = _create_coordinator(hass, client)
     entities = []
     for room in client.rooms.values():
-        entities.append(IntuisNetatmoClimate(client, room))
+        entities.append(IntuisNetatmoClimate(coordinator, client, room))
 
     async_add_entities(entities)
 
@@ -96,13 +122,115 @@ async def async_setup_platform(
         "async_set_temperature",
     )
 
-class IntuisNetatmoClimate(ClimateEntity):
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up IntuisNetatmo climate entities from a config entry."""
+    # The client has already pulled its data in async_setup_entry
+    client = hass.data[DOMAIN][entry.entry_id]
+    command_queue = hass.data[DOMAIN].get(COMMAND_QUEUES, {}).get(entry.entry_id)
+    deadband = entry.options.get(CONF_TEMPERATURE_DEADBAND, 0.0)
+
+    # The coordinator polls once for the whole home and each entity only
+    # writes its state when something it exposes has changed
+    coordinator = _create_coordinator(hass, client, _plan_scan_interval(client, entry))
+    entities = [
+        IntuisNetatmoClimate(coordinator, client, room, command_queue, deadband=deadband)
+        for room in client.rooms.values()
+    ]
+    async_add_entities(entities)
+
+    async def async_watchdog(now: Optional[datetime] = None) -> None:
+        try:
+            refreshed = await hass.async_add_executor_job(client.refresh_stale)
+        except Exception as err:
+            _LOGGER.warning("Error refreshing stale Intuis devices: %s", err)
+            return
+        if refreshed["rooms"]:
+            _LOGGER.debug("Refreshed stale rooms %s", refreshed["rooms"])
+            # Unlike async_set_updated_data, this does not push back the next poll
+            coordinator.async_update_listeners()
+
+    entry.async_on_unload(async_track_time_interval(hass, async_watchdog, WATCHDOG_INTERVAL))
+
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_SET_TEMPERATURE,
+        SERVICE_SET_TEMPERATURE_SCHEMA,
+        "async_set_temperature",
+    )
+
+def _plan_scan_interval(client: IntuisNetatmo, entry: ConfigEntry) -> timedelta:
+    """Fit polling into the request quota and pace every request of the client to it."""
+    planner = PollPlanner(
+        entry.options.get(CONF_REQUEST_QUOTA, DEFAULT_REQUEST_QUOTA),
+        QUOTA_WINDOW.total_seconds(),
+        min_status_interval=SCAN_INTERVAL.total_seconds(),
+    )
+    # The watchdog retries each stale room at most once per stale_after,
+    # and sends at most one refresh per run
+    refresh_interval = max(
+        WATCHDOG_INTERVAL.total_seconds(),
+        client.stale_after / max(len(client.rooms), 1),
+    )
+    # Commands and refreshes share the quota, so the budget also holds
+    # requests back if the schedule alone is not enough
+    client.budget = planner.budget()
+    try:
+        schedule = planner.plan_client(client, refresh_interval=refresh_interval)
+    except ValueError as err:
+        _LOGGER.error("%s; polling every %s and pacing requests instead", err, SCAN_INTERVAL)
+        return SCAN_INTERVAL
+    _LOGGER.debug("Intuis poll schedule for %s: %s", client.home_name, schedule)
+    return timedelta(seconds=schedule.status_interval)
+
+def _create_coordinator(
+    hass: HomeAssistant, client: IntuisNetatmo, update_interval: timedelta = SCAN_INTERVAL
+) -> DataUpdateCoordinator:
+    """Create the coordinator polling the status of the client's home."""
+
+    async def async_update_data() -> Any:
+        try:
+            await hass.async_add_executor_job(client.get_homestatus)
+        except Exception as err:
+            raise UpdateFailed(f"Error updating Intuis home status: {err}") from err
+        return client.snapshot
+
+    # Status was already pulled during setup, so the first poll is one interval away
+    return DataUpdateCoordinator(
+        hass,
+        _LOGGER,
+        name=f"intuis {client.home_name}",
+        update_method=async_update_data,
+        update_interval=update_interval,
+    )
+
+class IntuisNetatmoClimate(CoordinatorEntity, ClimateEntity):
     """Representation of an IntuisNetatmo climate device."""
 
-    def __init__(self, client: IntuisNetatmo, room: Any) -> None:
-        """Initialize the climate device."""
+    def __init__(
+        self,
+        coordinator: DataUpdateCoordinator,
+        client: IntuisNetatmo,
+        room: Any,
+        command_queue: Optional[CommandQueue] = None,
+        deadband: float = 0.0,
+    ) -> None:
+        """Initialize the climate device.
+
+        The current temperature only changes once the measured temperature
+        has moved by at least deadband degrees, so sensor noise does not
+        cause state writes.
+        """
+        super().__init__(coordinator)
         self._client = client
         self._room = room
+        self._command_queue = command_queue
+        self._deadband = deadband
+        self._reported_temp = room.current_temp
+        self._fingerprint = None
         self._attr_name = room.name
         self._attr_unique_id = f"intuis_netatmo_{room.id}"
         self._attr_temperature_unit = UnitOfTemperature.CELSIUS
@@ -119,7 +247,7 @@ class IntuisNetatmoClimate(ClimateEntity):
     @property
     def current_temperature(self) -> Optional[float]:
         """Return the current temperature."""
-        return self._room.current_temp
+        return self._reported_temp
 
     @property
     def target_temperature(self) -> Optional[float]:
@@ -141,6 +269,91 @@ class IntuisNetatmoClimate(ClimateEntity):
         """Return the current preset mode."""
         return self._room.mode
 
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        """Return trends from the temperature history and data freshness."""
+        history = self._room.history
+        slope = history.slope()
+        time_to_setpoint = history.time_to_setpoint()
+        freshness = self._client.get_device_freshness(self._room)
+        last_seen = self._room.last_seen
+        # Coarse rounding keeps small trend changes from rewriting the state
+        return {
+            "temperature_trend": round(slope, 1) if slope is not None else None,
+            "minutes_to_setpoint": 5 * round(time_to_setpoint / 300) if time_to_setpoint is not None else None,
+            "last_seen": datetime.fromtimestamp(last_seen, timezone.utc).isoformat() if last_seen else None,
+            "stale": freshness["stale"],
+        }
+
+    async def async_added_to_hass(self) -> None:
+        """Listen to the coordinator and remember the state written when added."""
+        await super().async_added_to_hass()
+        self._fingerprint = self._state_fingerprint()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Pick up a new poll, writing the state only if it changed."""
+        self.async_update_from_snapshot()
+
+    def _state_fingerprint(self) -> Tuple:
+        """Return everything the entity exposes, to detect state changes."""
+        return (
+            self.current_temperature,
+            self.target_temperature,
+            self.hvac_mode,
+            self.hvac_action,
+            self.preset_mode,
+            tuple(self.extra_state_attributes.items()),
+        )
+
+    def _set_room(self, room: Any) -> None:
+        """Use a new room state, applying the temperature deadband."""
+        self._room = room
+        temperature = room.current_temp
+        if (
+            temperature is None
+            or self._reported_temp is None
+            or abs(temperature - self._reported_temp) >= self._deadband
+        ):
+            self._reported_temp = temperature
+
+    def _async_write_state_if_changed(self) -> None:
+        """Write the state only if something the entity exposes has changed."""
+        fingerprint = self._state_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self.async_write_ha_state()
+
+    def async_update_from_snapshot(self) -> None:
+        """Pick up the room from the client's latest snapshot."""
+        # Rooms in a snapshot are never modified, so holding on to one
+        # gives every property a consistent view of the same poll
+        self._set_room(self._client.snapshot.rooms.get(self._room.id, self._room))
+        self._async_write_state_if_changed()
+
+    async def _send_command(self, kind: str, **params: Any) -> None:
+        """Send a room command, through the command queue if there is one.
+
+        Raises HomeAssistantError if the queue dropped the command, so the
+        caller does not show a state the API refused.
+        """
+        # Sending and queueing both do blocking I/O, so keep them off the event loop
+        if self._command_queue is None:
+            method = getattr(self._client, COMMANDS[kind][1])
+            await self.hass.async_add_executor_job(lambda: method(self._room.id, **params))
+            return
+        outcome = await self.hass.async_add_executor_job(
+            lambda: self._command_queue.submit(kind, self._room.id, **params)
+        )
+        if outcome == DROPPED:
+            raise HomeAssistantError(f"{kind} for {self._room.name} was not accepted")
+        if outcome == QUEUED:
+            _LOGGER.warning(
+                "Intuis API unavailable, %s for %s queued for retry",
+                kind,
+                self._room.name,
+            )
+
     async def async_set_temperature(self, **kwargs: Any) -> None:
         """Set new target temperature."""
         temperature = kwargs.get(ATTR_TEMPERATURE)
@@ -148,9 +361,9 @@ class IntuisNetatmoClimate(ClimateEntity):
             return
 
         try:
-            self._client.set_room_setpoint(self._room.id, temperature)
-            self._room.target_temp = temperature
-            self.async_write_ha_state()
+            await self._send_command("room_setpoint", temp=temperature)
+            self._set_room(self._client.update_local_room(self._room.id, target_temp=temperature))
+            self._async_write_state_if_changed()
         except Exception as err:
             _LOGGER.error("Error setting temperature: %s", err)
 
@@ -164,15 +377,15 @@ class IntuisNetatmoClimate(ClimateEntity):
         try:
             if mode == "manual":
                 # Set to manual mode with current target temperature
-                self._client.set_room_mode(
-                    self._room.id,
-                    mode,
-                    self._room.target_temp or 20.0
+                await self._send_command(
+                    "room_mode",
+                    mode=mode,
+                    temperature=self._room.target_temp or 20.0,
                 )
             else:
-                self._client.set_room_mode(self._room.id, mode)
-            self._room.mode = mode
-            self.async_write_ha_state()
+                await self._send_command("room_mode", mode=mode)
+            self._set_room(self._client.update_local_room(self._room.id, mode=mode))
+            self._async_write_state_if_changed()
         except Exception as err:
             _LOGGER.error("Error setting HVAC mode: %s", err)
 
@@ -181,26 +394,17 @@ class IntuisNetatmoClimate(ClimateEntity):
         try:
             if preset_mode == "manual":
                 # Set to manual mode with current target temperature
-                self._client.set_room_mode(
-                    self._room.id,
-                    preset_mode,
-                    self._room.target_temp or 20.0
+                await self._send_command(
+                    "room_mode",
+                    mode=preset_mode,
+                    temperature=self._room.target_temp or 20.0,
                 )
+            elif preset_mode == "off":
+                # setroomthermpoint has no "off" mode; it is sent through setstate
+                await self._send_command("room_off")
             else:
-                self._client.set_room_mode(self._room.id, preset_mode)
-            self._room.mode = preset_mode
-            self.async_write_ha_state()
+                await self._send_command("room_mode", mode=preset_mode)
+            self._set_room(self._client.update_local_room(self._room.id, mode=preset_mode))
+            self._async_write_state_if_changed()
         except Exception as err:
             _LOGGER.error("Error setting preset mode: %s", err)
-
-    async def async_update(self) -> None:
-        """Update the state of the climate entity."""
-        try:
-            self._client.get_homestatus()
-            # Find the updated room status
-            for room in self._client.rooms.values():
-                if room.id == self._room.id:
-                    self._room = room
-                    break
-        except Exception as err:
-            _LOGGER.error("Error updating climate entity: %s", err) 
\ No newline at end of file
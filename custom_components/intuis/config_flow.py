@@ -4,6 +4,7 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict, Optional
 
+import aiohttp
 import voluptuous as vol
 
 from homeassistant import config_entries
@@ -13,20 +14,73 @@ from homeassistant.const import (
     CONF_PASSWORD,
     CONF_USERNAME,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from intuis_netatmo import IntuisNetatmo
+from intuis_netatmo import DEFAULT_BASE_URL, token_request_data
 
 _LOGGER = logging.getLogger(__name__)
 
-DOMAIN = "intuis_netatmo"
+DOMAIN = "intuis"
+
+# hass.data[DOMAIN] key holding validated tokens and topology, keyed by
+# config entry unique ID, until async_setup_entry picks them up
+PROBE_RESULTS = "probe_results"
+# hass.data[DOMAIN] key holding the CommandQueue of each config entry
+COMMAND_QUEUES = "command_queues"
+# Option: degrees the measured temperature must move before it is reported
+CONF_TEMPERATURE_DEADBAND = "temperature_deadband"
+CONF_REQUEST_QUOTA = "requests_per_hour"
+# Requests per hour the Intuis cloud allows each account
+DEFAULT_REQUEST_QUOTA = 500
+
+
+async def async_probe_credentials(
+    session: aiohttp.ClientSession,
+    username: str,
+    password: str,
+    client_id: str,
+    client_secret: str,
+    base_url: str = DEFAULT_BASE_URL,
+) -> Dict[str, Any]:
+    """Log in and fetch the home topology without blocking the event loop.
+
+    Returns the token response and homesdata so setup can reuse them.
+    """
+    async with session.post(
+        f"{base_url}/oauth2/token",
+        data=token_request_data(username, password, client_id, client_secret),
+    ) as response:
+        response.raise_for_status()
+        token = await response.json()
+
+    async with session.get(
+        f"{base_url}/api/homesdata",
+        headers={"Authorization": f"Bearer {token['access_token']}"},
+    ) as response:
+        response.raise_for_status()
+        homesdata = await response.json()
+
+    if not homesdata.get("body", {}).get("homes"):
+        raise ValueError("No homes found for this account")
+
+    return {"token": token, "homesdata": homesdata}
+
 
 class IntuisNetatmoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for IntuisNetatmo."""
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> IntuisNetatmoOptionsFlow:
+        """Get the options flow for this handler."""
+        return IntuisNetatmoOptionsFlow(config_entry)
+
     async def async_step_user(
         self, user_input: Optional[Dict[str, Any]] = None
     ) -> FlowResult:
@@ -34,24 +88,31 @@ class IntuisNetatmoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
 
         if user_input is not None:
+            await self.async_set_unique_id(user_input[CONF_USERNAME].lower())
+            self._abort_if_unique_id_configured()
+
             try:
-                # Try to create client and authenticate
-                client = IntuisNetatmo(
+                # Check the credentials with a login and a topology fetch only
+                probe = await async_probe_credentials(
+                    async_get_clientsession(self.hass),
                     username=user_input[CONF_USERNAME],
                     password=user_input[CONF_PASSWORD],
                     client_id=user_input[CONF_CLIENT_ID],
                     client_secret=user_input[CONF_CLIENT_SECRET],
                 )
-                client.pull_data()
+            except Exception as err:
+                _LOGGER.error("Error during setup: %s", err)
+                errors["base"] = "cannot_connect"
+            else:
+                # Hand the validated token and topology over to entry setup
+                self.hass.data.setdefault(DOMAIN, {}).setdefault(PROBE_RESULTS, {})[
+                    self.unique_id
+                ] = probe
 
-                # If successful, create the config entry
                 return self.async_create_entry(
                     title="IntuisNetatmo",
                     data=user_input,
                 )
-            except Exception as err:
-                _LOGGER.error("Error during setup: %s", err)
-                errors["base"] = "cannot_connect"
 
         # Show the form
         return self.async_show_form(
@@ -63,4 +124,33 @@ class IntuisNetatmoConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_CLIENT_SECRET): str,
             }),
             errors=errors,
-        ) 
\ No newline at end of file
+        )
+
+
+class IntuisNetatmoOptionsFlow(config_entries.OptionsFlow):
+    """Handle IntuisNetatmo options."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(
+        self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema({
+                vol.Optional(
+                    CONF_TEMPERATURE_DEADBAND,
+                    default=self.config_entry.options.get(CONF_TEMPERATURE_DEADBAND, 0.0),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.0, max=2.0)),
+                vol.Optional(
+                    CONF_REQUEST_QUOTA,
+                    default=self.config_entry.options.get(CONF_REQUEST_QUOTA, DEFAULT_REQUEST_QUOTA),
+                ): vol.All(vol.Coerce(int), vol.Range(min=20, max=10000)),
+            }),
+        )
@@ -0,0 +1,30 @@
+"""Diagnostics support for the IntuisNetatmo integration."""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_CLIENT_ID, CONF_CLIENT_SECRET, CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from config_flow import COMMAND_QUEUES, DOMAIN
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD, CONF_CLIENT_ID, CONF_CLIENT_SECRET}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> Dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    client = hass.data[DOMAIN][entry.entry_id]
+    command_queue = hass.data[DOMAIN].get(COMMAND_QUEUES, {}).get(entry.entry_id)
+    # The measure cache reads its database, so collect stats off the event loop
+    stats = await hass.async_add_executor_job(client.get_stats)
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "home_id": client.home_id,
+        "rooms": len(client.rooms),
+        "water_heaters": len(client.water_heaters),
+        "command_latency": stats.pop("command_latency", {}),
+        "command_queue": command_queue.get_stats() if command_queue is not None else None,
+        "stats": stats,
+    }
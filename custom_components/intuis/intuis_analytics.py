@@ -0,0 +1,382 @@
+"""Vectorized energy analytics and tariff costing over home measures"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from intuis_measures import MEASURE_TYPES, iter_room_records
+
+HEATING = "sum_energy_elec_heating"
+HOT_WATER = "sum_energy_elec_hot_water"
+TOTAL = "sum_energy_elec"
+TARIFF_PERIODS = ["sum_energy_elec$0", "sum_energy_elec$1", "sum_energy_elec$2"]
+
+SECONDS_PER_DAY = 86400
+
+
+class TimeOfUseTariff:
+    """Electricity price per kWh depending on time of day and weekday"""
+
+    def __init__(self, default_price: float, periods: Optional[List[Tuple[str, str, float]]] = None,
+                 weekend_price: Optional[float] = None, utc_offset: int = 0) -> None:
+        """Initialize the tariff
+
+        Args:
+            default_price (float): Price per kWh outside all periods
+            periods (List[Tuple[str, str, float]], optional): (start 'HH:MM', end 'HH:MM', price)
+                windows in local time. A window whose end is before its start wraps past midnight.
+            weekend_price (float, optional): Flat price per kWh on Saturdays and Sundays
+            utc_offset (int): Offset of local time from UTC, in seconds
+
+        Raises:
+            ValueError: If a period time is not in HH:MM format
+        """
+        self.default_price = default_price
+        self.periods = periods or []
+        self.weekend_price = weekend_price
+        self.utc_offset = utc_offset
+        # Price for every minute of the day, so pricing is a single array lookup
+        self._minute_prices = np.full(1440, default_price, dtype=np.float64)
+        for start, end, price in self.periods:
+            start_minute = _parse_minute(start)
+            end_minute = _parse_minute(end)
+            if start_minute < end_minute:
+                self._minute_prices[start_minute:end_minute] = price
+            else:
+                self._minute_prices[start_minute:] = price
+                self._minute_prices[:end_minute] = price
+
+    def prices(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Get the price per kWh applying at each timestamp.
+
+        Args:
+            timestamps (np.ndarray): Unix timestamps
+
+        Returns:
+            np.ndarray: Price per kWh for each timestamp
+        """
+        local = np.asarray(timestamps, dtype=np.int64) + self.utc_offset
+        prices = self._minute_prices[(local % SECONDS_PER_DAY) // 60]
+        if self.weekend_price is not None:
+            # 1970-01-01 was a Thursday; with Monday as 0, Saturday is 5
+            weekday = (local // SECONDS_PER_DAY + 3) % 7
+            prices = np.where(weekday >= 5, self.weekend_price, prices)
+        return prices
+
+
+class MeasureSeries:
+    """Measure records of a home held as parallel NumPy arrays
+
+    Values are energy in Wh as returned by gethomemeasure. Room IDs and
+    measure types are interned into small integer indexes so every
+    aggregate is a mask plus a bincount.
+    """
+
+    def __init__(self, room_ids: List[str], types: List[str], room_index: np.ndarray,
+                 type_index: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Initialize the series
+
+        Args:
+            room_ids (List[str]): Room ID for each room index
+            types (List[str]): Measure type for each type index
+            room_index (np.ndarray): Room index of each record
+            type_index (np.ndarray): Type index of each record
+            timestamps (np.ndarray): Unix timestamp of each record
+            values (np.ndarray): Energy of each record in Wh
+        """
+        self.room_ids = room_ids
+        self.types = types
+        self.room_index = room_index
+        self.type_index = type_index
+        self.timestamps = timestamps
+        self.values = values
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, str, int, float]]) -> "MeasureSeries":
+        """
+        Build a series from (room_id, type, timestamp, value) records.
+
+        Args:
+            records (Iterable): Records, e.g. from intuis_measures.iter_measure_records
+
+        Returns:
+            MeasureSeries: The loaded series
+        """
+        rooms = {}
+        types = {}
+        room_index = []
+        type_index = []
+        timestamps = []
+        values = []
+        for room_id, measure_type, timestamp, value in records:
+            room_index.append(rooms.setdefault(room_id, len(rooms)))
+            type_index.append(types.setdefault(measure_type, len(types)))
+            timestamps.append(timestamp)
+            values.append(value)
+        return cls(
+            room_ids=list(rooms),
+            types=list(types),
+            room_index=np.array(room_index, dtype=np.int32),
+            type_index=np.array(type_index, dtype=np.int32),
+            timestamps=np.array(timestamps, dtype=np.int64),
+            values=np.array(values, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_measures(cls, measures: Dict, types: Optional[List[str]] = None) -> "MeasureSeries":
+        """
+        Build a series from a gethomemeasure response.
+
+        Each measure chunk is converted to an array in one go and its
+        timestamps are computed from beg_time and step_time, rather than
+        going record by record as from_records does.
+
+        Args:
+            measures (Dict): Parsed gethomemeasure response
+            types (List[str], optional): Types that were requested
+
+        Returns:
+            MeasureSeries: The loaded series
+        """
+        rooms = {}
+        type_names = {}
+        pieces = []  # (room index, type index, timestamps, values) of each chunk column
+        for room in (measures or {}).get("body", {}).get("home", {}).get("rooms", []):
+            columns = room.get("type") or types or MEASURE_TYPES
+            if isinstance(columns, str):
+                columns = [columns]
+            for chunk in room.get("measures", []):
+                for measure_type, timestamps, values in _chunk_columns(room, chunk, columns):
+                    pieces.append((rooms.setdefault(room.get("id"), len(rooms)),
+                                   type_names.setdefault(measure_type, len(type_names)), timestamps, values))
+        if not pieces:
+            return cls.from_records([])
+        return cls(
+            room_ids=list(rooms),
+            types=list(type_names),
+            room_index=np.concatenate([np.full(len(piece[3]), piece[0], dtype=np.int32) for piece in pieces]),
+            type_index=np.concatenate([np.full(len(piece[3]), piece[1], dtype=np.int32) for piece in pieces]),
+            timestamps=np.concatenate([piece[2] for piece in pieces]),
+            values=np.concatenate([piece[3] for piece in pieces]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _mask(self, measure_type: str) -> np.ndarray:
+        if measure_type not in self.types:
+            return np.zeros(len(self.values), dtype=bool)
+        return self.type_index == self.types.index(measure_type)
+
+    def per_room(self, measure_type: str = TOTAL) -> Dict[str, float]:
+        """
+        Total energy per room.
+
+        Args:
+            measure_type (str): Measure type to total
+
+        Returns:
+            Dict[str, float]: Energy in Wh keyed by room ID
+        """
+        mask = self._mask(measure_type)
+        totals = np.bincount(self.room_index[mask], weights=self.values[mask], minlength=len(self.room_ids))
+        return dict(zip(self.room_ids, totals.tolist()))
+
+    def per_tariff_period(self) -> Dict[str, Dict[str, float]]:
+        """
+        Energy per room for each metered tariff period ($0, $1, $2).
+
+        Returns:
+            Dict[str, Dict[str, float]]: Energy in Wh keyed by tariff type, then room ID
+        """
+        return {measure_type: self.per_room(measure_type) for measure_type in TARIFF_PERIODS
+                if measure_type in self.types}
+
+    def per_day(self, measure_type: str = TOTAL, utc_offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Total home energy per local day.
+
+        Args:
+            measure_type (str): Measure type to total
+            utc_offset (int): Offset of local time from UTC, in seconds
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Day start as Unix timestamps (local midnight), and energy in Wh
+        """
+        mask = self._mask(measure_type)
+        days = (self.timestamps[mask] + utc_offset) // SECONDS_PER_DAY
+        first_day, totals, present = _dense_bincount(days, self.values[mask])
+        day_starts = (first_day + np.flatnonzero(present)) * SECONDS_PER_DAY - utc_offset
+        return day_starts, totals[present]
+
+    def per_room_day(self, measure_type: str = TOTAL, utc_offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Energy per room and local day.
+
+        Args:
+            measure_type (str): Measure type to total
+            utc_offset (int): Offset of local time from UTC, in seconds
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Day starts, and an array of shape
+                (len(room_ids), len(days)) with energy in Wh
+        """
+        mask = self._mask(measure_type)
+        days = (self.timestamps[mask] + utc_offset) // SECONDS_PER_DAY
+        if len(days) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((len(self.room_ids), 0))
+        first_day = days.min()
+        day_count = int(days.max() - first_day) + 1
+        cells = self.room_index[mask].astype(np.int64) * day_count + (days - first_day)
+        totals = np.bincount(cells, weights=self.values[mask], minlength=len(self.room_ids) * day_count)
+        day_starts = (first_day + np.arange(day_count)) * SECONDS_PER_DAY - utc_offset
+        return day_starts, totals.reshape(len(self.room_ids), day_count)
+
+    def heating_hot_water_split(self) -> Dict[str, float]:
+        """
+        Split of energy between space heating and hot water.
+
+        Returns:
+            Dict[str, float]: Heating and hot water energy in Wh, and the heating share (0-1)
+        """
+        heating = float(self.values[self._mask(HEATING)].sum())
+        hot_water = float(self.values[self._mask(HOT_WATER)].sum())
+        total = heating + hot_water
+        return {
+            "heating": heating,
+            "hot_water": hot_water,
+            "heating_share": heating / total if total else 0.0,
+        }
+
+    def load_profile(self, step_seconds: int = 1800, measure_type: str = TOTAL) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Total home energy per bucket, with missing buckets as zero.
+
+        Args:
+            step_seconds (int): Length of one bucket in the series
+            measure_type (str): Measure type to total
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Evenly spaced bucket timestamps and energy in Wh
+        """
+        mask = self._mask(measure_type)
+        timestamps = self.timestamps[mask]
+        if len(timestamps) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        first = timestamps.min()
+        _, load, _ = _dense_bincount((timestamps - first) // step_seconds, self.values[mask])
+        return first + np.arange(len(load), dtype=np.int64) * step_seconds, load
+
+    def peak_windows(self, window_seconds: int, step_seconds: int = 1800, measure_type: str = TOTAL,
+                     top: int = 1) -> List[Tuple[int, float]]:
+        """
+        Find the windows of highest home energy use.
+
+        Args:
+            window_seconds (int): Length of the window, e.g. 7200 for the worst 2 hours
+            step_seconds (int): Length of one bucket in the series
+            measure_type (str): Measure type to use
+            top (int): Number of windows to return
+
+        Returns:
+            List[Tuple[int, float]]: (window start timestamp, energy in Wh), highest first.
+                Returned windows may overlap.
+        """
+        timestamps, load = self.load_profile(step_seconds, measure_type)
+        if len(timestamps) == 0:
+            return []
+        width = max(1, window_seconds // step_seconds)
+        if width >= len(load):
+            return [(int(timestamps[0]), float(load.sum()))]
+        cumulative = np.concatenate(([0.0], np.cumsum(load)))
+        sums = cumulative[width:] - cumulative[:-width]
+        best = np.argsort(sums)[::-1][:top]
+        return [(int(timestamps[i]), float(sums[i])) for i in best]
+
+    def cost(self, tariff: TimeOfUseTariff, measure_type: str = TOTAL) -> Dict[str, float]:
+        """
+        Cost of energy per room under a time-of-use tariff.
+
+        Args:
+            tariff (TimeOfUseTariff): Tariff to price with
+            measure_type (str): Measure type to price
+
+        Returns:
+            Dict[str, float]: Cost keyed by room ID, plus the home total under 'total'
+        """
+        mask = self._mask(measure_type)
+        costs = self.values[mask] / 1000.0 * tariff.prices(self.timestamps[mask])
+        totals = np.bincount(self.room_index[mask], weights=costs, minlength=len(self.room_ids))
+        result = dict(zip(self.room_ids, totals.tolist()))
+        result["total"] = float(totals.sum())
+        return result
+
+    def cost_split(self, tariff: TimeOfUseTariff) -> Dict[str, float]:
+        """
+        Cost of space heating versus hot water under a time-of-use tariff.
+
+        Args:
+            tariff (TimeOfUseTariff): Tariff to price with
+
+        Returns:
+            Dict[str, float]: Heating and hot water cost
+        """
+        return {
+            "heating": self.cost(tariff, HEATING)["total"],
+            "hot_water": self.cost(tariff, HOT_WATER)["total"],
+        }
+
+
+def _chunk_columns(room: Dict, chunk: Dict, columns: List[str]) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+    """Yield (type, timestamps, values) of each column of a measure chunk, without empty buckets"""
+    chunk_type = chunk.get("type")
+    try:
+        table = np.array(chunk.get("value", []), dtype=np.float64)
+    except (TypeError, ValueError):
+        table = None
+    if table is None or table.ndim > 2:
+        # Rows of uneven length: read them one by one, as iter_measure_records does
+        records = list(iter_room_records({"id": room.get("id"), "type": columns, "measures": [chunk]}))
+        for measure_type in dict.fromkeys(record[1] for record in records):
+            selected = [record for record in records if record[1] == measure_type]
+            yield (measure_type, np.array([record[2] for record in selected], dtype=np.int64),
+                   np.array([record[3] for record in selected], dtype=np.float64))
+        return
+    if table.ndim == 1:
+        table = table[:, np.newaxis]
+    timestamps = int(chunk.get("beg_time", 0)) + int(chunk.get("step_time", 0)) * np.arange(len(table), dtype=np.int64)
+    # A typed chunk only has one value per row; None values became NaN
+    for column, measure_type in enumerate(([chunk_type] if chunk_type is not None else columns)[:table.shape[1]]):
+        values = table[:, column]
+        present = ~np.isnan(values)
+        if present.any():
+            yield measure_type, timestamps[present], values[present]
+
+
+def _dense_bincount(keys: np.ndarray, weights: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Sum weights per integer key over the dense range of keys
+
+    Avoids the sort behind np.unique; keys are days or buckets, so the
+    range is small compared to the number of records.
+
+    Returns:
+        Tuple: First key, totals per key offset, and which offsets had records
+    """
+    if len(keys) == 0:
+        return 0, np.zeros(0), np.zeros(0, dtype=bool)
+    first = int(keys.min())
+    offsets = keys - first
+    totals = np.bincount(offsets, weights=weights)
+    present = np.bincount(offsets) > 0
+    return first, totals, present
+
+
+def _parse_minute(value: str) -> int:
+    try:
+        hours, minutes = value.split(":")
+        minute = int(hours) * 60 + int(minutes)
+    except ValueError as e:
+        raise ValueError(f"Time must be in HH:MM format, got {value!r}") from e
+    if not 0 <= minute <= 1440:
+        raise ValueError(f"Time must be between 00:00 and 24:00, got {value!r}")
+    return minute
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Scale benchmarks for topology parsing, status merging and lookups on synthetic homes"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from intuis_netatmo import IntuisNetatmo
+
+DEFAULT_SIZES = [10, 50, 100, 500, 1000, 5000]
+# Largest allowed log-log slope of time against room count; 1.0 is linear
+MAX_SLOPE = 1.3
+# Fail when a phase is this much slower than the previous recorded run
+MAX_REGRESSION = 1.5
+
+
+def make_homesdata(rooms: int, seed: int = 0) -> Dict:
+    """
+    Generate a homesdata payload with the given number of rooms.
+
+    Each room gets one to three NMH heaters, about one room in ten also
+    gets an NMW water heater, and there is one NMG gateway per 100 rooms.
+
+    Args:
+        rooms (int): Number of rooms
+        seed (int): Random seed, so runs are comparable
+
+    Returns:
+        Dict: The homesdata payload
+    """
+    rng = random.Random(seed)
+    gateways = [{"id": f"70:ee:50:00:{i:02x}:00", "type": "NMG", "name": f"Gateway {i}"}
+                for i in range(max(1, rooms // 100))]
+    modules = list(gateways)
+    home_rooms = []
+    for i in range(rooms):
+        room_id = str(1000000 + i)
+        bridge = gateways[i % len(gateways)]["id"]
+        module_ids = []
+        for j in range(rng.randint(1, 3)):
+            module_ids.append(f"nmh-{i}-{j}")
+            modules.append({"id": module_ids[-1], "type": "NMH", "name": f"Heater {i}.{j}",
+                            "room_id": room_id, "bridge": bridge})
+        if rng.random() < 0.1:
+            module_ids.append(f"nmw-{i}")
+            modules.append({"id": module_ids[-1], "type": "NMW", "name": f"Water Heater {i}",
+                            "room_id": room_id, "bridge": bridge})
+        home_rooms.append({"id": room_id, "name": f"Room {i}", "type": "custom", "module_ids": module_ids})
+    # The API does not order modules by room
+    rng.shuffle(modules)
+    return {"body": {"homes": [{"id": "bench-home", "name": "Bench Home",
+                                "rooms": home_rooms, "modules": modules}]}, "status": "ok"}
+
+
+def make_homestatus(homesdata: Dict, seed: int = 0) -> Dict:
+    """
+    Generate a homestatus payload matching a synthetic homesdata payload.
+
+    Args:
+        homesdata (Dict): Payload from make_homesdata
+        seed (int): Random seed
+
+    Returns:
+        Dict: The homestatus payload
+    """
+    rng = random.Random(seed)
+    home = homesdata["body"]["homes"][0]
+    rooms = [{
+        "id": room["id"],
+        "therm_measured_temperature": round(rng.uniform(15, 23), 1),
+        "therm_setpoint_temperature": rng.choice([7, 17, 19, 21]),
+        "therm_setpoint_mode": rng.choice(["program", "manual", "hg"]),
+        "therm_setpoint_end_time": 0,
+        "heating_power_request": rng.randint(0, 100),
+    } for room in home["rooms"]]
+    modules = []
+    for module in home["modules"]:
+        status = {"id": module["id"], "type": module["type"]}
+        if module["type"] == "NMW":
+            status.update({"contactor_mode": "auto", "boiler_status": rng.random() < 0.5,
+                           "connection_status": "connected", "last_seen": int(time.time()),
+                           "bridge": module.get("bridge")})
+        modules.append(status)
+    return {"body": {"home": {"id": home["id"], "rooms": rooms, "modules": modules}},
+            "status": "ok", "time_server": int(time.time())}
+
+
+def _best_of(repeat: int, fn: Callable[[], None]) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_size(rooms: int, repeat: int) -> Dict[str, float]:
+    """
+    Time topology parsing, status merging and lookups for one home size.
+
+    Args:
+        rooms (int): Number of rooms
+        repeat (int): Runs per phase; the fastest is kept
+
+    Returns:
+        Dict[str, float]: Seconds per phase
+    """
+    homesdata = make_homesdata(rooms)
+    homestatus = make_homestatus(homesdata)
+    client = IntuisNetatmo(username="bench", password="bench", client_id="bench", client_secret="bench")
+    names = [room["name"] for room in homesdata["body"]["homes"][0]["rooms"]]
+
+    def lookups() -> None:
+        for name in names:
+            room_id = client.get_room_id_by_name(name)
+            if room_id in client.rooms:
+                client.get_room_mode(room_id)
+
+    # The client prints every room it adds; keep that out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            "topology": _best_of(repeat, lambda: client.load_homesdata(homesdata)),
+            "status_merge": _best_of(repeat, lambda: client._publish_homestatus(homestatus)),
+            "lookups": _best_of(repeat, lookups),
+        }
+
+
+def slope(sizes: List[int], timings: List[float]) -> float:
+    """Least-squares slope of log(time) against log(size)"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(timing, 1e-9)) for timing in timings]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    denominator = sum((x - x_mean) ** 2 for x in xs)
+    return numerator / denominator if denominator else 0.0
+
+
+def load_previous(history_file: str) -> Dict:
+    """Return the last recorded run from the history file, or None"""
+    try:
+        with open(history_file) as f:
+            lines = [line for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Intuis Netatmo scale benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Room counts to benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per phase, fastest is kept (default: 5)')
+    parser.add_argument('--history', default='bench_history.jsonl', help='File results are appended to (default: bench_history.jsonl)')
+    parser.add_argument('--no-record', action='store_true', help='Do not append results to the history file')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'Rooms':>6} {'Topology ms':>12} {'Status ms':>12} {'Lookups ms':>12}")
+    for size in args.sizes:
+        results[size] = run_size(size, args.repeat)
+        print(f"{size:>6} {results[size]['topology'] * 1000:>12.2f} "
+              f"{results[size]['status_merge'] * 1000:>12.2f} {results[size]['lookups'] * 1000:>12.2f}")
+
+    failures = []
+    # Small homes are dominated by fixed overhead, so fit the bound on 100+ rooms
+    fit_sizes = [size for size in args.sizes if size >= 100] or args.sizes
+    print("\nScaling (log-log slope, 1.0 is linear):")
+    for phase in ("topology", "status_merge", "lookups"):
+        phase_slope = slope(fit_sizes, [results[size][phase] for size in fit_sizes])
+        print(f"  {phase:<14} {phase_slope:.2f}")
+        if len(fit_sizes) > 1 and phase_slope > MAX_SLOPE:
+            failures.append(f"{phase} scales with slope {phase_slope:.2f} (limit {MAX_SLOPE})")
+
+    previous = load_previous(args.history)
+    if previous:
+        for size, phases in results.items():
+            before = previous["results"].get(str(size))
+            if not before:
+                continue
+            for phase, seconds in phases.items():
+                if phase in before and seconds > before[phase] * MAX_REGRESSION:
+                    failures.append(f"{phase} at {size} rooms took {seconds * 1000:.2f}ms, "
+                                    f"previously {before[phase] * 1000:.2f}ms")
+
+    if not args.no_record:
+        with open(args.history, "a") as f:
+            f.write(json.dumps({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "commit": os.environ.get("GITHUB_SHA"),
+                "results": {str(size): phases for size, phases in results.items()},
+            }) + "\n")
+
+    if failures:
+        print("\nFailed:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nAll complexity bounds met")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Request budget and poll planning against the Intuis API quota"""
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Requests issued by one poll of each kind, per home
+STATUS_REQUESTS = 2  # getconfigs + homestatus
+MEASURE_REQUESTS = 1  # gethomemeasure
+# The password grant is renewed roughly once an hour
+TOKEN_INTERVAL = 3600
+
+
+class RequestBudget:
+    """Paces requests evenly so a quota per window is never exceeded
+
+    Requests are spaced at least window / quota seconds apart, which keeps
+    the rate inside the quota over any window without the bursts a plain
+    counter would allow at window boundaries. Share one budget between all
+    clients using the same account.
+
+    Priority requests, e.g. user commands, are sent without waiting and are
+    paid for by pushing the next slot back, so scheduled polls absorb them.
+    """
+
+    def __init__(self, quota: int, window: float, safety_margin: float = 0.1) -> None:
+        """Initialize the budget
+
+        Args:
+            quota (int): Requests allowed per window for the account
+            window (float): Length of the quota window, in seconds
+            safety_margin (float): Fraction of the quota kept in reserve
+
+        Raises:
+            ValueError: If the quota or window is not positive
+        """
+        if quota <= 0 or window <= 0:
+            raise ValueError("Quota and window must be positive")
+        self.quota = quota
+        self.window = window
+        self.safety_margin = safety_margin
+        self.interval = window / (quota * (1 - safety_margin))
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.requests = 0
+        self.priority_requests = 0
+        self.waited = 0.0
+
+    def acquire(self, blocking: bool = True, priority: bool = False) -> bool:
+        """
+        Take a slot for one request, waiting for it if necessary.
+
+        Args:
+            blocking (bool): Wait for the next slot. If False, return immediately.
+            priority (bool): Never wait; charge the request to the slots after it instead
+
+        Returns:
+            bool: True if a slot was taken, False if non-blocking and none was free
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if priority:
+                self._next_slot = slot + self.interval
+                self.requests += 1
+                self.priority_requests += 1
+                return True
+            if not blocking and slot > now:
+                return False
+            self._next_slot = slot + self.interval
+            self.requests += 1
+            delay = slot - now
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def get_stats(self) -> Dict:
+        """Return the pacing interval and how much waiting it has caused"""
+        return {
+            "interval": self.interval,
+            "requests": self.requests,
+            "priority_requests": self.priority_requests,
+            "waited": self.waited,
+        }
+
+
+class PollSchedule:
+    """Poll intervals and staggered start offsets for the homes of one account"""
+
+    def __init__(self, status_interval: float, measure_interval: Optional[float],
+                 offsets: Dict[str, float], requests_per_window: float,
+                 refresh_interval: Optional[float] = None) -> None:
+        """Initialize the schedule
+
+        Args:
+            status_interval (float): Seconds between homestatus polls of each home
+            measure_interval (float, optional): Seconds between gethomemeasure polls, None if disabled
+            offsets (Dict[str, float]): Start offset of each home within the interval
+            requests_per_window (float): Requests the schedule issues per quota window
+            refresh_interval (float, optional): Shortest time between targeted refreshes of
+                stale devices of each home, None if disabled
+        """
+        self.status_interval = status_interval
+        self.measure_interval = measure_interval
+        self.refresh_interval = refresh_interval
+        self.offsets = offsets
+        self.requests_per_window = requests_per_window
+
+    def next_run(self, home_id: str, kind: str = "status", now: Optional[float] = None) -> float:
+        """
+        Get the next time a poll of a home is due.
+
+        Args:
+            home_id (str): ID of the home
+            kind (str): 'status' or 'measure'
+            now (float, optional): Current Unix time. Defaults to time.time().
+
+        Returns:
+            float: Unix time of the next poll
+
+        Raises:
+            ValueError: If the kind is unknown or disabled in this schedule
+        """
+        if kind == "status":
+            interval = self.status_interval
+        elif kind == "measure" and self.measure_interval:
+            interval = self.measure_interval
+        else:
+            raise ValueError(f"No {kind} polling in this schedule")
+        if now is None:
+            now = time.time()
+        offset = self.offsets.get(home_id, 0.0) % interval
+        return (math.floor((now - offset) / interval) + 1) * interval + offset
+
+    def __str__(self) -> str:
+        """String representation of the schedule"""
+        status = f"Poll Schedule ({self.requests_per_window:.0f} requests per window)\n"
+        status += f"- Status Interval: {self.status_interval:.0f}s\n"
+        status += f"- Measure Interval: {self.measure_interval:.0f}s\n" if self.measure_interval else "- Measure Interval: disabled\n"
+        status += f"- Refresh Interval: {self.refresh_interval:.0f}s\n" if self.refresh_interval else "- Refresh Interval: disabled\n"
+        for home_id, offset in self.offsets.items():
+            status += f"- Home {home_id} Offset: {offset:.0f}s\n"
+        return status
+
+
+class PollPlanner:
+    """Derives the fastest poll cadence an account's API quota allows"""
+
+    def __init__(self, quota: int, window: float, safety_margin: float = 0.1,
+                 min_status_interval: float = 0.0) -> None:
+        """Initialize the planner
+
+        Args:
+            quota (int): Requests allowed per window for the account
+            window (float): Length of the quota window, in seconds
+            safety_margin (float): Fraction of the quota kept in reserve
+            min_status_interval (float): Never poll homestatus more often than this
+        """
+        self.quota = quota
+        self.window = window
+        self.safety_margin = safety_margin
+        self.min_status_interval = min_status_interval
+
+    def plan(self, homes: List[Dict], measure_interval: Optional[float] = None,
+             max_rooms_per_measure: Optional[int] = None,
+             refresh_interval: Optional[float] = None) -> PollSchedule:
+        """
+        Plan polling for every home of the account.
+
+        Measure polling has a fixed interval (there is no point polling faster
+        than the measure scale), and targeted refreshes of stale devices are
+        reserved at their highest possible rate; homestatus gets whatever
+        quota is left.
+
+        Args:
+            homes (List[Dict]): One dict per home with 'id', 'rooms' (number of rooms
+                and water heaters) and optionally 'status' and 'measure' flags
+                (both default to True)
+            measure_interval (float, optional): Seconds between measure polls, e.g. 1800
+                for 30min buckets. Required if any home has measures enabled.
+            max_rooms_per_measure (int, optional): Split measure requests into chunks
+                of at most this many rooms
+            refresh_interval (float, optional): Shortest time between targeted refreshes
+                of stale devices of each status-polled home (see IntuisNetatmo.refresh_stale)
+
+        Returns:
+            PollSchedule: The planned schedule
+
+        Raises:
+            ValueError: If the quota cannot cover the enabled features
+        """
+        usable = self.quota * (1 - self.safety_margin)
+        usable -= math.ceil(self.window / TOKEN_INTERVAL)
+
+        measure_per_cycle = 0
+        status_homes = []
+        for home in homes:
+            if home.get("measure", True):
+                chunks = 1
+                if max_rooms_per_measure:
+                    chunks = max(1, math.ceil(home.get("rooms", 0) / max_rooms_per_measure))
+                measure_per_cycle += chunks * MEASURE_REQUESTS
+            if home.get("status", True):
+                status_homes.append(home["id"])
+
+        measure_per_window = 0.0
+        if measure_per_cycle:
+            if not measure_interval:
+                raise ValueError("measure_interval is required when measures are enabled")
+            measure_per_window = measure_per_cycle * self.window / measure_interval
+        else:
+            measure_interval = None
+
+        # A targeted refresh is a homestatus poll of its own
+        refresh_per_window = 0.0
+        if refresh_interval:
+            refresh_per_window = len(status_homes) * STATUS_REQUESTS * self.window / refresh_interval
+
+        remaining = usable - measure_per_window - refresh_per_window
+        status_per_cycle = len(status_homes) * STATUS_REQUESTS
+        if remaining <= 0 or (status_per_cycle and remaining < status_per_cycle):
+            raise ValueError(
+                f"Quota of {self.quota} requests per {self.window:.0f}s cannot cover "
+                f"{measure_per_window:.0f} measure requests, {refresh_per_window:.0f} refresh "
+                f"requests and {len(status_homes)} homes"
+            )
+
+        if status_per_cycle:
+            status_interval = max(self.window * status_per_cycle / remaining, self.min_status_interval)
+        else:
+            status_interval = self.window
+        # Stagger homes so their polls do not all land at once
+        offsets = {home_id: i * status_interval / len(status_homes)
+                   for i, home_id in enumerate(status_homes)}
+        requests_per_window = (self.window / status_interval * status_per_cycle + measure_per_window
+                               + refresh_per_window + math.ceil(self.window / TOKEN_INTERVAL))
+        return PollSchedule(status_interval, measure_interval, offsets, requests_per_window,
+                            refresh_interval if refresh_per_window else None)
+
+    def plan_client(self, client, measure_interval: Optional[float] = None,
+                    refresh_interval: Optional[float] = None) -> PollSchedule:
+        """
+        Plan polling for the home of a client with homesdata already pulled.
+
+        Args:
+            client (IntuisNetatmo): The client to plan for
+            measure_interval (float, optional): Seconds between measure polls, None to disable them
+            refresh_interval (float, optional): Shortest time between targeted refreshes of
+                stale devices, None if the client's refresh_stale is not used
+
+        Returns:
+            PollSchedule: The planned schedule
+        """
+        homes = [{
+            "id": client.home_id,
+            "rooms": len(client.rooms) + len(client.water_heaters),
+            "measure": measure_interval is not None,
+        }]
+        return self.plan(homes, measure_interval=measure_interval, refresh_interval=refresh_interval)
+
+    def budget(self) -> RequestBudget:
+        """Create a RequestBudget enforcing the same quota"""
+        return RequestBudget(self.quota, self.window, self.safety_margin)
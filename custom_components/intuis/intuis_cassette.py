@@ -0,0 +1,149 @@
+"""Record and replay Intuis API exchanges for offline runs"""
+import io
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+REDACTED = "REDACTED"
+# Fields whose values never reach a cassette: credentials, and account and home PII
+SECRET_FIELDS = {"username", "password", "client_id", "client_secret",
+                 "access_token", "refresh_token", "Authorization",
+                 "email", "mail", "phone", "phone_number", "address", "city", "coordinates"}
+
+
+def redact(data: Any) -> Any:
+    """
+    Return a copy of data with every secret field replaced by REDACTED.
+
+    Args:
+        data (Any): Parsed JSON or form data
+
+    Returns:
+        Any: The redacted copy
+    """
+    if isinstance(data, dict):
+        return {key: REDACTED if key in SECRET_FIELDS else redact(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [redact(value) for value in data]
+    return data
+
+
+class RecordingSession(requests.Session):
+    """requests.Session that captures every exchange into a cassette
+
+    Install it with client.session = RecordingSession(path) and call save()
+    when done. Only the URL path is stored, so a cassette replays against
+    any base URL.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the recording session
+
+        Args:
+            path (str): File the cassette is saved to
+        """
+        super().__init__()
+        self.path = path
+        self.exchanges = []
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        started = time.monotonic()
+        response = super().request(method, url, **kwargs)
+        elapsed = time.monotonic() - started
+        exchange = {
+            "offset": round(started - self._started, 6),
+            "elapsed": round(elapsed, 6),
+            "method": method.upper(),
+            "path": urlsplit(url).path,
+            "request": _redact_body(kwargs.get("data")),
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type"),
+            "body": _redact_body(response.text),
+        }
+        with self._lock:
+            self.exchanges.append(exchange)
+        return response
+
+    def save(self) -> None:
+        """Write the recorded exchanges to the cassette file"""
+        with self._lock:
+            exchanges = list(self.exchanges)
+        with open(self.path, "w") as f:
+            json.dump({"version": 1, "exchanges": exchanges}, f, indent=1)
+
+
+class ReplaySession(requests.Session):
+    """requests.Session answering from a recorded cassette instead of the network
+
+    Requests are matched to recorded exchanges by method and path, in the
+    order they were recorded.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None, loop: bool = False) -> None:
+        """Initialize the replay session
+
+        Args:
+            path (str): Cassette file to replay
+            speed (float, optional): Replay at recorded latency divided by speed
+                (1.0 is real time). None answers immediately.
+            loop (bool): Start over once the exchanges for a request are used up,
+                e.g. to poll repeatedly in benchmarks
+        """
+        super().__init__()
+        with open(path) as f:
+            cassette = json.load(f)
+        self.speed = speed
+        self.loop = loop
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._recorded = defaultdict(list)
+        self._queues = defaultdict(deque)
+        for exchange in cassette["exchanges"]:
+            key = (exchange["method"], exchange["path"])
+            self._recorded[key].append(exchange)
+            self._queues[key].append(exchange)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        key = (method.upper(), urlsplit(url).path)
+        with self._lock:
+            queue = self._queues[key]
+            if not queue and self.loop:
+                queue.extend(self._recorded[key])
+            if not queue:
+                raise LookupError(f"No recorded exchange left for {key[0]} {key[1]}")
+            exchange = queue.popleft()
+            self.replayed += 1
+        if self.speed:
+            time.sleep(exchange["elapsed"] / self.speed)
+
+        body = exchange["body"]
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.reason = ""
+        response.url = url
+        content = (body if isinstance(body, str) else json.dumps(body)).encode()
+        response._content = content
+        # Streamed requests read the body from raw
+        response.raw = io.BytesIO(content)
+        if exchange.get("content_type"):
+            response.headers["Content-Type"] = exchange["content_type"]
+        return response
+
+
+def _redact_body(body: Any) -> Any:
+    """Parse a request or response body where possible and redact its secrets"""
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode(errors="replace")
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return body
+    return redact(body)
@@ -2,9 +2,20 @@
 import argparse
 import json
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 from pathlib import Path
 from intuis_netatmo import IntuisNetatmo
-from typing import Optional, Dict
+from intuis_export import MeasureExporter
+from intuis_measure_cache import MeasureCache
+from intuis_measures import MEASURE_TYPES
+from intuis_cassette import RecordingSession, ReplaySession
+from intuis_profiling import Profiler
+from intuis_snapshots import SnapshotWriter
+from intuis_timeline import TimelineWriter
+from intuis_token_store import TokenStore
+from typing import Any, Callable, Dict, Optional
 
 def get_credentials(secrets_file: str = "secrets.json") -> tuple[str, str, str, str]:
     """
@@ -36,92 +47,137 @@ def get_credentials(secrets_file: str = "secrets.json") -> tuple[str, str, str,
     return secrets["username"], secrets["password"], secrets["client_id"], secrets["client_secret"]
 
 
-def get_homes_data(client: IntuisNetatmo) -> None:
+def print_homes_data(client: IntuisNetatmo, homes_data: Dict) -> None:
     """
-    Get and display homes data.
+    Display homes data.
     """
-    try:
-        homes_data = client.get_homesdata()
-        print("\nHomes Data:")
-        print(f"  Home ID: {client.home_id}")
-        print(f"  Home Name: {client.home_name}")
-        print(f"Room data:")
-        for room in homes_data["body"]["homes"][0]["rooms"]:
-            print(f"  Room ID: {room['id']}")
-            print(f"    Room Name: {room['name']}")
-            print(f"    Room Type: {room['type']}")
-        print(f"Module data:")
-        for module in homes_data["body"]["homes"][0]["modules"]:
-            print(f"    Module ID: {module['id']}")
-            try:
-                print(f"      Module Name: {module['name']}")
-            except:
-                pass
-            print(f"      Module Type: {module['type']}")
-            
-    except Exception as e:
-        print(f"Error getting homes data: {str(e)}")
+    print("\nHomes Data:")
+    print(f"  Home ID: {client.home_id}")
+    print(f"  Home Name: {client.home_name}")
+    print(f"Room data:")
+    for room in homes_data["body"]["homes"][0]["rooms"]:
+        print(f"  Room ID: {room['id']}")
+        print(f"    Room Name: {room['name']}")
+        print(f"    Room Type: {room['type']}")
+    print(f"Module data:")
+    for module in homes_data["body"]["homes"][0]["modules"]:
+        print(f"    Module ID: {module['id']}")
+        try:
+            print(f"      Module Name: {module['name']}")
+        except:
+            pass
+        print(f"      Module Type: {module['type']}")
 
-def get_home_status_summary(client: IntuisNetatmo) -> None:
+def print_home_status_summary(homes_data: Dict, home_status: Dict) -> None:
     """
     Display a summary of home status including room temperatures, modes, and energy consumption.
     """
-    try:
-        client.get_homesdata()
-        home_status = client.get_homestatus()
-        print("\nHome Status Summary:")
-        print("=" * 80)
-        
-        # Get room information from homesdata
-        rooms = {room['id']: room['name'] for room in client.homesdata["body"]["homes"][0]["rooms"]}
+    print("\nHome Status Summary:")
+    print("=" * 80)
+    
+    # Get room information from homesdata
+    rooms = {room['id']: room['name'] for room in homes_data["body"]["homes"][0]["rooms"]}
+    room_statuses = {room["id"]: room for room in home_status["body"]["home"]["rooms"]}
+    
+    # Process each room
+    for room_id, room_name in rooms.items():
+        print(f"\nRoom: {room_name}")
+        print("-" * 40)
         
-        # Process each room
-        for room_id, room_name in rooms.items():
-            print(f"\nRoom: {room_name}")
-            print("-" * 40)
-            
-            # Find room status
-            room_status = next((room for room in home_status["body"]["home"]["rooms"] if room["id"] == room_id), None)
-            if room_status:
-                print(f"  Current Temperature: {room_status.get('therm_measured_temperature', 'N/A')}°C")
-                print(f"  Target Temperature: {room_status.get('therm_setpoint_temperature', 'N/A')}°C")
-                print(f"  Mode: {room_status.get('therm_setpoint_mode', 'N/A')}")
-                print(f"  Heating Status: {room_status.get('heating_power_request', 'N/A')}")
-                
-                # Calculate energy consumption if available
-                if 'energy' in room_status:
-                    print(f"  Energy Consumption: {room_status['energy']} kWh")
-                else:
-                    print("  Energy Consumption: N/A")
-            
-            # Find associated modules
-            modules = [m for m in home_status["body"]["home"]["modules"] if m.get("room_id") == room_id]
-            if modules:
-                print("\n  Associated Modules:")
-                for module in modules:
-                    print(f"    - {module.get('name', 'Unknown')} ({module.get('type', 'Unknown')})")
-                    if 'battery_percent' in module:
-                        print(f"      Battery: {module['battery_percent']}%")
-                    if 'rf_status' in module:
-                        print(f"      RF Status: {module['rf_status']}")
-            
-            print("-" * 40)
+        # Find room status
+        room_status = room_statuses.get(room_id)
+        if room_status:
+            print(f"  Current Temperature: {room_status.get('therm_measured_temperature', 'N/A')}°C")
+            print(f"  Target Temperature: {room_status.get('therm_setpoint_temperature', 'N/A')}°C")
+            print(f"  Mode: {room_status.get('therm_setpoint_mode', 'N/A')}")
+            print(f"  Heating Status: {room_status.get('heating_power_request', 'N/A')}")
             
+            # Calculate energy consumption if available
+            if 'energy' in room_status:
+                print(f"  Energy Consumption: {room_status['energy']} kWh")
+            else:
+                print("  Energy Consumption: N/A")
+        
+        # Find associated modules
+        modules = [m for m in home_status["body"]["home"]["modules"] if m.get("room_id") == room_id]
+        if modules:
+            print("\n  Associated Modules:")
+            for module in modules:
+                print(f"    - {module.get('name', 'Unknown')} ({module.get('type', 'Unknown')})")
+                if 'battery_percent' in module:
+                    print(f"      Battery: {module['battery_percent']}%")
+                if 'rf_status' in module:
+                    print(f"      RF Status: {module['rf_status']}")
+        
+        print("-" * 40)
+
+def print_homes_measure(measurements: Dict) -> None:
+    """
+    Display home measurements.
+    """
+    print("\nHome Measurements:")
+    print("=" * 80)
+    print(json.dumps(measurements, indent=2))
+
+def _run_now(fn: Callable, *args: Any, **kwargs: Any) -> Future:
+    """Call fn straight away, returning its outcome as a completed future"""
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
     except Exception as e:
-        print(f"Error getting home status summary: {str(e)}")
+        future.set_exception(e)
+    return future
 
-def get_homes_measure(client: IntuisNetatmo) -> None:
+def run_sections(client: IntuisNetatmo, homes: bool, status: bool, measure: bool, scale: str = "30min",
+                 room_ids: Optional[list] = None, types: Optional[list] = None, parallel: bool = True) -> None:
     """
-    Get and display home measurements.
+    Fetch the topology once, then the status and measurements concurrently, and display the requested sections.
+
+    Status and measurements only depend on the topology, so a run asking for
+    both takes about as long as the slower of the two requests. With parallel
+    set to False they are fetched one after the other on the calling thread,
+    which cProfile can follow.
     """
     try:
-        client.get_homesdata()
-        measurements = client.get_home_measure()
-        print("\nHome Measurements:")
-        print("=" * 80)
-        print(json.dumps(measurements, indent=2))
+        homes_data = client.get_homesdata()
+    except Exception as e:
+        print(f"Error getting homes data: {str(e)}")
+        return
+
+    with ThreadPoolExecutor(max_workers=2) if parallel else nullcontext() as pool:
+        submit = pool.submit if parallel else _run_now
+        status_future = submit(client.get_homestatus) if status else None
+        measure_future = submit(client.get_home_measure, scale, room_ids=room_ids, types=types) if measure else None
+
+        if homes:
+            try:
+                print_homes_data(client, homes_data)
+            except Exception as e:
+                print(f"Error getting homes data: {str(e)}")
+        if status_future is not None:
+            try:
+                print_home_status_summary(homes_data, status_future.result())
+            except Exception as e:
+                print(f"Error getting home status summary: {str(e)}")
+        if measure_future is not None:
+            try:
+                print_homes_measure(measure_future.result())
+            except Exception as e:
+                print(f"Error getting home measurements: {str(e)}")
+
+def export_measures(client: IntuisNetatmo, directory: str, file_format: str, days: int, scale: str) -> None:
+    """
+    Export home measurements to partitioned files.
+    """
+    try:
+        if client.home_id is None:
+            client.get_homesdata()
+        exporter = MeasureExporter(client, directory, file_format=file_format)
+        date_begin = int((datetime.now() - timedelta(days=days)).timestamp())
+        rows = exporter.export(date_begin, scale=scale)
+        print(f"\nExported {rows} measures to {directory}")
     except Exception as e:
-        print(f"Error getting home measurements: {str(e)}")
+        print(f"Error exporting home measurements: {str(e)}")
 
 def main():
     parser = argparse.ArgumentParser(description='Intuis Netatmo CLI')
@@ -130,26 +186,81 @@ def main():
     parser.add_argument('--homes', action='store_true', help='Get homes data')
     parser.add_argument('--status', action='store_true', help='Get home status summary')
     parser.add_argument('--measure', action='store_true', help='Get home measurements')
+    parser.add_argument('--export', metavar='DIR', help='Export home measurements to DIR, partitioned by home, scale and month')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='File format for --export (default: csv)')
+    parser.add_argument('--days', type=int, default=30, help='Days of history for --export (default: 30)')
+    parser.add_argument('--scale', default='30min', help='Measurement scale for --measure and --export (default: 30min)')
+    parser.add_argument('--room', action='append', metavar='ROOM_ID', help='Only measure this room with --measure (repeatable)')
+    parser.add_argument('--type', action='append', choices=MEASURE_TYPES, help='Only request this measure type with --measure (repeatable)')
+    parser.add_argument('--cache', metavar='FILE', default='measures_cache.sqlite', help='SQLite file caching fetched measurements (default: measures_cache.sqlite)')
+    parser.add_argument('--no-cache', action='store_true', help='Always fetch measurements from the API (implied by --record and --replay)')
+    parser.add_argument('--token-store', metavar='FILE', default='.intuis_tokens.json', help='File sharing login tokens between runs (default: .intuis_tokens.json)')
+    parser.add_argument('--no-token-store', action='store_true', help='Always log in with the password (implied by --record)')
+    parser.add_argument('--snapshots', metavar='DIR', help='Keep compressed snapshots of every raw API response in DIR')
+    parser.add_argument('--timeline', metavar='FILE', help='Append every room and module status change to a binary timeline FILE')
+    parser.add_argument('--record', metavar='FILE', help='Record all API exchanges to a cassette FILE (secrets redacted)')
+    parser.add_argument('--replay', metavar='FILE', help='Answer API requests from a cassette FILE instead of the network')
+    parser.add_argument('--replay-speed', type=float, default=None, help='Replay at recorded latency divided by this factor (default: no delay)')
+    parser.add_argument('--profile', action='store_true', help='Print a phase breakdown, top allocations and top functions after running')
     parser.add_argument('--secrets', '-s', default='secrets.json', help='Path to secrets file (default: secrets.json)')
     
     args = parser.parse_args()
     
-    if not args.list and not args.device and not args.homes and not args.status and not args.measure:
+    if not args.list and not args.device and not args.homes and not args.status and not args.measure and not args.export:
         parser.print_help()
         return
     
     try:
-        username, password, client_id, client_secret = get_credentials(args.secrets)
-        client = IntuisNetatmo(username=username, password=password, client_id=client_id, client_secret=client_secret)
+        if args.replay:
+            # Cassettes are redacted, so no real credentials are needed
+            client = IntuisNetatmo(username="replay", password="replay", client_id="replay", client_secret="replay")
+            client.session = ReplaySession(args.replay, speed=args.replay_speed)
+        else:
+            username, password, client_id, client_secret = get_credentials(args.secrets)
+            client = IntuisNetatmo(username=username, password=password, client_id=client_id, client_secret=client_secret)
+            # A cached token would keep the login exchange out of a recording
+            if not args.no_token_store and not args.record:
+                try:
+                    client.token_store = TokenStore(args.token_store)
+                except RuntimeError as e:
+                    print(f"Warning: {str(e)}; logging in without a token store")
+        if args.record:
+            client.session = RecordingSession(args.record)
+        # Cassettes must capture and serve every measure exchange, without touching the live cache
+        if (args.measure or args.export) and not args.no_cache and not args.record and not args.replay:
+            client.measure_cache = MeasureCache(args.cache)
+        if args.snapshots:
+            client.snapshot_writer = SnapshotWriter(args.snapshots)
+        if args.timeline:
+            client.timeline = TimelineWriter(args.timeline)
+        if args.profile:
+            client.profiler = Profiler(cprofile=True, trace_allocations=True)
+            client.profiler.start()
         
-        if args.homes:
-            get_homes_data(client)
-            
-        if args.status:
-            get_home_status_summary(client)
-            
-        if args.measure:
-            get_homes_measure(client)
+        if args.homes or args.status or args.measure:
+            # cProfile only sees the thread that started it, so profile the sections sequentially
+            run_sections(client, args.homes, args.status, args.measure, args.scale, args.room, args.type,
+                         parallel=not args.profile)
+
+        if args.export:
+            export_measures(client, args.export, args.format, args.days, args.scale)
+
+        if args.profile:
+            client.profiler.stop()
+            print("\nProfile:")
+            print("=" * 80)
+            print(client.profiler.report())
+
+        if args.snapshots:
+            client.snapshot_writer.close()
+            print(f"\nWrote {client.snapshot_writer.written} snapshots to {args.snapshots}")
+
+        if args.timeline:
+            client.timeline.close()
+
+        if args.record:
+            client.session.save()
+            print(f"\nRecorded {len(client.session.exchanges)} exchanges to {args.record}")
         
     except FileNotFoundError as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,291 @@
+"""Durable, coalescing queue of write commands for one home"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+
+# HTTP errors that say nothing about the command itself: an expired or revoked
+# token, a timeout or rate limiting. Other 4xx responses reject the command for good.
+RETRY_STATUSES = {401, 403, 408, 429}
+
+# Command kind -> (target type used for coalescing, IntuisNetatmo method)
+COMMANDS = {
+    "room_setpoint": ("room", "set_room_setpoint"),
+    "room_mode": ("room", "set_room_mode"),
+    "room_off": ("room", "set_room_off"),
+    "room_hg": ("room", "set_room_hg"),
+    "water_heater_mode": ("module", "set_water_heater_mode"),
+}
+
+# Outcomes of CommandQueue.submit
+SENT = "sent"
+QUEUED = "queued"
+DROPPED = "dropped"
+
+
+class CommandQueue:
+    """Write-ahead queue of commands for one home
+
+    Every command is appended to an on-disk log before it is sent, so it
+    survives API outages and Home Assistant restarts. Pending commands are
+    coalesced last-writer-wins per room or module: a new command for the
+    same target replaces the pending one and moves to the back of the
+    queue. Commands are replayed in order, with exponential backoff while
+    the API keeps failing or the token is rejected. Only commands the API
+    or the client refuse as invalid are dropped.
+    """
+
+    def __init__(self, client, path: str, base_backoff: float = 5.0, max_backoff: float = 600.0,
+                 compact_after: int = 100) -> None:
+        """Initialize the queue, replaying any commands left in the log
+
+        Args:
+            client (IntuisNetatmo): Client used to send the commands
+            path (str): Path of the log file, one per home
+            base_backoff (float): Seconds to wait after the first failure
+            max_backoff (float): Upper bound of the wait between attempts
+            compact_after (int): Rewrite the log once it holds this many stale records
+        """
+        self.client = client
+        self.path = path
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.compact_after = compact_after
+        self._lock = threading.RLock()  # Guards the queue state
+        self._flush_lock = threading.Lock()  # One sender at a time, keeps commands in order
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopping = False
+        self._pending = {}  # (target type, target id) -> command, in queue order
+        self._outcomes = {}  # Sequence number of a command submit() waits for -> outcome, once known
+        self._seq = 0
+        self._stale_records = 0
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.sent = 0
+        self.dropped = 0
+        self._load()
+
+    def submit(self, kind: str, target_id: str, **params: Any) -> str:
+        """
+        Queue a command and try to send everything pending straight away.
+
+        Args:
+            kind (str): One of the keys of COMMANDS
+            target_id (str): Room ID, or module ID for water heater commands
+            **params: Arguments of the client method after the target ID
+
+        Returns:
+            str: SENT if the command was sent, QUEUED if it is waiting for a retry,
+                or DROPPED if it was rejected as invalid or replaced by a newer command
+
+        Raises:
+            ValueError: If the command kind is unknown
+        """
+        seq = self._put(kind, target_id, params, watch=True)
+        self.flush()
+        with self._lock:
+            return self._outcomes.pop(seq, None) or QUEUED
+
+    def enqueue(self, kind: str, target_id: str, **params: Any) -> int:
+        """
+        Queue a command without sending it.
+
+        Args:
+            kind (str): One of the keys of COMMANDS
+            target_id (str): Room ID, or module ID for water heater commands
+            **params: Arguments of the client method after the target ID
+
+        Returns:
+            int: Sequence number of the queued command
+
+        Raises:
+            ValueError: If the command kind is unknown
+        """
+        return self._put(kind, target_id, params)
+
+    def _put(self, kind: str, target_id: str, params: Dict, watch: bool = False) -> int:
+        if kind not in COMMANDS:
+            raise ValueError(f"Command must be one of: {', '.join(COMMANDS)}")
+        with self._lock:
+            self._seq += 1
+            command = {
+                "op": "put",
+                "seq": self._seq,
+                "kind": kind,
+                "target_id": target_id,
+                "params": params,
+                "queued_at": time.time(),
+            }
+            key = (COMMANDS[kind][0], target_id)
+            if key in self._pending:
+                # Last writer wins: the older command will never be sent
+                self._set_outcome(self._pending.pop(key), DROPPED)
+                self._stale_records += 1
+            if watch:
+                self._outcomes[command["seq"]] = None
+            self._pending[key] = command
+            self._append(command)
+        self._wake.set()
+        return command["seq"]
+
+    def flush(self) -> int:
+        """
+        Send pending commands in order until the queue is empty or the API fails.
+
+        Does nothing while backing off after a failure.
+
+        Returns:
+            int: Number of commands sent
+        """
+        sent = 0
+        with self._flush_lock:
+            if time.monotonic() < self.next_attempt:
+                return 0
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    key, command = next(iter(self._pending.items()))
+                # Send without holding the queue lock so callers can keep enqueueing
+                method = getattr(self.client, COMMANDS[command["kind"]][1])
+                try:
+                    method(command["target_id"], **command["params"])
+                except requests.HTTPError as e:
+                    status = e.response.status_code if e.response is not None else None
+                    if status is not None and 400 <= status < 500 and status not in RETRY_STATUSES:
+                        # The API rejected the command itself; retrying will not help
+                        self._drop(command, e)
+                    else:
+                        self._back_off(command, e)
+                        break
+                except (ValueError, TypeError) as e:
+                    # Invalid parameters or an unreadable response fail the same way on
+                    # every retry, and would otherwise block every command behind them
+                    self._drop(command, e)
+                except Exception as e:
+                    # Network errors and anything unexpected: keep the command for later
+                    self._back_off(command, e)
+                    break
+                else:
+                    sent += 1
+                    self.sent += 1
+                    self._set_outcome(command, SENT)
+                with self._lock:
+                    # A newer command for the same target may have replaced this one meanwhile
+                    if self._pending.get(key) is command:
+                        del self._pending[key]
+                    self._append({"op": "done", "seq": command["seq"]})
+                    self._stale_records += 1
+                    self.failures = 0
+                    self.next_attempt = 0.0
+            with self._lock:
+                if self._stale_records >= self.compact_after:
+                    self._compact()
+        return sent
+
+    def pending(self) -> List[Dict]:
+        """Return the pending commands, oldest first"""
+        with self._lock:
+            return [dict(command) for command in self._pending.values()]
+
+    def start(self) -> None:
+        """Start a background thread replaying pending commands"""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="intuis-command-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background thread; pending commands stay in the log"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_stats(self) -> Dict:
+        """Return queue length and delivery counters"""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "failures": self.failures,
+            }
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep replaying, e.g. after the log could not be written
+                print(f"Error: Flushing command queue failed: {str(e)}")
+                self.next_attempt = time.monotonic() + self.base_backoff
+            with self._lock:
+                if not self._pending:
+                    timeout = None
+                else:
+                    timeout = max(self.next_attempt - time.monotonic(), 0.1)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _drop(self, command: Dict, error: Exception) -> None:
+        print(f"Error: Dropping {command['kind']} for {command['target_id']}: {str(error)}")
+        self.dropped += 1
+        self._set_outcome(command, DROPPED)
+
+    def _set_outcome(self, command: Dict, outcome: str) -> None:
+        """Record the outcome of a command a submit() call is waiting for"""
+        with self._lock:
+            if command["seq"] in self._outcomes:
+                self._outcomes[command["seq"]] = outcome
+
+    def _back_off(self, command: Dict, error: Exception) -> None:
+        self.failures += 1
+        delay = min(self.base_backoff * 2 ** (self.failures - 1), self.max_backoff)
+        self.next_attempt = time.monotonic() + delay
+        print(f"Warning: {command['kind']} for {command['target_id']} failed ({str(error)}), retrying in {delay:.0f}s")
+
+    def _append(self, record: Dict) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-write
+                continue
+            self._seq = max(self._seq, record["seq"])
+            if record["op"] == "put":
+                key = (COMMANDS[record["kind"]][0], record["target_id"])
+                self._pending.pop(key, None)
+                self._pending[key] = record
+            elif record["op"] == "done":
+                for key, command in list(self._pending.items()):
+                    if command["seq"] == record["seq"]:
+                        del self._pending[key]
+        self._compact()
+
+    def _compact(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for command in self._pending.values():
+                f.write(json.dumps(command) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._stale_records = 0
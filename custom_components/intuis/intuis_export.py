@@ -0,0 +1,216 @@
+"""Streaming export of home measures to partitioned CSV or Parquet files"""
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from intuis_measures import SCALE_SECONDS, iter_measure_records
+
+COLUMNS = ["home_id", "room_id", "type", "timestamp", "value"]
+FORMATS = ["csv", "parquet"]
+
+
+class MeasureExporter:
+    """Export measures window by window into files partitioned by home, scale and month
+
+    Files are laid out as <directory>/home_id=<id>/scale=<scale>/month=<YYYY-MM>/,
+    so exports at several scales can share a directory. CSV partitions hold
+    a single measures.csv that is appended to; Parquet partitions get one
+    part file per window since Parquet files cannot be appended to. Both
+    load directly with pandas.read_csv or pandas.read_parquet(<directory>).
+
+    Only one window is held in memory at a time, and without a measure
+    cache each response is parsed as it streams in. Progress is kept in
+    <directory>/export_state.json, so a later run resumes after the last
+    exported bucket instead of starting over. The state also records the
+    size of every CSV partition, and rows appended by a window that was
+    interrupted are cut off before resuming; Parquet part files of such a
+    window are simply rewritten.
+    """
+
+    def __init__(self, client, directory: str, file_format: str = "csv", window_buckets: int = 1024) -> None:
+        """Initialize the exporter
+
+        Args:
+            client (IntuisNetatmo): Client with homesdata already pulled
+            directory (str): Root directory of the export
+            file_format (str): Either 'csv' or 'parquet'
+            window_buckets (int): Number of buckets fetched per request
+
+        Raises:
+            ValueError: If file_format is not supported
+            ImportError: If Parquet is requested and pyarrow is not installed
+        """
+        if file_format not in FORMATS:
+            raise ValueError(f"Format must be one of: {', '.join(FORMATS)}")
+        if file_format == "parquet":
+            _import_pyarrow()
+        self.client = client
+        self.directory = directory
+        self.file_format = file_format
+        self.window_buckets = window_buckets
+        self.state_file = os.path.join(directory, "export_state.json")
+
+    def export(self, date_begin: int, date_end: Optional[int] = None, scale: str = "30min") -> int:
+        """
+        Export all closed buckets between date_begin and date_end.
+
+        Args:
+            date_begin (int): Unix timestamp to start from, unless a previous run got further
+            date_end (int, optional): Unix timestamp to stop at. Defaults to now.
+            scale (str): Time scale of the buckets (e.g. "30min", "1hour", "1day")
+
+        Returns:
+            int: Number of rows written
+
+        Raises:
+            ValueError: If scale is not supported
+        """
+        if scale not in SCALE_SECONDS:
+            raise ValueError(f"Scale must be one of: {', '.join(SCALE_SECONDS)}")
+        step = SCALE_SECONDS[scale]
+        if date_end is None:
+            date_end = int(datetime.now().timestamp())
+        # Only export closed buckets so resumed runs never need to rewrite rows
+        date_end -= date_end % step
+
+        home_id = self.client.home_id
+        state = self._load_state()
+        state_key = f"{home_id}/{scale}"
+        start = max(int(date_begin), state.get(state_key, 0))
+        start -= start % step
+        if self.file_format == "csv":
+            if "csv_sizes" not in state:
+                # Record where the partitions end before the first window, so even
+                # that one can be rolled back
+                state["csv_sizes"] = self._csv_sizes()
+                self._save_state(state)
+            self._rollback_csv(state)
+
+        rows = 0
+        while start < date_end:
+            end = min(start + step * self.window_buckets, date_end)
+            if self.client.measure_cache is None:
+                # Nothing to reuse, so parse the response as it streams in
+                records = self.client.iter_home_measure(scale, date_begin=start, date_end=end)
+            else:
+                records = iter_measure_records(self.client.get_home_measure(scale, date_begin=start, date_end=end))
+            records = (record for record in records if start <= record[2] < end)
+            rows += self._write_window(home_id, scale, start, records)
+            state[state_key] = end
+            if self.file_format == "csv":
+                state["csv_sizes"] = self._csv_sizes()
+            self._save_state(state)
+            start = end
+        return rows
+
+    def _write_window(self, home_id: str, scale: str, window_start: int,
+                      records: Iterable[Tuple[str, str, int, float]]) -> int:
+        """Write one window of records into its month partitions"""
+        if self.file_format == "csv":
+            return self._write_csv(home_id, scale, records)
+        return self._write_parquet(home_id, scale, window_start, records)
+
+    def _partition_dir(self, home_id: str, scale: str, timestamp: int) -> str:
+        month = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m")
+        path = os.path.join(self.directory, f"home_id={home_id}", f"scale={scale}", f"month={month}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _write_csv(self, home_id: str, scale: str, records: Iterable[Tuple[str, str, int, float]]) -> int:
+        files = {}
+        writers = {}
+        rows = 0
+        try:
+            for room_id, measure_type, timestamp, value in records:
+                month_start = _month_key(timestamp)
+                writer = writers.get(month_start)
+                if writer is None:
+                    path = os.path.join(self._partition_dir(home_id, scale, timestamp), "measures.csv")
+                    is_new = not os.path.exists(path)
+                    files[month_start] = open(path, "a", newline="")
+                    writer = writers[month_start] = csv.writer(files[month_start])
+                    if is_new:
+                        writer.writerow(COLUMNS)
+                writer.writerow([home_id, room_id, measure_type, timestamp, value])
+                rows += 1
+        finally:
+            for f in files.values():
+                f.close()
+        return rows
+
+    def _write_parquet(self, home_id: str, scale: str, window_start: int,
+                       records: Iterable[Tuple[str, str, int, float]]) -> int:
+        pa, pq = _import_pyarrow()
+        partitions = {}
+        for room_id, measure_type, timestamp, value in records:
+            columns = partitions.setdefault(_month_key(timestamp), ([], [], [], [], timestamp))
+            columns[0].append(room_id)
+            columns[1].append(measure_type)
+            columns[2].append(timestamp)
+            columns[3].append(float(value))
+
+        rows = 0
+        for room_ids, types, timestamps, values, first_timestamp in partitions.values():
+            table = pa.table({
+                "home_id": pa.array([home_id] * len(room_ids), pa.string()).dictionary_encode(),
+                "room_id": pa.array(room_ids, pa.string()).dictionary_encode(),
+                "type": pa.array(types, pa.string()).dictionary_encode(),
+                "timestamp": pa.array(timestamps, pa.int64()),
+                "value": pa.array(values, pa.float64()),
+            })
+            path = os.path.join(self._partition_dir(home_id, scale, first_timestamp), f"part-{window_start}.parquet")
+            pq.write_table(table, path)
+            rows += len(room_ids)
+        return rows
+
+    def _csv_sizes(self) -> Dict[str, int]:
+        """Size of every CSV partition, keyed by its path relative to the export directory"""
+        sizes = {}
+        for root, _, files in os.walk(self.directory):
+            if "measures.csv" in files:
+                path = os.path.join(root, "measures.csv")
+                sizes[os.path.relpath(path, self.directory)] = os.path.getsize(path)
+        return sizes
+
+    def _rollback_csv(self, state: Dict) -> None:
+        """Remove rows appended by a window that was interrupted before its progress was saved"""
+        committed = state.get("csv_sizes")
+        if committed is None:
+            return
+        for relpath, size in self._csv_sizes().items():
+            path = os.path.join(self.directory, relpath)
+            if relpath not in committed:
+                os.remove(path)
+            elif size > committed[relpath]:
+                with open(path, "r+b") as f:
+                    f.truncate(committed[relpath])
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state: Dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+
+def _month_key(timestamp: int) -> Tuple[int, int]:
+    date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return date.year, date.month
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from e
+    return pyarrow, pyarrow.parquet
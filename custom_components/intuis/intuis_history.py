@@ -0,0 +1,139 @@
+"""In-memory per-room history of polled temperatures"""
+import threading
+from typing import Optional
+
+import numpy as np
+
+# Columns of a history sample
+TIMESTAMP, TEMPERATURE, SETPOINT, HEATING_POWER = range(4)
+
+
+class RoomHistory:
+    """Fixed-size ring buffer of (timestamp, temperature, setpoint, heating power) samples
+
+    Samples live in one preallocated NumPy array, so appending never
+    allocates and the helpers work on whole columns at once. Missing
+    values are stored as NaN.
+    """
+
+    def __init__(self, capacity: int = 288) -> None:
+        """Initialize the history
+
+        Args:
+            capacity (int): Samples kept; the oldest are overwritten first.
+                288 covers a day of 5-minute polls.
+        """
+        self.capacity = capacity
+        self._samples = np.full((capacity, 4), np.nan)
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, temperature: Optional[float], setpoint: Optional[float],
+               heating_power: Optional[float]) -> None:
+        """
+        Add a sample. A sample with the same timestamp as the last one is ignored.
+
+        Args:
+            timestamp (float): Unix time of the sample
+            temperature (float, optional): Measured temperature in Celsius
+            setpoint (float, optional): Target temperature in Celsius
+            heating_power (float, optional): Heating power request (0-100)
+        """
+        with self._lock:
+            if self._count and self._samples[(self._next - 1) % self.capacity, TIMESTAMP] == timestamp:
+                return
+            self._samples[self._next] = (
+                timestamp,
+                np.nan if temperature is None else temperature,
+                np.nan if setpoint is None else setpoint,
+                np.nan if heating_power is None else heating_power,
+            )
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def samples(self, window: Optional[float] = None) -> np.ndarray:
+        """
+        Get a copy of the samples, oldest first.
+
+        Args:
+            window (float, optional): Only return samples from the last window seconds
+
+        Returns:
+            np.ndarray: Array of shape (n, 4); see the TIMESTAMP, TEMPERATURE,
+                SETPOINT and HEATING_POWER column indexes
+        """
+        with self._lock:
+            if self._count < self.capacity:
+                samples = self._samples[:self._count].copy()
+            else:
+                samples = np.roll(self._samples, -self._next, axis=0)
+        if window is not None and len(samples):
+            samples = samples[samples[:, TIMESTAMP] >= samples[-1, TIMESTAMP] - window]
+        return samples
+
+    def slope(self, window: float = 3600) -> Optional[float]:
+        """
+        Rate of change of the measured temperature, by least squares.
+
+        Args:
+            window (float): Seconds of recent history to fit
+
+        Returns:
+            float: Degrees Celsius per hour, or None with fewer than two samples
+        """
+        samples = self.samples(window)
+        samples = samples[~np.isnan(samples[:, TEMPERATURE])]
+        if len(samples) < 2:
+            return None
+        hours = (samples[:, TIMESTAMP] - samples[0, TIMESTAMP]) / 3600.0
+        centred = hours - hours.mean()
+        denominator = np.dot(centred, centred)
+        if denominator == 0:
+            return None
+        return float(np.dot(centred, samples[:, TEMPERATURE] - samples[:, TEMPERATURE].mean()) / denominator)
+
+    def moving_average(self, points: int = 5) -> np.ndarray:
+        """
+        Moving average of the measured temperature.
+
+        Args:
+            points (int): Number of samples averaged
+
+        Returns:
+            np.ndarray: One value per sample from the points-th sample on
+        """
+        temperatures = self.samples()[:, TEMPERATURE]
+        if len(temperatures) < points:
+            return np.zeros(0)
+        cumulative = np.cumsum(np.insert(temperatures, 0, 0.0))
+        return (cumulative[points:] - cumulative[:-points]) / points
+
+    def time_to_setpoint(self, window: float = 3600) -> Optional[float]:
+        """
+        Estimate the time until the measured temperature reaches the setpoint.
+
+        Args:
+            window (float): Seconds of recent history used for the trend
+
+        Returns:
+            float: Seconds until the setpoint is reached, 0 if already there,
+                or None if the trend is flat or heading away from it
+        """
+        samples = self.samples(window)
+        if not len(samples):
+            return None
+        temperature = samples[-1, TEMPERATURE]
+        setpoint = samples[-1, SETPOINT]
+        if np.isnan(temperature) or np.isnan(setpoint):
+            return None
+        gap = setpoint - temperature
+        if abs(gap) < 0.05:
+            return 0.0
+        rate = self.slope(window)
+        if not rate or (gap > 0) != (rate > 0):
+            return None
+        return float(gap / rate * 3600)
@@ -0,0 +1,182 @@
+"""Latency from a write command to the status poll confirming it"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Temperatures closer than this to the requested one count as confirmed
+TEMPERATURE_TOLERANCE = 0.05
+
+
+class CommandTracker:
+    """Tracks write commands until a homestatus poll reflects them
+
+    Each room or module a command targets is tracked on its own, with the
+    raw homestatus fields it is expected to show. Every later status is
+    checked against the pending targets, and once a target's fields all
+    match, the time since the command returned is recorded under the
+    command's endpoint and home.
+
+    Latencies are measured at poll resolution: a command confirmed by the
+    first poll after it was sent may have propagated well before that poll.
+    The polls counter of each sample tells how many statuses saw the
+    target unconfirmed first.
+    """
+
+    def __init__(self, timeout: float = 900.0, max_samples: int = 1000) -> None:
+        """Initialize the tracker
+
+        Args:
+            timeout (float): Seconds after which an unconfirmed command is given up on
+            max_samples (int): Latencies kept per endpoint and home for the percentiles
+        """
+        self.timeout = timeout
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._pending = {}  # (home ID, kind, target ID) -> pending command
+        self._series = {}  # (endpoint, home ID) -> counters and recent latencies
+
+    def track(self, endpoint: str, home_id: str, rooms: Optional[Dict[str, Dict]] = None,
+              modules: Optional[Dict[str, Dict]] = None, sent_at: Optional[float] = None) -> None:
+        """
+        Start tracking a command that was just accepted by the API.
+
+        A pending command for the same room or module is superseded, since
+        the status can no longer be expected to reflect it.
+
+        Args:
+            endpoint (str): API endpoint the command was sent to
+            home_id (str): Home ID
+            rooms (Dict[str, Dict], optional): Expected homestatus room fields, keyed by room ID
+            modules (Dict[str, Dict], optional): Expected homestatus module fields, keyed by module ID
+            sent_at (float, optional): Unix time the command returned. Defaults to now.
+        """
+        sent_at = time.time() if sent_at is None else sent_at
+        with self._lock:
+            series = self._get_series(endpoint, home_id)
+            for kind, targets in (("rooms", rooms or {}), ("modules", modules or {})):
+                for target_id, expected in targets.items():
+                    key = (home_id, kind, target_id)
+                    previous = self._pending.get(key)
+                    if previous is not None:
+                        self._get_series(previous["endpoint"], home_id)["superseded"] += 1
+                    self._pending[key] = {
+                        "endpoint": endpoint,
+                        "expected": dict(expected),
+                        "sent_at": sent_at,
+                        "polls": 0,
+                    }
+                    series["sent"] += 1
+
+    def observe(self, home_id: str, homestatus: Dict, received_at: Optional[float] = None) -> int:
+        """
+        Check a homestatus response against the pending commands of its home.
+
+        Rooms and modules missing from the response, e.g. because the poll
+        was filtered, are left pending.
+
+        Args:
+            home_id (str): Home ID the status is for
+            homestatus (Dict): Response from the homestatus endpoint
+            received_at (float, optional): Unix time the status was received. Defaults to now.
+
+        Returns:
+            int: Number of targets confirmed by this status
+        """
+        received_at = time.time() if received_at is None else received_at
+        home = homestatus.get("body", {}).get("home", {})
+        confirmed = 0
+        with self._lock:
+            self._expire(received_at)
+            if not self._pending:
+                return 0
+            for kind in ("rooms", "modules"):
+                for entity in home.get(kind, []):
+                    key = (home_id, kind, entity.get("id"))
+                    command = self._pending.get(key)
+                    if command is None:
+                        continue
+                    if not all(_matches(entity.get(field), value) for field, value in command["expected"].items()):
+                        command["polls"] += 1
+                        continue
+                    del self._pending[key]
+                    series = self._get_series(command["endpoint"], home_id)
+                    series["confirmed"] += 1
+                    series["latencies"].append(max(received_at - command["sent_at"], 0.0))
+                    series["polls"].append(command["polls"] + 1)
+                    confirmed += 1
+        return confirmed
+
+    def pending(self) -> int:
+        """Return the number of targets waiting for confirmation"""
+        with self._lock:
+            return len(self._pending)
+
+    def get_stats(self, now: Optional[float] = None) -> Dict:
+        """
+        Return latency distributions per endpoint and home.
+
+        Args:
+            now (float, optional): Current time, for expiring unconfirmed commands
+
+        Returns:
+            Dict: {endpoint: {home ID: counters and latency percentiles in seconds}}
+        """
+        now = time.time() if now is None else now
+        stats = {}
+        with self._lock:
+            self._expire(now)
+            for (endpoint, home_id), series in self._series.items():
+                latencies = sorted(series["latencies"])
+                polls = list(series["polls"])
+                stats.setdefault(endpoint, {})[home_id] = {
+                    "sent": series["sent"],
+                    "confirmed": series["confirmed"],
+                    "timed_out": series["timed_out"],
+                    "superseded": series["superseded"],
+                    "pending": sum(1 for key, command in self._pending.items()
+                                   if key[0] == home_id and command["endpoint"] == endpoint),
+                    "samples": len(latencies),
+                    "mean": sum(latencies) / len(latencies) if latencies else None,
+                    "p50": _percentile(latencies, 50),
+                    "p90": _percentile(latencies, 90),
+                    "p99": _percentile(latencies, 99),
+                    "max": latencies[-1] if latencies else None,
+                    "mean_polls": sum(polls) / len(polls) if polls else None,
+                }
+        return stats
+
+    def _get_series(self, endpoint: str, home_id: str) -> Dict:
+        series = self._series.get((endpoint, home_id))
+        if series is None:
+            series = self._series[(endpoint, home_id)] = {
+                "sent": 0,
+                "confirmed": 0,
+                "timed_out": 0,
+                "superseded": 0,
+                "latencies": deque(maxlen=self.max_samples),
+                "polls": deque(maxlen=self.max_samples),
+            }
+        return series
+
+    def _expire(self, now: float) -> None:
+        """Give up on commands pending for longer than the timeout"""
+        expired = [key for key, command in self._pending.items() if now - command["sent_at"] > self.timeout]
+        for key in expired:
+            command = self._pending.pop(key)
+            self._get_series(command["endpoint"], key[0])["timed_out"] += 1
+
+
+def _matches(actual: Any, expected: Any) -> bool:
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        return isinstance(actual, (int, float)) and abs(actual - expected) < TEMPERATURE_TOLERANCE
+    return actual == expected
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = math.ceil(percent / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
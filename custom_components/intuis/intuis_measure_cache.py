@@ -0,0 +1,319 @@
+"""SQLite cache of gethomemeasure buckets, shared across processes"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from intuis_measures import SCALE_SECONDS, iter_measure_records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measures (
+    home_id TEXT NOT NULL,
+    room_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    scale TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    value REAL,
+    closed INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (home_id, room_id, type, scale, bucket)
+);
+CREATE INDEX IF NOT EXISTS measures_fetched ON measures (fetched_at);
+CREATE TABLE IF NOT EXISTS coverage (
+    home_id TEXT NOT NULL,
+    room_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    scale TEXT NOT NULL,
+    date_begin INTEGER NOT NULL,
+    date_end INTEGER NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS coverage_key ON coverage (home_id, room_id, type, scale, date_begin);
+"""
+
+
+class MeasureCache:
+    """Local cache of measure buckets keyed by home, room, type, scale and bucket
+
+    The cache remembers which ranges were fetched for each room and type,
+    so buckets the API returned no value for are not asked for again.
+    Buckets that ended before the fetch are closed and never rewritten;
+    the still-open tail of a range expires after open_ttl seconds. Buckets
+    are evicted by when they were fetched, not by how old they are, so a
+    query far in the past is not fetched again on every run.
+
+    The database runs in WAL mode, so several processes (CLI runs, Home
+    Assistant) can share one file.
+    """
+
+    def __init__(self, path: str, open_ttl: float = 300.0, max_age: Optional[float] = 400 * 86400,
+                 max_rows: Optional[int] = 1_000_000) -> None:
+        """Initialize the cache, creating the database if needed
+
+        Args:
+            path (str): Path of the SQLite database
+            open_ttl (float): Seconds an open bucket is served before being fetched again
+            max_age (float, optional): Evict buckets fetched more than this many seconds ago
+            max_rows (int, optional): Evict the least recently fetched buckets beyond this many rows
+        """
+        self.path = path
+        self.open_ttl = open_ttl
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def missing(self, home_id: str, room_ids: Iterable[str], types: Iterable[str], scale: str,
+                date_begin: int, date_end: int, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """
+        Find the ranges that still have to be fetched for a query.
+
+        One gethomemeasure request covers every room and type, so the ranges
+        missing for each room and type are merged together.
+
+        Args:
+            home_id (str): Home ID
+            room_ids (Iterable[str]): Rooms of the query
+            types (Iterable[str]): Measure types of the query
+            scale (str): Time scale of the buckets
+            date_begin (int): Unix timestamp of the start of the query
+            date_end (int): Unix timestamp of the end of the query
+            now (float, optional): Current time, for open bucket expiry
+
+        Returns:
+            List[Tuple[int, int]]: Sorted, non-overlapping (begin, end) ranges
+        """
+        now = time.time() if now is None else now
+        gaps = []
+        with self._lock:
+            for room_id in room_ids:
+                for measure_type in types:
+                    covered = self._conn.execute(
+                        "SELECT date_begin, date_end FROM coverage WHERE home_id = ? AND room_id = ? "
+                        "AND type = ? AND scale = ? AND date_begin < ? AND date_end > ? "
+                        "AND (expires_at IS NULL OR expires_at > ?) ORDER BY date_begin",
+                        (home_id, room_id, measure_type, scale, date_end, date_begin, now),
+                    ).fetchall()
+                    gaps.extend(_subtract((date_begin, date_end), covered))
+        gaps = _merge(gaps)
+        if gaps:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return gaps
+
+    def store(self, home_id: str, room_ids: Iterable[str], types: Iterable[str], scale: str,
+              date_begin: int, date_end: int, measures: Dict, now: Optional[float] = None) -> int:
+        """
+        Store a gethomemeasure response covering the given range.
+
+        Args:
+            home_id (str): Home ID
+            room_ids (Iterable[str]): Rooms that were requested
+            types (List[str]): Measure types that were requested
+            scale (str): Time scale of the buckets
+            date_begin (int): Unix timestamp of the start of the request
+            date_end (int): Unix timestamp of the end of the request
+            measures (Dict): Parsed gethomemeasure response
+            now (float, optional): Time of the fetch
+
+        Returns:
+            int: Number of buckets stored
+        """
+        now = time.time() if now is None else now
+        types = list(types)
+        # A bucket starting before this has ended and can no longer change
+        closed_until = int(now) - SCALE_SECONDS.get(scale, 0)
+        rows = [
+            (home_id, room_id, measure_type, scale, timestamp, value, int(timestamp < closed_until), now)
+            for room_id, measure_type, timestamp, value in iter_measure_records(measures, types)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO measures VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                # Closed buckets keep their value, but count as fetched again for eviction
+                "ON CONFLICT (home_id, room_id, type, scale, bucket) DO UPDATE SET "
+                "value = CASE WHEN measures.closed THEN measures.value ELSE excluded.value END, "
+                "closed = MAX(measures.closed, excluded.closed), fetched_at = excluded.fetched_at",
+                rows,
+            )
+            for room_id in room_ids:
+                for measure_type in types:
+                    key = (home_id, room_id, measure_type, scale)
+                    if date_begin < closed_until:
+                        self._cover(key, date_begin, min(date_end, closed_until))
+                    if date_end > closed_until:
+                        # The open tail is served until it expires, including buckets
+                        # that start after the fetch
+                        self._conn.execute(
+                            "INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            key + (max(date_begin, closed_until), max(date_end, int(now + self.open_ttl)),
+                                   now + self.open_ttl),
+                        )
+            self._conn.execute("DELETE FROM coverage WHERE expires_at <= ?", (now,))
+        # Never evict what was just stored
+        self._evict(now, now)
+        return len(rows)
+
+    def load(self, home_id: str, room_ids: Iterable[str], types: Iterable[str], scale: str,
+             date_begin: int, date_end: int) -> Dict:
+        """
+        Build a gethomemeasure-style response from the cache.
+
+        Each room gets one measure chunk per run of consecutive buckets of a
+        type, in the per-chunk "type" layout read by intuis_measures.
+
+        Args:
+            home_id (str): Home ID
+            room_ids (Iterable[str]): Rooms to include
+            types (Iterable[str]): Measure types to include
+            scale (str): Time scale of the buckets
+            date_begin (int): Unix timestamp of the first bucket
+            date_end (int): Unix timestamp of the end of the range
+
+        Returns:
+            Dict: The response
+        """
+        step = SCALE_SECONDS.get(scale, 0)
+        types = list(types)
+        rooms = []
+        with self._lock:
+            for room_id in room_ids:
+                rows = self._conn.execute(
+                    f"SELECT type, bucket, value FROM measures WHERE home_id = ? AND room_id = ? "
+                    f"AND scale = ? AND type IN ({', '.join('?' * len(types))}) "
+                    f"AND bucket >= ? AND bucket < ? ORDER BY type, bucket",
+                    (home_id, room_id, scale, *types, date_begin, date_end),
+                ).fetchall()
+                chunks = []
+                for measure_type, bucket, value in rows:
+                    chunk = chunks[-1] if chunks else None
+                    if (chunk is None or chunk["type"] != measure_type
+                            or chunk["beg_time"] + chunk["step_time"] * len(chunk["value"]) != bucket):
+                        chunk = {"beg_time": bucket, "step_time": step, "type": measure_type, "value": []}
+                        chunks.append(chunk)
+                    chunk["value"].append([value])
+                rooms.append({"id": room_id, "type": types, "measures": chunks})
+        return {"body": {"home": {"id": home_id, "rooms": rooms}}, "status": "ok"}
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Evict buckets fetched more than max_age ago, then the least recently
+        fetched beyond max_rows.
+
+        Args:
+            now (float, optional): Current time
+
+        Returns:
+            int: Number of buckets evicted
+        """
+        return self._evict(time.time() if now is None else now)
+
+    def _evict(self, now: float, fetched_before: Optional[float] = None) -> int:
+        """Evict as evict() does, sparing buckets fetched at or after fetched_before"""
+        conditions = []
+        params = []
+        with self._lock:
+            if self.max_age is not None:
+                conditions.append("fetched_at < ?")
+                params.append(now - self.max_age)
+            if self.max_rows is not None:
+                row = self._conn.execute(
+                    "SELECT fetched_at FROM measures ORDER BY fetched_at DESC LIMIT 1 OFFSET ?", (self.max_rows,)
+                ).fetchone()
+                if row is not None:
+                    conditions.append("fetched_at <= ?")
+                    params.append(row[0])
+            if not conditions:
+                return 0
+            where = f"({' OR '.join(conditions)})"
+            if fetched_before is not None:
+                where += " AND fetched_at < ?"
+                params.append(fetched_before)
+            with self._conn:
+                spans = self._conn.execute(
+                    f"SELECT home_id, room_id, type, scale, MIN(bucket), MAX(bucket) FROM measures "
+                    f"WHERE {where} GROUP BY home_id, room_id, type, scale",
+                    params,
+                ).fetchall()
+                evicted = self._conn.execute(f"DELETE FROM measures WHERE {where}", params).rowcount
+                # Forget the evicted span of each room and type, so it is fetched again if asked for.
+                # Buckets kept inside a span are fetched again too, which is harmless.
+                for home_id, room_id, measure_type, scale, first, last in spans:
+                    self._uncover((home_id, room_id, measure_type, scale),
+                                  first, last + max(SCALE_SECONDS.get(scale, 0), 1))
+        return evicted
+
+    def clear(self) -> None:
+        """Remove everything from the cache"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM measures")
+            self._conn.execute("DELETE FROM coverage")
+
+    def get_stats(self) -> Dict:
+        """Return query hits and misses and the number of cached buckets"""
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM measures").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "buckets": rows}
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._conn.close()
+
+    def _cover(self, key: Tuple, date_begin: int, date_end: int) -> None:
+        """Record a closed range as fetched, merging it with touching closed ranges"""
+        where = ("home_id = ? AND room_id = ? AND type = ? AND scale = ? AND expires_at IS NULL "
+                 "AND date_begin <= ? AND date_end >= ?")
+        params = key + (date_end, date_begin)
+        touching = self._conn.execute(f"SELECT MIN(date_begin), MAX(date_end) FROM coverage WHERE {where}",
+                                      params).fetchone()
+        if touching[0] is not None:
+            self._conn.execute(f"DELETE FROM coverage WHERE {where}", params)
+            date_begin = min(date_begin, touching[0])
+            date_end = max(date_end, touching[1])
+        self._conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?, NULL)", key + (date_begin, date_end))
+
+
+    def _uncover(self, key: Tuple, date_begin: int, date_end: int) -> None:
+        """Remove a range from the recorded ranges of one room, type and scale"""
+        where = "home_id = ? AND room_id = ? AND type = ? AND scale = ? AND date_begin < ? AND date_end > ?"
+        params = key + (date_end, date_begin)
+        overlapping = self._conn.execute(f"SELECT date_begin, date_end, expires_at FROM coverage WHERE {where}",
+                                         params).fetchall()
+        self._conn.execute(f"DELETE FROM coverage WHERE {where}", params)
+        for begin, end, expires_at in overlapping:
+            for kept in ((begin, min(end, date_begin)), (max(begin, date_end), end)):
+                if kept[0] < kept[1]:
+                    self._conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       key + kept + (expires_at,))
+
+
+def _subtract(interval: Tuple[int, int], covered: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the parts of interval not covered by the sorted covered ranges"""
+    begin, end = interval
+    gaps = []
+    for covered_begin, covered_end in covered:
+        if covered_begin > begin:
+            gaps.append((begin, min(covered_begin, end)))
+        begin = max(begin, covered_end)
+        if begin >= end:
+            break
+    if begin < end:
+        gaps.append((begin, end))
+    return gaps
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or touching ranges"""
+    merged = []
+    for begin, end in sorted(intervals):
+        if merged and begin <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((begin, end))
+    return merged
@@ -0,0 +1,204 @@
+"""Helpers for reading gethomemeasure responses"""
+import codecs
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Measure types requested by default for every room and water heater
+MEASURE_TYPES = [
+    "sum_energy_elec_hot_water",
+    "sum_energy_elec_heating",
+    "sum_energy_elec",
+    "sum_energy_elec$0",
+    "sum_energy_elec$1",
+    "sum_energy_elec$2",
+]
+
+# Length of one bucket, in seconds, for each supported scale
+SCALE_SECONDS = {
+    "30min": 1800,
+    "1hour": 3600,
+    "3hours": 10800,
+    "1day": 86400,
+    "1week": 604800,
+}
+
+
+def iter_room_records(room: Dict, types: Optional[List[str]] = None) -> Iterator[Tuple[str, str, int, float]]:
+    """
+    Yield measure records for one room of a gethomemeasure response.
+
+    Each entry of room["measures"] is a chunk with "beg_time", "step_time"
+    and "value". A chunk either carries its own "type", in which case each
+    value is one bucket of that type, or values are rows of one column per
+    type, in the order of room["type"] (falling back to types).
+
+    Args:
+        room (Dict): Room entry of a gethomemeasure response
+        types (List[str], optional): Types requested for the room
+
+    Returns:
+        Iterator: (room_id, type, timestamp, value) tuples; empty buckets are skipped
+    """
+    room_id = room.get("id")
+    columns = room.get("type") or types or MEASURE_TYPES
+    if isinstance(columns, str):
+        columns = [columns]
+    for chunk in room.get("measures", []):
+        timestamp = int(chunk.get("beg_time", 0))
+        step = int(chunk.get("step_time", 0))
+        chunk_type = chunk.get("type")
+        for row in chunk.get("value", []):
+            if chunk_type is not None:
+                value = row[0] if isinstance(row, list) else row
+                if value is not None:
+                    yield room_id, chunk_type, timestamp, value
+            else:
+                if not isinstance(row, list):
+                    row = [row]
+                for measure_type, value in zip(columns, row):
+                    if value is not None:
+                        yield room_id, measure_type, timestamp, value
+            timestamp += step
+
+
+def iter_measure_records(measures: Dict, types: Optional[List[str]] = None) -> Iterator[Tuple[str, str, int, float]]:
+    """
+    Yield measure records for every room of a gethomemeasure response.
+
+    Args:
+        measures (Dict): Parsed gethomemeasure response
+        types (List[str], optional): Types that were requested
+
+    Returns:
+        Iterator: (room_id, type, timestamp, value) tuples
+    """
+    if not measures:
+        return
+    for room in measures.get("body", {}).get("home", {}).get("rooms", []):
+        yield from iter_room_records(room, types)
+
+
+def iter_streamed_records(chunks: Iterable[bytes], types: Optional[List[str]] = None) -> Iterator[Tuple[str, str, int, float]]:
+    """
+    Yield measure records from a gethomemeasure response as it is received.
+
+    Only one room entry of the response is decoded at a time, so memory
+    stays bounded by the largest room rather than the whole response.
+
+    Args:
+        chunks (Iterable[bytes]): Response body, e.g. response.iter_content()
+        types (List[str], optional): Types that were requested
+
+    Returns:
+        Iterator: (room_id, type, timestamp, value) tuples
+    """
+    for room in iter_json_array(chunks, ("body", "home", "rooms")):
+        yield from iter_room_records(room, types)
+
+
+def iter_json_array(chunks: Iterable[bytes], path: Tuple[str, ...]) -> Iterator:
+    """
+    Incrementally decode the elements of the array at path in a JSON document.
+
+    Values off the path are decoded one by one and dropped; elements of the
+    target array are yielded as soon as each one is complete.
+
+    Args:
+        chunks (Iterable[bytes]): UTF-8 encoded JSON document, in pieces
+        path (Tuple[str, ...]): Object keys leading to the array
+
+    Returns:
+        Iterator: The decoded array elements
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    return _JSONStream(chunks).iter_array(path)
+
+
+class _JSONStream:
+    """Pull parser over a chunked JSON document, decoding one value at a time"""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def iter_array(self, path: Tuple[str, ...]) -> Iterator:
+        yield from self._walk((), path)
+
+    def _walk(self, current: Tuple[str, ...], path: Tuple[str, ...]) -> Iterator:
+        char = self._peek()
+        if current == path and char == "[":
+            self._pos += 1
+            if self._peek() == "]":
+                self._pos += 1
+                return
+            while True:
+                yield self._value()
+                if self._expect(",]") == "]":
+                    return
+        elif char == "{" and current == path[:len(current)]:
+            self._pos += 1
+            if self._peek() == "}":
+                self._pos += 1
+                return
+            while True:
+                key = self._value()
+                self._expect(":")
+                yield from self._walk(current + (key,), path)
+                if self._expect(",}") == "}":
+                    return
+        else:
+            self._value()
+
+    def _value(self):
+        """Decode the next complete value"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise ValueError(f"Invalid JSON at character {self._pos}") from None
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            self._read(len(self._buffer) - self._pos)
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at character {self._pos}, found {char!r}")
+        self._pos += 1
+        return char
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                raise ValueError("Unexpected end of JSON document")
+            self._read(0)
+
+    def _read(self, at_least: int) -> None:
+        """Drop consumed text and read more, at least doubling what is left to decode"""
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        target = len(self._buffer) + max(at_least, 1)
+        while len(self._buffer) < target and not self._eof:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._buffer += self._utf8.decode(b"", final=True)
+                self._eof = True
+            else:
+                self._buffer += self._utf8.decode(chunk)
@@ -1,16 +1,84 @@
 import requests
 import json
-from typing import Dict, Optional, Union
+import copy
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 
+from intuis_history import RoomHistory
+from intuis_measures import MEASURE_TYPES, SCALE_SECONDS, iter_streamed_records
+from intuis_token_store import token_store_key
+
+DEFAULT_BASE_URL = "https://app.muller-intuitiv.net"
+
+# Shared no-op span used while no profiler is attached
+_NO_SPAN = nullcontext()
+
+# What to keep of raw homesdata, homestatus and measures payloads once parsed:
+# "full" keeps the latest of each, "none" keeps nothing and "ring" keeps
+# recent payloads only in the size-bounded client.debug_ring
+RETENTION_MODES = ["full", "none", "ring"]
+
+# Module types homestatus can be filtered on: routers, heaters and water heaters
+DEVICE_TYPES = ["NMG", "NMH", "NMW"]
+
+
+def token_request_data(username: str, password: str, client_id: str, client_secret: str) -> Dict:
+    """
+    Build the form data for a password grant against /oauth2/token.
+
+    Args:
+        username (str): Intuis account username
+        password (str): Intuis account password
+        client_id (str): Intuis client ID
+        client_secret (str): Intuis client secret
+
+    Returns:
+        Dict: Form fields for the token request
+    """
+    return {
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "grant_type": "password",
+        "user_prefix": "muller",
+        "scope": "read_muller write_muller",
+        "username": username,
+        "password": password
+    }
+
+
+def token_refresh_data(refresh_token: str, client_id: str, client_secret: str) -> Dict:
+    """
+    Build the form data for a refresh token grant against /oauth2/token.
+
+    Args:
+        refresh_token (str): Refresh token from an earlier grant
+        client_id (str): Intuis client ID
+        client_secret (str): Intuis client secret
+
+    Returns:
+        Dict: Form fields for the token request
+    """
+    return {
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token
+    }
+
+
 class IntuisNetatmo:
-    
-    def __init__(self, username: str, password: str, client_id: str, client_secret: str, base_url: str = "https://app.muller-intuitiv.net"):
-        self.do_init(username, password, client_id, client_secret, base_url)
 
-    def __init__(self, base_url: str = "https://app.muller-intuitiv.net"):
+    def __init__(self, username: str = None, password: str = None, client_id: str = None,
+                 client_secret: str = None, base_url: str = DEFAULT_BASE_URL):
         """
         Initialize the IntuisNetatmo client.
+
+        Credentials that are not given are loaded from secrets.json.
         
         Args:
             username (str): Your Intuis account username
@@ -19,15 +87,16 @@ class IntuisNetatmo:
             client_secret (str): Your Intuis client secret
             base_url (str): Base URL for the Intuis API
         """
-        try:
-            with open("secrets.json") as f:
-                secrets = json.load(f)
-            username =  secrets.get("username")
-            password =  secrets.get("password") 
-            client_id =  secrets.get("client_id")
-            client_secret =  secrets.get("client_secret")
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            raise ValueError("Missing credentials and could not load from secrets.json") from e
+        if not all([username, password, client_id, client_secret]):
+            try:
+                with open("secrets.json") as f:
+                    secrets = json.load(f)
+                username = username or secrets.get("username")
+                password = password or secrets.get("password")
+                client_id = client_id or secrets.get("client_id")
+                client_secret = client_secret or secrets.get("client_secret")
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                raise ValueError("Missing credentials and could not load from secrets.json") from e
             
         if not all([username, password, client_id, client_secret]):
             raise ValueError("Missing required credentials. Please provide all credentials or ensure they are in secrets.json")
@@ -44,19 +113,73 @@ class IntuisNetatmo:
         self.token = None
         self.refresh_token = None
         self.token_expiry = None
+        # Optional intuis_token_store.TokenStore sharing tokens between processes
+        self.token_store = None
         self.homesdata = None
         self.home_id = None
         self.home_name = None
+        self.room_names = {}  # Names of all rooms, including those without modules, keyed by room ID
+        self._room_ids_by_name = {}  # Room IDs keyed by lower-case room name
         self.homestatus = None
         self.router_id = None
-        self.rooms = {}  # Dictionary to store IntuisRoom objects, keyed by room ID
-        self.water_heaters = {}  # Dictionary to store WaterHeater objects, keyed by module ID
+        # Immutable view of rooms, water heaters and module status, replaced
+        # wholesale on every poll so readers never see a half-updated home.
+        self.snapshot = IntuisHomeSnapshot()
+        self._publish_lock = threading.Lock()  # Serialises snapshot writers only
         self.measures = None
+        # Collapses concurrent identical reads into a single HTTP request.
+        # Set single_flight.freshness_window (seconds) to also reuse a result
+        # for callers arriving just after a fetch completed.
+        self.single_flight = SingleFlight()
+        # Optional intuis_budget.RequestBudget pacing every request against the API quota
+        self.budget = None
+        # See RETENTION_MODES; long-running clients should use "none" or "ring"
+        self.retention = "full"
+        self.debug_ring = DebugRing()
+        # Optional intuis_snapshots.SnapshotWriter keeping every raw payload on disk
+        self.snapshot_writer = None
+        # Optional intuis_timeline.TimelineWriter recording every status change
+        self.timeline = None
+        # Optional intuis_latency.CommandTracker timing writes until a poll confirms them
+        self.command_tracker = None
+        # Optional intuis_profiling.Profiler timing each phase of a poll
+        self.profiler = None
+        # Status samples kept per room in IntuisRoom.history
+        self.history_size = 288
+        # Optional intuis_measure_cache.MeasureCache serving measures already fetched
+        self.measure_cache = None
+        # Default filters for get_homestatus; None polls every device type and room
+        self.status_device_types = None
+        self.status_room_ids = None
+        self._modules_by_id = {}  # Modules from homesdata, keyed by module ID
+        # Seconds after which a device not polled or not seen counts as stale
+        self.stale_after = 900
+        self._watchdog_attempts = {}  # Device ID -> time of the last targeted refresh
+        self.targeted_refreshes = 0
+
+
+    @property
+    def rooms(self) -> Dict:
+        """IntuisRoom objects of the current snapshot, keyed by room ID"""
+        return self.snapshot.rooms
 
+    @property
+    def water_heaters(self) -> Dict:
+        """IntuisWaterHeater objects of the current snapshot, keyed by room ID"""
+        return self.snapshot.water_heaters
+
+    def _span(self, name: str):
+        """Time a phase if a profiler is attached; otherwise a shared no-op"""
+        if self.profiler is None:
+            return _NO_SPAN
+        return self.profiler.span(name)
 
     def _get_token(self) -> str:
         """
         Get or refresh the authentication token.
+
+        With a token_store set, the token is shared with other processes using
+        the same credentials and only one of them renews it.
         
         Returns:
             str: Authentication token
@@ -64,65 +187,156 @@ class IntuisNetatmo:
         if self.token and self.token_expiry and datetime.now().timestamp() < self.token_expiry:
             return self.token
 
+        if self.token_store is not None:
+            entry = self.token_store.get_token(self._token_key(), self._renew_token)
+            self.token = entry["access_token"]
+            self.refresh_token = entry["refresh_token"]
+            self.token_expiry = entry["expires_at"]
+            return self.token
+
+        self._set_token(self._renew_token({"refresh_token": self.refresh_token}))
+        return self.token
+
+    def _renew_token(self, entry: Optional[Dict]) -> Dict:
+        """
+        Request a new token, with the refresh token if there is one.
+
+        Args:
+            entry (Dict, optional): Expired token, with its refresh_token
+
+        Returns:
+            Dict: Token response
+        """
         url = f"{self.base_url}/oauth2/token"
-        data = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "grant_type": "password",
-            "user_prefix": "muller",
-            "scope": "read_muller write_muller",
-            "username": self.username,
-            "password": self.password
-        }
         headers = {
             "Content-Type": "application/x-www-form-urlencoded"
         }
+        refresh_token = entry.get("refresh_token") if entry else None
+        if refresh_token:
+            data = token_refresh_data(refresh_token, self.client_id, self.client_secret)
+            try:
+                return self._request("POST", url, data=data, headers=headers, priority=True).json()
+            except requests.HTTPError as e:
+                # The refresh token was revoked or has expired; log in again
+                print(f"Warning: Token refresh failed ({str(e)}), logging in with password")
+        data = token_request_data(self.username, self.password, self.client_id, self.client_secret)
+        return self._request("POST", url, data=data, headers=headers, priority=True).json()
 
-        response = self.session.post(url, data=data, headers=headers)
+    def _token_key(self) -> str:
+        return token_store_key(self.username, self.client_id)
+
+    def _request(self, method: str, url: str, priority: bool = False, **kwargs: Any) -> requests.Response:
+        """
+        Send an HTTP request to the Intuis API.
+
+        Waits for the request budget, if one is set, before sending. Priority
+        requests (commands and token renewals) are sent at once and only
+        charged to the budget, so a user's command never waits behind polls.
+
+        Args:
+            method (str): HTTP method
+            url (str): Full URL of the endpoint
+            priority (bool): Skip the wait for the budget
+            **kwargs: Passed on to requests.Session.request
+
+        Returns:
+            requests.Response: The successful response
+
+        Raises:
+            requests.HTTPError: If the API returned an error status
+        """
+        if self.budget is not None:
+            self.budget.acquire(priority=priority)
+        response = self.session.request(method, url, **kwargs)
         response.raise_for_status()
-        
-        result = response.json()
+        return response
+
+    def set_token(self, result: Dict) -> None:
+        """
+        Use a token obtained elsewhere, e.g. by the config flow credential probe.
+
+        The token is also saved to the token store, if one is set.
+
+        Args:
+            result (Dict): Token response with access_token, refresh_token and optionally expires_in
+        """
+        if self.token_store is not None:
+            self.token_store.put(self._token_key(), result)
+        self._set_token(result)
+
+    def _set_token(self, result: Dict) -> None:
         self.token = result.get("access_token")
         self.refresh_token = result.get("refresh_token")
-        # Assuming token expires in 1 hour
-        self.token_expiry = datetime.now().timestamp() + 3600
-        
-        return self.token
+        # Assume the token expires in 1 hour unless told otherwise
+        self.token_expiry = datetime.now().timestamp() + result.get("expires_in", 3600)
 
     def pull_data(self):
         """
         Pull all initial data from the Intuis API, and setup internal structures
         """
-        self.get_homesdata()
-        self.get_homestatus()
+        with self._span("pull_data"):
+            self.get_homesdata()
+            self.get_homestatus()
 
 
     def get_homesdata(self) -> Dict:
         """
         Get data about all homes associated with the account.
+
+        Concurrent callers share a single in-flight request.
         
         Returns:
             Dict: Homes data and their information
         """
-        token = self._get_token()
+        return self.single_flight.do(("homesdata",), self._fetch_homesdata)
+
+    def _fetch_homesdata(self) -> Dict:
+        with self._span("homesdata.token"):
+            token = self._get_token()
         url = f"{self.base_url}/api/homesdata"
         headers = {"Authorization": f"Bearer {token}"}
         
-        response = self.session.get(url, headers=headers)
-        response.raise_for_status()
+        with self._span("homesdata.request"):
+            response = self._request("GET", url, headers=headers)
+        with self._span("homesdata.parse_json"):
+            homesdata = response.json()
+        with self._span("homesdata.build_rooms"):
+            return self.load_homesdata(homesdata, len(response.content))
+
+    def load_homesdata(self, homesdata: Dict, size: Optional[int] = None) -> Dict:
+        """
+        Set up homes, rooms and water heaters from a homesdata response.
+
+        Args:
+            homesdata (Dict): Response from the homesdata endpoint
+            size (int, optional): Size of the response body in bytes, for the debug ring
 
+        Returns:
+            Dict: The homesdata that was loaded
+        """
         # Parse out the required info...
-        self.homesdata = response.json()
-        self.home_id = self.homesdata["body"]["homes"][0]["id"]
-        self.home_name = self.homesdata["body"]["homes"][0]["name"]
+        home = homesdata["body"]["homes"][0]
+        self.home_id = home["id"]
+        self.home_name = home["name"]
+        self.room_names = {room["id"]: room.get("name", "") for room in home.get("rooms", [])}
+        self._room_ids_by_name = {}
+        for room_id, name in self.room_names.items():
+            self._room_ids_by_name.setdefault(name.lower(), room_id)
         # Find the first NMG module (router) and store its ID
-        for module in self.homesdata["body"]["homes"][0]["modules"]:
+        for module in home["modules"]:
             if module.get("type") == "NMG":
                 self.router_id = module.get("id")
                 break
+        # Index modules by ID so matching rooms to modules is linear in home size
+        modules_by_id = {}
+        for module in home["modules"]:
+            modules_by_id.setdefault(module["id"], module)
+        self._modules_by_id = modules_by_id
         # Create IntuisRoom instances for each room
-        self.rooms = {}
-        for room in self.homesdata["body"]["homes"][0]["rooms"]:
+        previous_rooms = self.snapshot.rooms
+        rooms = {}
+        water_heaters = {}
+        for room in home["rooms"]:
             if "module_ids" in room and room["module_ids"]:
                 room_id = room["id"]
                 room_name = room["name"] 
@@ -131,45 +345,96 @@ class IntuisNetatmo:
                 intuis_water_heater = None
                 for module_id in room["module_ids"]:
                     # Find the module in the homesdata and add it to the room
-                    for module in self.homesdata["body"]["homes"][0]["modules"]:
-                        if module["id"] == module_id:
-                            if module["type"] == "NMH":
-                                if intuis_room == None:
-                                    intuis_room = IntuisRoom(
-                                            room_id=room_id,
-                                            room_name=room_name,
-                                            room_type=room_type
-                                            )
-                                intuis_room.add_module(module)  # Pass the entire module dictionary
-                            elif module["type"] == "NMW":
-                                if intuis_water_heater == None:
-                                    intuis_water_heater = IntuisWaterHeater(
-                                        room_id=room_id,
-                                        heater_id=module_id,
-                                        heater_name=room_name
+                    module = modules_by_id.get(module_id)
+                    if module is None:
+                        continue
+                    if module["type"] == "NMH":
+                        if intuis_room == None:
+                            intuis_room = IntuisRoom(
+                                    room_id=room_id,
+                                    room_name=room_name,
+                                    room_type=room_type
                                     )
-                            else:
-                                print(f"Warning: Unknown module type {module['type']} for room {room_name}")
-                            
-                            break                    
+                        intuis_room.add_module(module)  # Pass the entire module dictionary
+                    elif module["type"] == "NMW":
+                        if intuis_water_heater == None:
+                            intuis_water_heater = IntuisWaterHeater(
+                                room_id=room_id,
+                                heater_id=module_id,
+                                heater_name=room_name
+                            )
+                    else:
+                        print(f"Warning: Unknown module type {module['type']} for room {room_name}")
                 # Add modules to the room if any are defined
                 if intuis_room:
-                    self.rooms[room_id] = intuis_room
+                    # Keep the history of rooms that survive a topology reload
+                    previous_room = previous_rooms.get(room_id)
+                    intuis_room.history = previous_room.history if previous_room else RoomHistory(self.history_size)
+                    rooms[room_id] = intuis_room
                     print(f"Added room: {str(intuis_room)}")
                 if intuis_water_heater:
-                    self.water_heaters[room_id] = intuis_water_heater
+                    water_heaters[room_id] = intuis_water_heater
                     print(f"Added water heater: {str(intuis_water_heater)}")
 
-        return response.json()
+        with self._publish_lock:
+            self.snapshot = IntuisHomeSnapshot(
+                home_id=self.home_id,
+                home_name=self.home_name,
+                router_id=self.router_id,
+                rooms=rooms,
+                water_heaters=water_heaters,
+            )
+
+        self._retain("homesdata", homesdata, size)
+        return homesdata
 
-    def get_homestatus(self) -> Dict:
+    def get_homestatus(self, device_types: Optional[List[str]] = None,
+                       room_ids: Optional[List[str]] = None) -> Dict:
         """
         Get current status of the home including rooms and modules.
+
+        The status can be limited to some device types and rooms, e.g. only
+        heaters when only climate entities are in use. Only the selected
+        devices are merged into the snapshot; every other device keeps its
+        state. Concurrent callers share a single in-flight request.
+
+        Args:
+            device_types (List[str], optional): Module types to poll, from DEVICE_TYPES.
+                Defaults to status_device_types, or every type if that is None.
+            room_ids (List[str], optional): Rooms to merge. Defaults to status_room_ids,
+                or every room if that is None.
         
         Returns:
             Dict: Home status information including rooms and modules
+
+        Raises:
+            ValueError: If a device type is unknown
         """
-        token = self._get_token()
+        if device_types is None:
+            device_types = self.status_device_types
+        if room_ids is None:
+            room_ids = self.status_room_ids
+        if device_types is None and room_ids is None:
+            return self.single_flight.do(("homestatus", self.home_id), self._fetch_homestatus)
+
+        for device_type in device_types or []:
+            if device_type not in DEVICE_TYPES:
+                raise ValueError(f"Device type must be one of: {', '.join(DEVICE_TYPES)}")
+        merge_rooms = []
+        if device_types is None or "NMH" in device_types:
+            merge_rooms = [room_id for room_id in self.snapshot.rooms if room_ids is None or room_id in room_ids]
+        merge_modules = [
+            module_id for module_id, module in self._modules_by_id.items()
+            if (device_types is None or module.get("type") in device_types)
+            and (room_ids is None or module.get("room_id") is None or module.get("room_id") in room_ids)
+        ]
+        key = ("homestatus", self.home_id, "filtered", tuple(device_types or ()), tuple(room_ids or ()))
+        return self.single_flight.do(key, lambda: self._fetch_homestatus(merge_rooms, merge_modules, device_types))
+
+    def _fetch_homestatus(self, room_ids: Optional[List[str]] = None, module_ids: Optional[List[str]] = None,
+                          device_types: Optional[List[str]] = None) -> Dict:
+        with self._span("homestatus.token"):
+            token = self._get_token()
         url2 = f"{self.base_url}/syncapi/v1/homestatus"
         url1 = f"{self.base_url}/syncapi/v1/getconfigs"
         headers = {"Authorization": f"Bearer {token}", 
@@ -178,42 +443,291 @@ class IntuisNetatmo:
             "home_id": self.home_id
         }
 
-        response = self.session.post(url1, headers=headers, data=data)
-        response.raise_for_status()
-        response = self.session.post(url2, headers=headers, data=data)
-        response.raise_for_status()
-        self.homestatus = response.json()   
+        with self._span("homestatus.getconfigs"):
+            self._request("POST", url1, headers=headers, data=data)
+        if device_types:
+            data["device_types"] = list(device_types)
+        with self._span("homestatus.request"):
+            response = self._request("POST", url2, headers=headers, data=data)
+        with self._span("homestatus.parse_json"):
+            homestatus = response.json()
+        with self._span("homestatus.publish"):
+            self._publish_homestatus(homestatus, room_ids, module_ids)
+        if self.timeline is not None:
+            with self._span("homestatus.timeline"):
+                self.timeline.append(homestatus)
+        if self.command_tracker is not None:
+            self.command_tracker.observe(self.home_id, homestatus)
+        self._retain("homestatus", homestatus, len(response.content))
+        return homestatus
 
-        # Update room statuses
-        for room in self.rooms.values():
-            # Find matching room status by room ID
-            matching_room = next(
-                (r for r in self.homestatus["body"]["home"]["rooms"] if r["id"] == room.id),
-                None
-            )
-            if matching_room:
-                room.update_status(matching_room)
-            else:
-                print(f"Warning: No status found for room {room.id}")
+    def _retain(self, name: str, payload: Dict, size: Optional[int] = None) -> None:
+        """
+        Keep or drop a parsed raw payload according to the retention mode.
 
-        # Update water heater statuses
-        for water_heater in self.water_heaters.values():
-            matching_water_heater = next(
-                (r for r in self.homestatus["body"]["home"]["modules"] if r["id"] == water_heater.id),
-                None
-            )
-            if matching_water_heater:
-                water_heater.update_status(matching_water_heater)
+        With a snapshot_writer set, the payload is also queued to be written
+        to disk, whatever the retention mode.
+
+        Args:
+            name (str): Attribute holding the payload (homesdata, homestatus or measures)
+            payload (Dict): The raw payload
+            size (int, optional): Size of the payload in bytes, if known
+        """
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.submit(name, payload)
+        if self.retention == "full":
+            setattr(self, name, payload)
+            return
+        setattr(self, name, None)
+        if self.retention == "ring":
+            self.debug_ring.add(name, payload, size)
+
+    def _publish_homestatus(self, homestatus: Dict, room_ids: Optional[List[str]] = None,
+                            module_ids: Optional[List[str]] = None) -> None:
+        """
+        Build a new snapshot from a homestatus response and swap it in.
+
+        Published rooms and water heaters are never modified; updated copies
+        are built instead, so readers holding the previous snapshot keep a
+        consistent view.
+
+        Args:
+            homestatus (Dict): Response from the homestatus endpoint
+            room_ids (List[str], optional): Only merge these rooms; the rest keep their state
+            module_ids (List[str], optional): Only merge these modules; the rest keep their state
+        """
+        partial = room_ids is not None or module_ids is not None
+        room_status = {r["id"]: r for r in homestatus["body"]["home"].get("rooms", [])}
+        all_module_status = {m["id"]: m for m in homestatus["body"]["home"].get("modules", [])}
+        module_status = all_module_status
+        if partial:
+            room_status = {room_id: room_status[room_id] for room_id in room_ids or [] if room_id in room_status}
+            module_status = {module_id: all_module_status[module_id]
+                             for module_id in module_ids or [] if module_id in all_module_status}
+        status_time = homestatus.get("time_server") or time.time()
+        now = time.time()
+
+        with self._publish_lock:
+            current = self.snapshot
+            rooms = {}
+            for room_id, room in current.rooms.items():
+                matching_room = room_status.get(room.id)
+                if matching_room:
+                    room = room.with_status(matching_room)
+                    room.updated_at = now
+                    room_modules = [all_module_status[module["id"]] for module in room.associated_modules
+                                    if module["id"] in all_module_status]
+                    last_seen = [module["last_seen"] for module in room_modules if "last_seen" in module]
+                    if last_seen:
+                        room.last_seen = max(last_seen)
+                    if partial:
+                        module_status.update((module["id"], module) for module in room_modules)
+                    room.history.append(status_time, room.current_temp, room.target_temp, room.heating_power)
+                    rooms[room_id] = room
+                else:
+                    if not partial or room_id in room_ids:
+                        print(f"Warning: No status found for room {room.id}")
+                    rooms[room_id] = room
+
+            water_heaters = {}
+            for key, water_heater in current.water_heaters.items():
+                matching_water_heater = module_status.get(water_heater.id)
+                if matching_water_heater:
+                    water_heaters[key] = water_heater.with_status(matching_water_heater)
+                    water_heaters[key].updated_at = now
+                else:
+                    if not partial or water_heater.id in module_ids:
+                        print(f"Warning: No status found for water heater {water_heater.id}")
+                    water_heaters[key] = water_heater
+
+            if partial:
+                # A partial merge leaves the time of the last full poll alone
+                self.snapshot = current.replace(
+                    rooms=rooms,
+                    water_heaters=water_heaters,
+                    modules={**current.modules, **module_status},
+                )
             else:
-                print(f"Warning: No status found for water heater {water_heater.id}")
+                self.snapshot = current.replace(
+                    rooms=rooms,
+                    water_heaters=water_heaters,
+                    modules=module_status,
+                    status_time=homestatus.get("time_server"),
+                    updated_at=now,
+                )
 
-        return response.json()
+    def get_freshness(self, now: Optional[float] = None) -> Dict:
+        """
+        Get how fresh the data of each room and water heater is.
+
+        A device is stale when it is disconnected, has not been included in a
+        poll for stale_after seconds, or has not been seen by the cloud for
+        stale_after seconds.
+
+        Args:
+            now (float, optional): Current Unix time
+
+        Returns:
+            Dict: Per room ID and per water heater ID: age (seconds since the last
+                poll including it), last_seen_age, connected and stale
+        """
+        now = time.time() if now is None else now
+        snapshot = self.snapshot
+        return {
+            "rooms": {room.id: self.get_device_freshness(room, now) for room in snapshot.rooms.values()},
+            "water_heaters": {water_heater.id: self.get_device_freshness(water_heater, now)
+                              for water_heater in snapshot.water_heaters.values()},
+        }
+
+    def get_device_freshness(self, device: Union["IntuisRoom", "IntuisWaterHeater"],
+                             now: Optional[float] = None) -> Dict:
+        """
+        Get how fresh the data of one room or water heater is.
+
+        Args:
+            device (IntuisRoom or IntuisWaterHeater): Room or water heater from the snapshot
+            now (float, optional): Current Unix time
+
+        Returns:
+            Dict: age, last_seen_age, connected and stale, as in get_freshness
+        """
+        now = time.time() if now is None else now
+        if isinstance(device, IntuisWaterHeater):
+            connected = device.connection_status in (None, "connected")
+        else:
+            connected = device.reachable is not False
+        age = now - device.updated_at if device.updated_at is not None else None
+        last_seen_age = now - device.last_seen if device.last_seen is not None else None
+        stale = (not connected or age is None or age > self.stale_after
+                 or (last_seen_age is not None and last_seen_age > self.stale_after))
+        return {"age": age, "last_seen_age": last_seen_age, "connected": connected, "stale": stale}
+
+    def refresh_stale(self, now: Optional[float] = None) -> Dict[str, List[str]]:
+        """
+        Refresh only the rooms and water heaters whose data is stale.
+
+        Meant to be called periodically by a watchdog. The homestatus API
+        cannot be asked for single rooms, so the status is fetched for the
+        device types of the stale devices, and every room and module of those
+        types it returns is merged into the snapshot, not only the stale
+        ones. A device is retried at most once per stale_after seconds.
+
+        Args:
+            now (float, optional): Current Unix time
+
+        Returns:
+            Dict[str, List[str]]: Room IDs and water heater IDs that were refreshed
+        """
+        now = time.time() if now is None else now
+        freshness = self.get_freshness(now)
+        # Devices left out of status polling on purpose are not watched either
+        polled_types = self.status_device_types or DEVICE_TYPES
+        if "NMH" not in polled_types:
+            freshness["rooms"] = {}
+        if "NMW" not in polled_types:
+            freshness["water_heaters"] = {}
+        due = {kind: [device_id for device_id, device in devices.items()
+                      if device["stale"] and now - self._watchdog_attempts.get(device_id, 0) >= self.stale_after]
+               for kind, devices in freshness.items()}
+        if not due["rooms"] and not due["water_heaters"]:
+            return due
+        for device_id in due["rooms"] + due["water_heaters"]:
+            self._watchdog_attempts[device_id] = now
+        self.targeted_refreshes += 1
+        # Only ask for the device types of the stale devices, but keep all the fresh data returned
+        device_types = (["NMH"] if due["rooms"] else []) + (["NMW"] if due["water_heaters"] else [])
+        merge_rooms = list(self.snapshot.rooms) if due["rooms"] else []
+        merge_modules = [module_id for module_id, module in self._modules_by_id.items()
+                         if module.get("type") in device_types]
+        self.single_flight.do(
+            ("homestatus", self.home_id, "stale", tuple(device_types)),
+            lambda: self._fetch_homestatus(merge_rooms, merge_modules, device_types),
+        )
+        return due
+
+    def update_local_room(self, room_id: str, **fields: Any) -> "IntuisRoom":
+        """
+        Publish a locally known change to a room, e.g. after a successful command.
+
+        Args:
+            room_id (str): ID of the room to update
+            **fields: IntuisRoom attributes to change (e.g. target_temp, mode)
+
+        Returns:
+            IntuisRoom: The newly published room
+
+        Raises:
+            ValueError: If room_id is not a known room
+        """
+        if room_id not in self.snapshot.rooms:
+            raise ValueError(f"Room ID {room_id} not found")
+        return self.update_local_state(rooms={room_id: fields}).rooms[room_id]
+
+    def update_local_state(self, rooms: Dict[str, Dict] = None,
+                           water_heaters: Dict[str, Dict] = None) -> "IntuisHomeSnapshot":
+        """
+        Publish locally known changes to several rooms and water heaters at once.
+
+        Args:
+            rooms (Dict[str, Dict], optional): IntuisRoom attributes to change, keyed by room ID
+            water_heaters (Dict[str, Dict], optional): IntuisWaterHeater attributes to change,
+                keyed by module ID
+
+        Returns:
+            IntuisHomeSnapshot: The newly published snapshot. Unknown IDs are ignored.
+        """
+        with self._publish_lock:
+            current = self.snapshot
+            new_rooms = dict(current.rooms)
+            for room_id, fields in (rooms or {}).items():
+                if room_id in new_rooms:
+                    new_rooms[room_id] = _copy_with(new_rooms[room_id], fields)
+            new_water_heaters = dict(current.water_heaters)
+            for key, water_heater in current.water_heaters.items():
+                fields = (water_heaters or {}).get(water_heater.id)
+                if fields:
+                    new_water_heaters[key] = _copy_with(water_heater, fields)
+            self.snapshot = current.replace(rooms=new_rooms, water_heaters=new_water_heaters)
+            return self.snapshot
+
+    def get_stats(self) -> Dict:
+        """
+        Get client statistics.
+
+        Returns:
+            Dict: Counters describing request activity
+        """
+        stats = {
+            "single_flight": self.single_flight.get_stats(),
+        }
+        if self.budget is not None:
+            stats["budget"] = self.budget.get_stats()
+        if self.measure_cache is not None:
+            stats["measure_cache"] = self.measure_cache.get_stats()
+        if self.token_store is not None:
+            stats["token_store"] = self.token_store.get_stats()
+        if self.snapshot_writer is not None:
+            stats["snapshots"] = self.snapshot_writer.get_stats()
+        if self.timeline is not None:
+            stats["timeline"] = self.timeline.get_stats()
+        if self.command_tracker is not None:
+            stats["command_latency"] = self.command_tracker.get_stats()
+        freshness = self.get_freshness()
+        ages = [device["age"] for devices in freshness.values() for device in devices.values()
+                if device["age"] is not None]
+        stats["freshness"] = {
+            "stale_rooms": sum(room["stale"] for room in freshness["rooms"].values()),
+            "stale_water_heaters": sum(water_heater["stale"] for water_heater in freshness["water_heaters"].values()),
+            "max_age": max(ages) if ages else None,
+            "targeted_refreshes": self.targeted_refreshes,
+        }
+        return stats
 
     def print_home_info(self) -> None:
         """
         Print information about the home including home name, ID and all rooms.
         """
-        print(f"\nHome Name: {self.homesdata['body']['homes'][0]['name']}")
+        print(f"\nHome Name: {self.home_name}")
         print(f"Home ID: {self.home_id}")
         print("\nRooms:")
         for room in self.rooms.values():
@@ -239,33 +753,159 @@ class IntuisNetatmo:
     def write_debug_files(self) -> None:
         """
         Write homestatus and homesdata to debug JSON files.
+
+        With the "ring" retention mode, the most recent payload of each kind
+        in the debug ring is written instead. With a snapshot_writer set, the
+        payloads are queued as compressed snapshots instead of being written
+        to the working directory, so this returns without waiting for disk.
         """
-        if hasattr(self, 'homestatus'):
-            self.write_json_to_file(self.homestatus, 'homestatus_debug.json')
-        if hasattr(self, 'homesdata'):
-            self.write_json_to_file(self.homesdata, 'homesdata_debug.json')
-        if hasattr(self, 'measures'):
-            self.write_json_to_file(self.measures, 'measures_debug.json')
+        for name in ("homestatus", "homesdata", "measures"):
+            payload = getattr(self, name)
+            if payload is None:
+                payload = self.debug_ring.latest(name)
+            if payload is None:
+                continue
+            if self.snapshot_writer is not None:
+                self.snapshot_writer.submit(name, payload)
+            else:
+                self.write_json_to_file(payload, f'{name}_debug.json')
 
 
-    def get_home_measure(self, scale: str = "30min"):
+    def get_home_measure(self, scale: str = "30min", date_begin: Optional[int] = None,
+                         date_end: Optional[int] = None, room_ids: Optional[List[str]] = None,
+                         types: Optional[List[str]] = None):
         """
-        Get measurements for the home.
+        Get measurements for the home, or for selected rooms and measure types.
+
+        Only the requested rooms and types are asked for, so narrow queries
+        get smaller requests and responses. Concurrent callers asking for the
+        same query share a single in-flight request. With a measure_cache set,
+        only the ranges missing from the cache are requested and the result is
+        built from the cache.
         
         Args:
             scale (str): Time scale for measurements (e.g., "1hour", "1day", "1week")
+            date_begin (int, optional): Unix timestamp of the first bucket. Defaults to 24 hours before date_end.
+            date_end (int, optional): Unix timestamp of the end of the range. Defaults to now.
+            room_ids (List[str], optional): Rooms to measure. Water heaters are measured through
+                their room ID. Defaults to every room and water heater.
+            types (List[str], optional): Measure types to request. Defaults to MEASURE_TYPES.
             
         Returns:
             Dict: Home measurements data
+
+        Raises:
+            ValueError: If the scale, a room ID or a measure type is unknown
         """
-        token = self._get_token()
-        print(token)
+        room_ids, types = self._measure_query(scale, room_ids, types)
+        key = ("gethomemeasure", self.home_id, scale, date_begin, date_end, tuple(room_ids), tuple(types))
+        return self.single_flight.do(key, lambda: self._fetch_home_measure(scale, date_begin, date_end,
+                                                                            room_ids, types))
+
+    def _measure_query(self, scale: str, room_ids: Optional[List[str]],
+                       types: Optional[List[str]]) -> Tuple[List[str], List[str]]:
+        """Validate a measure query, returning its rooms and types with defaults applied"""
+        if scale not in SCALE_SECONDS:
+            raise ValueError(f"Scale must be one of: {', '.join(SCALE_SECONDS)}")
+        # Water heaters are measured through the room they are in
+        known_room_ids = [room.id for room in self.rooms.values()]
+        known_room_ids += [water_heater.room_id for water_heater in self.water_heaters.values()]
+        known_room_ids = list(dict.fromkeys(known_room_ids))
+        if room_ids is None:
+            room_ids = known_room_ids
+        else:
+            room_ids = list(dict.fromkeys(room_ids))
+            for room_id in room_ids:
+                if room_id not in known_room_ids:
+                    raise ValueError(f"Room ID {room_id} not found")
+        if types is None:
+            types = MEASURE_TYPES
+        else:
+            types = list(dict.fromkeys(types))
+            for measure_type in types:
+                if measure_type not in MEASURE_TYPES:
+                    raise ValueError(f"Measure type must be one of: {', '.join(MEASURE_TYPES)}")
+        return room_ids, types
+
+    def iter_home_measure(self, scale: str = "30min", date_begin: Optional[int] = None,
+                          date_end: Optional[int] = None, room_ids: Optional[List[str]] = None,
+                          types: Optional[List[str]] = None) -> Iterator[Tuple[str, str, int, float]]:
+        """
+        Stream measure records for the home, parsing the response as it arrives.
+
+        Unlike get_home_measure, the response is never held in memory as a
+        whole: room entries are decoded one at a time, so memory stays flat
+        for long ranges and fine scales. The cache and single-flight sharing
+        are bypassed, and the records are not kept in self.measures.
+
+        Args:
+            scale (str): Time scale for measurements (e.g., "1hour", "1day", "1week")
+            date_begin (int, optional): Unix timestamp of the first bucket. Defaults to 24 hours before date_end.
+            date_end (int, optional): Unix timestamp of the end of the range. Defaults to now.
+            room_ids (List[str], optional): Rooms to measure. Defaults to every room and water heater.
+            types (List[str], optional): Measure types to request. Defaults to MEASURE_TYPES.
+
+        Returns:
+            Iterator: (room_id, type, timestamp, value) tuples
+
+        Raises:
+            ValueError: If the scale, a room ID or a measure type is unknown,
+                or the response is not valid JSON
+        """
+        room_ids, types = self._measure_query(scale, room_ids, types)
+        date_begin, date_end = _measure_range(date_begin, date_end)
+        with self._span("measure.token"):
+            token = self._get_token()
+        with self._span("measure.request"):
+            response = self._request("POST", f"{self.base_url}/api/gethomemeasure",
+                                     headers={"Authorization": f"Bearer {token}",
+                                              "Content-Type": "application/json"},
+                                     data=json.dumps(self._measure_request_data(scale, date_begin, date_end,
+                                                                                room_ids, types)),
+                                     stream=True)
+        with response:
+            yield from iter_streamed_records(response.iter_content(65536), types)
+
+    def _fetch_home_measure(self, scale: str, date_begin: Optional[int], date_end: Optional[int],
+                            room_ids: List[str], types: List[str]) -> Dict:
+        date_begin, date_end = _measure_range(date_begin, date_end)
+
+        if self.measure_cache is None:
+            measures, size = self._request_home_measure(scale, date_begin, date_end, room_ids, types)
+        else:
+            # Only ask the API for the ranges the cache does not hold yet
+            cache = self.measure_cache
+            for begin, end in cache.missing(self.home_id, room_ids, types, scale, date_begin, date_end):
+                fetched, _ = self._request_home_measure(scale, begin, end, room_ids, types)
+                with self._span("measure.cache_store"):
+                    cache.store(self.home_id, room_ids, types, scale, begin, end, fetched)
+            with self._span("measure.cache_load"):
+                measures = cache.load(self.home_id, room_ids, types, scale, date_begin, date_end)
+            size = None
+        self._retain("measures", measures, size)
+        return measures
+
+    def _request_home_measure(self, scale: str, date_begin: int, date_end: int, room_ids: List[str],
+                              types: List[str]) -> Tuple[Dict, int]:
+        """Request measures from the API, returning the parsed response and its size in bytes"""
+        with self._span("measure.token"):
+            token = self._get_token()
         url = f"{self.base_url}/api/gethomemeasure"
         headers = {"Authorization": f"Bearer {token}",
                    "Content-Type": "application/json"}
+        data = self._measure_request_data(scale, date_begin, date_end, room_ids, types)
+        with self._span("measure.request"):
+            response = self._request("POST", url, headers=headers, data=json.dumps(data))
+        with self._span("measure.parse_json"):
+            measures = response.json()
+        return measures, len(response.content)
+
+    def _measure_request_data(self, scale: str, date_begin: int, date_end: int, room_ids: List[str],
+                              types: List[str]) -> Dict:
+        """Build the gethomemeasure request body"""
         data = {
-            "date_end": int(datetime.now().timestamp()),
-            "date_begin": int((datetime.now() - timedelta(hours=24)).timestamp()),
+            "date_end": date_end,
+            "date_begin": date_begin,
             "app_identifier": "app_muller",
             "scale": scale,
             "real_time": True,
@@ -275,25 +915,13 @@ class IntuisNetatmo:
             }    
         }
         # Add rooms data with bridge and measurement types
-        types = ["sum_energy_elec_hot_water", "sum_energy_elec_heating", "sum_energy_elec", "sum_energy_elec$0", "sum_energy_elec$1", "sum_energy_elec$2"]
-        for room in self.rooms.values():
-            data["home"]["rooms"].append({
-                "id": room.id,
-                "bridge": self.router_id,
-                "type": types
-            })
-        for water_heater in self.water_heaters.values():
+        for room_id in room_ids:
             data["home"]["rooms"].append({
-                "id": water_heater.room_id,
+                "id": room_id,
                 "bridge": self.router_id,
                 "type": types
             })
-        print(data)
-        response = self.session.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        print(response.json())
-        self.measures = response.json()
-        return response.json()
+        return data
 
 
     def set_room_setpoint(self, room_id: str, temp: float, end_time: Optional[int] = None) -> Dict:
@@ -329,8 +957,9 @@ class IntuisNetatmo:
         if end_time:
             data["home"]["rooms"][0]["therm_setpoint_end_time"] = end_time
             
-        response = self.session.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
         return response.json()
 
     def set_room_off(self, room_id: str) -> Dict:
@@ -361,8 +990,9 @@ class IntuisNetatmo:
             }
         }
             
-        response = self.session.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
         return response.json()
 
     def set_room_hg(self, room_id: str) -> Dict:
@@ -393,10 +1023,37 @@ class IntuisNetatmo:
             }
         }
             
-        response = self.session.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
         return response.json()
 
+    def _track_command(self, url: str, data: Dict) -> None:
+        """
+        Start timing a write until a status poll shows it, if a command tracker is set.
+
+        The expected state is read from the request body: the setpoint mode of
+        each room, its temperature for manual setpoints, and the contactor mode
+        of each module.
+
+        Args:
+            url (str): Full URL the command was sent to
+            data (Dict): Request body of the command
+        """
+        if self.command_tracker is None:
+            return
+        rooms = {}
+        for room in data["home"].get("rooms", []):
+            expected = {"therm_setpoint_mode": room["therm_setpoint_mode"]}
+            # Off and frost protection report the device's own minimum, not the one sent
+            if room["therm_setpoint_mode"] == "manual":
+                expected["therm_setpoint_temperature"] = room["therm_setpoint_temperature"]
+            rooms[room["id"]] = expected
+        modules = {module["id"]: {"contactor_mode": module["contactor_mode"]}
+                   for module in data["home"].get("modules", [])}
+        endpoint = url[len(self.base_url):].lstrip("/")
+        self.command_tracker.track(endpoint, self.home_id, rooms=rooms, modules=modules)
+
     def get_room_id_by_name(self, room_name: str) -> str:
         """
         Look up a room's ID by its name.
@@ -410,13 +1067,10 @@ class IntuisNetatmo:
         Raises:
             ValueError: If homesdata has not been loaded yet
         """
-        if not self.homesdata:
+        if self.home_id is None:
             raise ValueError("Must call pull_data() or get_homesdata() first")
             
-        for room in self.homesdata.get("body", {}).get("homes", [{}])[0].get("rooms", []):
-            if room.get("name", "").lower() == room_name.lower():
-                return room.get("id")
-        return None
+        return self._room_ids_by_name.get(room_name.lower())
 
     def set_room_mode(self, room_id: str, mode: str, temperature: float = None) -> Dict:
         """
@@ -460,8 +1114,9 @@ class IntuisNetatmo:
         if mode == "manual":
             data["home"]["rooms"][0]["therm_setpoint_temperature"] = temperature
             
-        response = self.session.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
         return response.json()
 
     def get_room_mode(self, room_id: str) -> Dict:
@@ -477,19 +1132,27 @@ class IntuisNetatmo:
         Raises:
             ValueError: If room_id is not found in homestatus
         """
-        if not self.homestatus:
+        room = self._get_polled_room(room_id)
+        return {
+            "mode": room.mode,
+            "current_temp": room.current_temp,
+            "target_temp": room.target_temp,
+            "end_time": room.end_time
+        }
+
+    def _get_polled_room(self, room_id: str) -> "IntuisRoom":
+        """
+        Get a room from the current snapshot, polling homestatus first if it never was.
+
+        Raises:
+            ValueError: If room_id is not a known room
+        """
+        if self.snapshot.updated_at is None:
             self.get_homestatus()
-            
-        for room in self.homestatus["body"]["home"]["rooms"]:
-            if room["id"] == room_id:
-                return {
-                    "mode": room["therm_setpoint_mode"],
-                    "current_temp": room["therm_measured_temperature"],
-                    "target_temp": room["therm_setpoint_temperature"],
-                    "end_time": room["therm_setpoint_end_time"]
-                }
-                
-        raise ValueError(f"Room ID {room_id} not found")
+        room = self.snapshot.rooms.get(room_id)
+        if room is None:
+            raise ValueError(f"Room ID {room_id} not found")
+        return room
 
     def get_room_setpoint(self, room_id: str) -> Dict:
         """
@@ -504,17 +1167,11 @@ class IntuisNetatmo:
         Raises:
             ValueError: If room_id is not found in homestatus
         """
-        if not self.homestatus:
-            self.get_homestatus()
-            
-        for room in self.homestatus["body"]["home"]["rooms"]:
-            if room["id"] == room_id:
-                return {
-                    "target_temp": room["therm_setpoint_temperature"],
-                    "end_time": room["therm_setpoint_end_time"]
-                }
-                
-        raise ValueError(f"Room ID {room_id} not found")
+        room = self._get_polled_room(room_id)
+        return {
+            "target_temp": room.target_temp,
+            "end_time": room.end_time
+        }
 
     def get_room_temperature(self, room_id: str) -> float:
         """
@@ -529,14 +1186,7 @@ class IntuisNetatmo:
         Raises:
             ValueError: If room_id is not found in homestatus
         """
-        if not self.homestatus:
-            self.get_homestatus()
-            
-        for room in self.homestatus["body"]["home"]["rooms"]:
-            if room["id"] == room_id:
-                return room["therm_measured_temperature"]
-                
-        raise ValueError(f"Room ID {room_id} not found")
+        return self._get_polled_room(room_id).current_temp
 
     def get_water_heater_mode(self, water_heater_id: str) -> str:
         """
@@ -551,12 +1201,12 @@ class IntuisNetatmo:
         Raises:
             ValueError: If water_heater_id is not found in homestatus
         """
-        if not self.homestatus:
+        if self.snapshot.updated_at is None:
             self.get_homestatus()
-            
-        for module in self.homestatus["body"]["home"]["modules"]:
-            if module["id"] == water_heater_id and module["type"] == "NMW":
-                return module["contactor_mode"]
+
+        for water_heater in self.snapshot.water_heaters.values():
+            if water_heater.id == water_heater_id:
+                return water_heater.contactor_mode
                 
         raise ValueError(f"Water heater ID {water_heater_id} not found")
 
@@ -594,10 +1244,169 @@ class IntuisNetatmo:
             }
         }
             
-        response = self.session.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
+        return response.json()
+
+
+    def set_home_mode(self, mode: str, temperature: float = None, room_ids: list = None) -> Dict:
+        """
+        Set the mode of every room of the home in a single request.
+        
+        Args:
+            mode (str): Mode to set - one of: program, away, hg (frost protection), manual
+            temperature (float, optional): Temperature to set if using manual mode
+            room_ids (list, optional): Rooms to change. Defaults to all rooms.
+            
+        Returns:
+            Dict: Response from the API
+            
+        Raises:
+            ValueError: If using manual mode without temperature or invalid mode
+        """
+        valid_modes = ["program", "away", "hg", "manual"]
+        if mode not in valid_modes:
+            raise ValueError(f"Mode must be one of: {', '.join(valid_modes)}")
+            
+        if mode == "manual" and temperature is None:
+            raise ValueError("Temperature must be specified when using manual mode")
+
+        if room_ids is None:
+            room_ids = list(self.rooms)
+        room_state = {"therm_setpoint_mode": mode}
+        if mode == "manual":
+            room_state["therm_setpoint_temperature"] = temperature
+
+        token = self._get_token()
+        url = f"{self.base_url}/api/setroomthermpoint"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "home": {
+                "id": self.home_id,
+                "rooms": [dict(id=room_id, **room_state) for room_id in room_ids]
+            }
+        }
+            
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
+        fields = {"mode": mode}
+        if mode == "manual":
+            fields["target_temp"] = temperature
+        self.update_local_state(rooms={room_id: fields for room_id in room_ids})
         return response.json()
 
+    def set_rooms_setpoints(self, setpoints: Dict[str, float], end_time: Optional[int] = None) -> Dict:
+        """
+        Set manual temperature setpoints for several rooms in a single request.
+        
+        Args:
+            setpoints (Dict[str, float]): Target temperature in Celsius, keyed by room ID
+            end_time (int, optional): Unix timestamp when the setpoints should end. If None, they remain until next schedule.
+            
+        Returns:
+            Dict: Response from the API
+        """
+        token = self._get_token()
+        url = f"{self.base_url}/syncapi/v1/setstate"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+
+        rooms = []
+        for room_id, temp in setpoints.items():
+            room_state = {
+                "id": room_id,
+                "therm_setpoint_mode": "manual",
+                "therm_setpoint_temperature": temp
+            }
+            if end_time:
+                room_state["therm_setpoint_end_time"] = end_time
+            rooms.append(room_state)
+
+        data = {
+            "home": {
+                "id": self.home_id,
+                "rooms": rooms
+            }
+        }
+            
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
+        self.update_local_state(rooms={
+            room_id: {"mode": "manual", "target_temp": temp} for room_id, temp in setpoints.items()
+        })
+        return response.json()
+
+    def set_water_heaters_mode(self, mode: str, water_heater_ids: list = None) -> Dict:
+        """
+        Set the mode of every water heater of the home in a single request.
+        
+        Args:
+            mode (str): Mode to set ('auto' or 'manual')
+            water_heater_ids (list, optional): Water heater module IDs. Defaults to all water heaters.
+            
+        Returns:
+            Dict: Response from the API
+            
+        Raises:
+            ValueError: If mode is not 'auto' or 'manual'
+        """
+        if mode not in ['auto', 'manual']:
+            raise ValueError("Mode must be 'auto' or 'manual'")
+
+        if water_heater_ids is None:
+            water_heater_ids = [water_heater.id for water_heater in self.water_heaters.values()]
+            
+        token = self._get_token()
+        url = f"{self.base_url}/api/setcontactormode"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "home": {
+                "id": self.home_id,
+                "modules": [{
+                    "id": water_heater_id,
+                    "contactor_mode": mode
+                } for water_heater_id in water_heater_ids]
+            }
+        }
+            
+        response = self._request("POST", url, headers=headers, data=json.dumps(data), priority=True)
+        self._track_command(url, data)
+        self.single_flight.forget(("homestatus", self.home_id), prefix=True)
+        self.update_local_state(water_heaters={
+            water_heater_id: {"contactor_mode": mode} for water_heater_id in water_heater_ids
+        })
+        return response.json()
+
+
+def _measure_range(date_begin: Optional[int], date_end: Optional[int]) -> Tuple[int, int]:
+    """Apply the default measure range: the 24 hours up to now"""
+    if date_end is None:
+        date_end = int(datetime.now().timestamp())
+    if date_begin is None:
+        date_begin = date_end - int(timedelta(hours=24).total_seconds())
+    return int(date_begin), int(date_end)
+
+
+def _copy_with(obj: Any, fields: Dict) -> Any:
+    """Return a shallow copy of obj with the given attributes changed"""
+    obj = copy.copy(obj)
+    for name, value in fields.items():
+        setattr(obj, name, value)
+    return obj
+
 
 class IntuisRoom:
     """Class representing an Intuis room thermostat"""
@@ -616,9 +1425,15 @@ class IntuisRoom:
         self.current_temp = None
         self.target_temp = None
         self.mode = None
+        self.end_time = None
         self.heating_power = None
         self.energy_consumption = None
         self.associated_modules = []
+        self.reachable = None
+        self.last_seen = None  # Latest last_seen reported by the room's modules
+        self.updated_at = None  # When a poll last included this room
+        # Polled samples; shared by every copy of this room
+        self.history = RoomHistory()
 
     def update_status(self, room_status: dict) -> None:
         """Update room status from API response
@@ -629,10 +1444,22 @@ class IntuisRoom:
         self.current_temp = room_status.get('therm_measured_temperature')
         self.target_temp = room_status.get('therm_setpoint_temperature') 
         self.mode = room_status.get('therm_setpoint_mode')
+        self.end_time = room_status.get('therm_setpoint_end_time')
         self.heating_power = room_status.get('heating_power_request')
+        self.reachable = room_status.get('reachable', self.reachable)
         if 'energy' in room_status:
             self.energy_consumption = room_status['energy']
 
+    def with_status(self, room_status: dict) -> "IntuisRoom":
+        """Return a copy of this room updated from an API response
+
+        Args:
+            room_status (dict): Room status data from API
+        """
+        room = copy.copy(self)
+        room.update_status(room_status)
+        return room
+
     def add_module(self, module: dict) -> None:
         """Add an associated module to the room
         
@@ -679,6 +1506,7 @@ class IntuisWaterHeater:
         self.firmware_revision = None
         self.last_seen = None
         self.bridge = None
+        self.updated_at = None  # When a poll last included this water heater
 
     def update_status(self, heater_status: dict) -> None:
         """Update water heater status from API response
@@ -693,6 +1521,16 @@ class IntuisWaterHeater:
         self.last_seen = heater_status.get('last_seen')
         self.bridge = heater_status.get('bridge')
 
+    def with_status(self, heater_status: dict) -> "IntuisWaterHeater":
+        """Return a copy of this water heater updated from an API response
+
+        Args:
+            heater_status (dict): Water heater status data from API
+        """
+        water_heater = copy.copy(self)
+        water_heater.update_status(heater_status)
+        return water_heater
+
     def __str__(self) -> str:
         """String representation of water heater status"""
         status = f"Water Heater: {self.id} in room {self.room_id}\n"
@@ -702,4 +1540,206 @@ class IntuisWaterHeater:
         status += f"- Firmware Revision: {self.firmware_revision}\n"
         status += f"- Last Seen: {self.last_seen}\n"
         status += f"- Bridge: {self.bridge}\n"
-        return status
\ No newline at end of file
+        return status
+
+
+class IntuisHomeSnapshot:
+    """Immutable view of a home as of one poll
+
+    A new snapshot is built for every homesdata or homestatus response and
+    published by replacing IntuisNetatmo.snapshot, so a reader that grabs the
+    snapshot once sees rooms, modules and timestamps from the same poll.
+    """
+
+    __slots__ = ("home_id", "home_name", "router_id", "rooms", "water_heaters",
+                 "modules", "status_time", "updated_at")
+
+    def __init__(self, home_id: str = None, home_name: str = None, router_id: str = None,
+                 rooms: Dict = None, water_heaters: Dict = None, modules: Dict = None,
+                 status_time: int = None, updated_at: float = None) -> None:
+        """Initialize the snapshot
+
+        Args:
+            home_id (str): ID of the home
+            home_name (str): Name of the home
+            router_id (str): ID of the NMG gateway module
+            rooms (Dict): IntuisRoom objects keyed by room ID
+            water_heaters (Dict): IntuisWaterHeater objects keyed by room ID
+            modules (Dict): Raw module status keyed by module ID
+            status_time (int): Server timestamp of the homestatus response
+            updated_at (float): Local Unix time the snapshot was built
+        """
+        set_field = object.__setattr__
+        set_field(self, "home_id", home_id)
+        set_field(self, "home_name", home_name)
+        set_field(self, "router_id", router_id)
+        set_field(self, "rooms", MappingProxyType(dict(rooms or {})))
+        set_field(self, "water_heaters", MappingProxyType(dict(water_heaters or {})))
+        set_field(self, "modules", MappingProxyType(dict(modules or {})))
+        set_field(self, "status_time", status_time)
+        set_field(self, "updated_at", updated_at)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("IntuisHomeSnapshot is immutable")
+
+    def replace(self, **changes: Any) -> "IntuisHomeSnapshot":
+        """Return a new snapshot with the given fields replaced"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return IntuisHomeSnapshot(**fields)
+
+
+class DebugRing:
+    """Size-bounded ring of recent raw API payloads, for debugging"""
+
+    def __init__(self, max_entries: int = 10, max_bytes: int = 1_000_000) -> None:
+        """Initialize the ring
+
+        Args:
+            max_entries (int): Most payloads kept
+            max_bytes (int): Most payload bytes kept; the oldest payloads are dropped first
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = deque()  # (name, Unix time, payload, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, payload: Dict, size: Optional[int] = None) -> None:
+        """Add a payload, dropping the oldest ones to stay within bounds
+
+        Args:
+            name (str): Kind of payload (homesdata, homestatus or measures)
+            payload (Dict): The raw payload
+            size (int, optional): Size in bytes. Measured from the JSON encoding if not given.
+        """
+        if size is None:
+            size = len(json.dumps(payload))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._entries.append((name, time.time(), payload, size))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popleft()[3]
+
+    def latest(self, name: str) -> Optional[Dict]:
+        """Return the most recent payload of a kind, or None"""
+        with self._lock:
+            for entry_name, _, payload, _ in reversed(self._entries):
+                if entry_name == name:
+                    return payload
+        return None
+
+    def entries(self) -> list:
+        """Return (name, Unix time, payload) for every payload, oldest first"""
+        with self._lock:
+            return [(name, added, payload) for name, added, payload, _ in self._entries]
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one in-flight call"""
+
+    def __init__(self, freshness_window: float = 0.0) -> None:
+        """Initialize the single-flight group
+
+        Args:
+            freshness_window (float): Seconds a completed result is reused for
+                callers arriving after it finished. 0 disables reuse.
+        """
+        self.freshness_window = freshness_window
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> _Call currently executing
+        self._recent = {}  # key -> (completed monotonic time, result)
+        self.calls = 0
+        self.shared = 0
+        self.fresh_hits = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers using the same key
+
+        Args:
+            key (Hashable): Identity of the call, e.g. endpoint and parameters
+            fn (Callable): Function performing the call
+
+        Returns:
+            Any: Result of fn, shared between all waiters
+
+        Raises:
+            Exception: Whatever fn raised, re-raised in every waiter
+        """
+        with self._lock:
+            if self.freshness_window > 0 and key in self._recent:
+                completed, result = self._recent[key]
+                if time.monotonic() - completed < self.freshness_window:
+                    self.fresh_hits += 1
+                    return result
+                del self._recent[key]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # forget() may have detached this call, and a newer one may own the key
+                if self._in_flight.get(key) is call:
+                    del self._in_flight[key]
+                    if call.error is None and self.freshness_window > 0:
+                        self._recent[key] = (time.monotonic(), call.result)
+            call.done.set()
+        return call.result
+
+    def forget(self, key: Hashable = None, prefix: bool = False) -> None:
+        """Drop remembered results and in-flight calls so the next call fetches again
+
+        Callers already waiting for a forgotten in-flight call still get its
+        result, but callers arriving afterwards start a new call, e.g. so a
+        read started before a write is not shared with readers after it.
+
+        Args:
+            key (Hashable, optional): Key to forget. If None, forget all keys.
+            prefix (bool): Also forget every tuple key starting with the items of key
+        """
+        with self._lock:
+            for calls in (self._recent, self._in_flight):
+                if key is None:
+                    calls.clear()
+                    continue
+                calls.pop(key, None)
+                if prefix:
+                    for forgotten in [forgotten for forgotten in calls
+                                      if isinstance(forgotten, tuple) and forgotten[:len(key)] == key]:
+                        del calls[forgotten]
+
+    def get_stats(self) -> Dict:
+        """Return counters of executed, shared and freshness-window calls"""
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "fresh_hits": self.fresh_hits,
+        }
+
+
+class _Call:
+    """An in-flight single-flight call"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Poll many accounts at once, sharded across a pool of worker processes"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from intuis_netatmo import IntuisNetatmo
+
+# Normalized updates streamed from the workers; only changed devices are sent
+RoomUpdate = namedtuple("RoomUpdate", ["account", "home_id", "room_id", "current_temp", "target_temp",
+                                       "mode", "heating_power", "status_time"])
+WaterHeaterUpdate = namedtuple("WaterHeaterUpdate", ["account", "home_id", "water_heater_id", "contactor_mode",
+                                                     "boiler_status", "status_time"])
+PollError = namedtuple("PollError", ["account", "error", "time"])
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class ShardRing:
+    """Consistent hash ring mapping account keys to shards
+
+    Each shard owns several points on the ring, so accounts spread evenly
+    and changing the number of shards only moves the accounts of the
+    shards added or removed.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64) -> None:
+        """Initialize the ring
+
+        Args:
+            shards (int): Number of shards
+            replicas (int): Points on the ring per shard
+        """
+        if shards < 1:
+            raise ValueError("Number of shards must be at least 1")
+        self.shards = shards
+        points = sorted((_hash(f"{shard}:{replica}"), shard)
+                        for shard in range(shards) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        """Return the shard owning an account key"""
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[index]
+
+    def assign(self, keys: Iterable[str]) -> Dict[int, List[str]]:
+        """Group account keys by the shard owning them"""
+        shards = {shard: [] for shard in range(self.shards)}
+        for key in keys:
+            shards[self.shard_for(key)].append(key)
+        return shards
+
+
+class ShardedPoller:
+    """Polls the status of many accounts across a pool of worker processes
+
+    Accounts are sharded by consistent hashing of their username. Each
+    worker runs an asyncio loop polling its accounts concurrently, with
+    blocking client calls dispatched to a thread pool so every client keeps
+    its own pooled HTTP session. Workers normalize each status into
+    RoomUpdate and WaterHeaterUpdate tuples and send only the ones that
+    changed, batched into one pipe message per flush interval.
+    """
+
+    def __init__(self, accounts: List[Dict], workers: Optional[int] = None, interval: float = 300.0,
+                 concurrency: int = 16, flush_interval: float = 1.0) -> None:
+        """Initialize the poller
+
+        Args:
+            accounts (List[Dict]): Accounts with username, password, client_id, client_secret
+                and optionally base_url
+            workers (int, optional): Worker processes. Defaults to the number of cores.
+            interval (float): Seconds between polls of each account
+            concurrency (int): Polls in flight at once in each worker
+            flush_interval (float): Seconds between update batches sent by each worker
+        """
+        self.accounts = {account["username"]: account for account in accounts}
+        self.workers = min(workers or os.cpu_count() or 1, max(len(self.accounts), 1))
+        self.interval = interval
+        self.concurrency = concurrency
+        self.flush_interval = flush_interval
+        self.ring = ShardRing(self.workers)
+        self.batches = 0
+        self.updates_received = 0
+        self.errors = 0
+        self._processes = []
+        self._connections = []
+        self._stop = None
+
+    def start(self) -> None:
+        """Start the worker processes"""
+        if self._processes:
+            return
+        context = multiprocessing.get_context()
+        self._stop = context.Event()
+        for shard, keys in self.ring.assign(self.accounts).items():
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_worker_main,
+                args=(shard, [self.accounts[key] for key in keys], self.interval, self.concurrency,
+                      self.flush_interval, sender, self._stop),
+                name=f"intuis-poller-{shard}",
+                daemon=True,
+            )
+            process.start()
+            # The parent only reads; closing its copy lets recv() see EOF when a worker exits
+            sender.close()
+            self._processes.append(process)
+            self._connections.append(receiver)
+
+    def updates(self, timeout: Optional[float] = None) -> Iterator[List]:
+        """
+        Yield batches of updates as workers send them.
+
+        Args:
+            timeout (float, optional): Stop after this many seconds without a batch
+
+        Returns:
+            Iterator[List]: Lists of RoomUpdate, WaterHeaterUpdate and PollError tuples
+        """
+        while self._connections:
+            ready = wait(self._connections, timeout)
+            if not ready:
+                return
+            for connection in ready:
+                try:
+                    batch = connection.recv()
+                except EOFError:
+                    self._connections.remove(connection)
+                    continue
+                self.batches += 1
+                self.updates_received += len(batch)
+                self.errors += sum(1 for update in batch if isinstance(update, PollError))
+                yield batch
+
+    def run(self, callback: Callable[[List], None], duration: Optional[float] = None) -> None:
+        """
+        Start the workers and pass every batch to callback.
+
+        Args:
+            callback (Callable): Called with each batch of updates
+            duration (float, optional): Stop after this many seconds. Runs until the workers exit by default.
+        """
+        self.start()
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while self._connections:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                for batch in self.updates(timeout):
+                    callback(batch)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers, terminating any that do not exit within timeout"""
+        if self._stop is not None:
+            self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        for connection in self._connections:
+            connection.close()
+        self._processes = []
+        self._connections = []
+
+    def get_stats(self) -> Dict:
+        """Return worker, batch and update counters"""
+        return {
+            "workers": self.workers,
+            "accounts": len(self.accounts),
+            "batches": self.batches,
+            "updates": self.updates_received,
+            "errors": self.errors,
+        }
+
+
+def _worker_main(shard: int, accounts: List[Dict], interval: float, concurrency: int,
+                 flush_interval: float, connection, stop) -> None:
+    """Entry point of a worker process"""
+    # The client prints progress and warnings, which must not mix with the
+    # update stream the parent may be writing to stdout
+    sys.stdout = sys.stderr
+    try:
+        asyncio.run(_poll_shard(accounts, interval, concurrency, flush_interval, connection, stop))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+
+
+async def _poll_shard(accounts: List[Dict], interval: float, concurrency: int, flush_interval: float,
+                      connection, stop) -> None:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(concurrency, thread_name_prefix="intuis-poll")
+    clients = {}
+    last_sent = {}  # (kind, account, device ID) -> state last sent to the parent
+    outbox = []
+
+    async def poll_account(account: Dict) -> None:
+        key = account["username"]
+        # Spread accounts over the interval instead of polling them all at once
+        await asyncio.sleep(interval * (_hash(key) % 1000) / 1000)
+        while True:
+            started = loop.time()
+            try:
+                updates = await loop.run_in_executor(executor, _poll_account, clients, account)
+            except Exception as e:
+                outbox.append(PollError(key, str(e), time.time()))
+            else:
+                for update in updates:
+                    device = (type(update).__name__, update.account, update[2])
+                    state = update[3:-1]
+                    if last_sent.get(device) != state:
+                        last_sent[device] = state
+                        outbox.append(update)
+            await asyncio.sleep(max(interval - (loop.time() - started), 0))
+
+    async def flush() -> None:
+        while True:
+            await asyncio.sleep(flush_interval)
+            if outbox:
+                batch = outbox[:]
+                del outbox[:]
+                connection.send(batch)
+
+    tasks = [asyncio.ensure_future(poll_account(account)) for account in accounts]
+    tasks.append(asyncio.ensure_future(flush()))
+    while not stop.is_set():
+        await asyncio.sleep(0.2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if outbox:
+        connection.send(outbox)
+    executor.shutdown(wait=False)
+
+
+def _poll_account(clients: Dict[str, IntuisNetatmo], account: Dict) -> List:
+    """Poll one account and return its normalized room and water heater states"""
+    key = account["username"]
+    client = clients.get(key)
+    if client is None:
+        client = IntuisNetatmo(
+            username=account["username"],
+            password=account["password"],
+            client_id=account["client_id"],
+            client_secret=account["client_secret"],
+            **({"base_url": account["base_url"]} if "base_url" in account else {}),
+        )
+        # Raw payloads are never read back, so do not keep them
+        client.retention = "none"
+        client.get_homesdata()
+        clients[key] = client
+    client.get_homestatus()
+    snapshot = client.snapshot
+    updates = [
+        RoomUpdate(key, snapshot.home_id, room.id, room.current_temp, room.target_temp, room.mode,
+                   room.heating_power, snapshot.status_time)
+        for room in snapshot.rooms.values()
+    ]
+    updates += [
+        WaterHeaterUpdate(key, snapshot.home_id, water_heater.id, water_heater.contactor_mode,
+                          water_heater.boiler_status, snapshot.status_time)
+        for water_heater in snapshot.water_heaters.values()
+    ]
+    return updates
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Intuis Netatmo sharded poller')
+    parser.add_argument('accounts', help='JSON file with a list of accounts (username, password, client_id, client_secret)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: number of cores)')
+    parser.add_argument('--interval', type=float, default=300, help='Seconds between polls of each account (default: 300)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Polls in flight per worker (default: 16)')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds (default: run forever)')
+    args = parser.parse_args()
+
+    with open(args.accounts) as f:
+        accounts = json.load(f)
+    poller = ShardedPoller(accounts, workers=args.workers, interval=args.interval, concurrency=args.concurrency)
+
+    def print_batch(batch: List) -> None:
+        for update in batch:
+            print(json.dumps({"kind": type(update).__name__, **update._asdict()}))
+
+    try:
+        poller.run(print_batch, duration=args.duration)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(poller.get_stats()), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Opt-in profiling of IntuisNetatmo phases"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+
+
+class Profiler:
+    """Collects timed spans, and optionally cProfile and tracemalloc data
+
+    Attach to a client with client.profiler = Profiler(). While no profiler
+    is attached the client's spans are a shared no-op context manager.
+    """
+
+    def __init__(self, cprofile: bool = False, trace_allocations: bool = False) -> None:
+        """Initialize the profiler
+
+        Args:
+            cprofile (bool): Also run cProfile between start() and stop()
+            trace_allocations (bool): Also run tracemalloc between start() and stop()
+        """
+        self.cprofile = cprofile
+        self.trace_allocations = trace_allocations
+        self.spans = {}  # name -> [count, total seconds, max seconds]
+        self._lock = threading.Lock()
+        self._profile = None
+        self._allocations = None
+
+    def span(self, name: str) -> "_Span":
+        """Return a context manager timing one phase under the given name"""
+        return _Span(self, name)
+
+    def record(self, name: str, duration: float) -> None:
+        """Add a measured duration to a phase
+
+        Args:
+            name (str): Name of the phase, e.g. 'homestatus.request'
+            duration (float): Duration in seconds
+        """
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, duration, duration]
+            else:
+                span[0] += 1
+                span[1] += duration
+                span[2] = max(span[2], duration)
+
+    def start(self) -> None:
+        """Start cProfile and tracemalloc capture, if enabled"""
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        """Stop cProfile and tracemalloc capture, keeping their results"""
+        if self._profile is not None:
+            self._profile.disable()
+        if self.trace_allocations and tracemalloc.is_tracing():
+            self._allocations = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def get_spans(self) -> Dict[str, Dict]:
+        """Return count, total, mean and max seconds for each phase"""
+        with self._lock:
+            return {
+                name: {"count": count, "total": total, "mean": total / count, "max": longest}
+                for name, (count, total, longest) in self.spans.items()
+            }
+
+    def top_allocations(self, limit: int = 10) -> List[str]:
+        """Return the source lines that allocated the most memory"""
+        if self._allocations is None:
+            return []
+        return [str(stat) for stat in self._allocations.statistics("lineno")[:limit]]
+
+    def report(self, limit: int = 10) -> str:
+        """
+        Format the phase breakdown, top allocations and top cProfile entries.
+
+        Args:
+            limit (int): Number of allocation and cProfile lines to include
+
+        Returns:
+            str: The report
+        """
+        report = "Phase Breakdown:\n"
+        report += f"  {'Phase':<32} {'Count':>6} {'Total ms':>10} {'Mean ms':>10} {'Max ms':>10}\n"
+        spans = sorted(self.get_spans().items(), key=lambda item: item[1]["total"], reverse=True)
+        for name, span in spans:
+            report += (f"  {name:<32} {span['count']:>6} {span['total'] * 1000:>10.1f} "
+                       f"{span['mean'] * 1000:>10.1f} {span['max'] * 1000:>10.1f}\n")
+        allocations = self.top_allocations(limit)
+        if allocations:
+            report += "\nTop Allocations:\n"
+            for allocation in allocations:
+                report += f"  {allocation}\n"
+        if self._profile is not None:
+            stream = io.StringIO()
+            pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(limit)
+            report += "\nTop Functions (cumulative):\n" + stream.getvalue()
+        return report
+
+
+class _Span:
+    """Times one phase and records it on exit"""
+
+    __slots__ = ("_profiler", "_name", "_started")
+
+    def __init__(self, profiler: Profiler, name: str) -> None:
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self) -> "_Span":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._profiler.record(self._name, time.perf_counter() - self._started)
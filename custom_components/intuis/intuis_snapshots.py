@@ -0,0 +1,173 @@
+"""Background writer of compressed, rotating debug snapshots of raw API payloads"""
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+SUFFIX = ".json.gz"
+
+
+class SnapshotWriter:
+    """Writes raw payloads to timestamped gzip files on a background thread
+
+    submit() only puts the payload on a bounded queue, so callers never
+    wait for encoding, compression or disk I/O; when the queue is full the
+    snapshot is dropped and counted instead. Files are named
+    <name>-<UTC timestamp>.json.gz, hold compact JSON, and are rotated
+    oldest first once there are more than max_files or they take more than
+    max_bytes.
+    """
+
+    def __init__(self, directory: str, max_files: int = 200, max_bytes: int = 50_000_000,
+                 sample_every: int = 1, queue_size: int = 64, compresslevel: int = 6) -> None:
+        """Initialize the writer and start its thread
+
+        Args:
+            directory (str): Directory the snapshots are written to; created if needed
+            max_files (int): Most snapshot files kept
+            max_bytes (int): Most bytes of snapshot files kept
+            sample_every (int): Only write every n-th payload of each kind
+            queue_size (int): Payloads waiting to be written before new ones are dropped
+            compresslevel (int): gzip compression level, 1 (fastest) to 9 (smallest)
+        """
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1")
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.sample_every = sample_every
+        self.compresslevel = compresslevel
+        self.written = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.rotated = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self._seen = {}  # Payload kind -> payloads submitted
+        self._lock = threading.Lock()  # Guards the sampling counters
+        self._queue = queue.Queue(queue_size)
+        self._files = None  # (path, size) of existing snapshots, oldest first
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="intuis-snapshots", daemon=True)
+        self._thread.start()
+
+    def submit(self, name: str, payload: Dict, timestamp: Optional[float] = None) -> bool:
+        """
+        Queue a payload to be written, without waiting for it.
+
+        The payload is encoded later on the writer thread, so it must not be
+        modified after it is submitted.
+
+        Args:
+            name (str): Kind of payload (homesdata, homestatus or measures)
+            payload (Dict): The raw payload
+            timestamp (float, optional): Time of the payload. Defaults to now.
+
+        Returns:
+            bool: True if the payload was queued, False if it was sampled out or dropped
+        """
+        with self._lock:
+            seen = self._seen.get(name, 0)
+            self._seen[name] = seen + 1
+        if seen % self.sample_every:
+            self.skipped += 1
+            return False
+        try:
+            self._queue.put_nowait((name, time.time() if timestamp is None else timestamp, payload))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Wait until every queued payload has been written"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write what is queued and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def files(self) -> List[str]:
+        """Return the paths of the snapshots on disk, oldest first"""
+        return [path for path, _ in self._scan()]
+
+    def get_stats(self) -> Dict:
+        """Return counters of written, sampled out, dropped and rotated snapshots"""
+        return {
+            "written": self.written,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "rotated": self.rotated,
+            "errors": self.errors,
+            "bytes_written": self.bytes_written,
+            "queued": self._queue.qsize(),
+        }
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error writing debug snapshot: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, name: str, timestamp: float, payload: Dict) -> None:
+        stamp = datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+        path = os.path.join(self.directory, f"{name}-{stamp}{SUFFIX}")
+        data = gzip.compress(json.dumps(payload, separators=(",", ":")).encode(), self.compresslevel)
+        files = self._scan()
+        # Write under a temporary name so readers never see a partial file
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.written += 1
+        self.bytes_written += len(data)
+        files.append((path, len(data)))
+        self._rotate(files)
+
+    def _scan(self) -> List:
+        """List existing snapshots once; afterwards the list is kept up to date by _write"""
+        if self._files is None:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(SUFFIX):
+                    files.append((entry.stat().st_mtime, entry.path, entry.stat().st_size))
+            self._files = [(path, size) for _, path, size in sorted(files)]
+        return self._files
+
+    def _rotate(self, files: List) -> None:
+        total = sum(size for _, size in files)
+        # Always keep the snapshot just written
+        while len(files) > 1 and (len(files) > self.max_files or total > self.max_bytes):
+            path, size = files.pop(0)
+            total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.rotated += 1
+
+
+def read_snapshot(path: str) -> Dict:
+    """
+    Read a snapshot written by SnapshotWriter.
+
+    Args:
+        path (str): Path of the snapshot file
+
+    Returns:
+        Dict: The raw payload
+    """
+    with gzip.open(path, "rt") as f:
+        return json.load(f)
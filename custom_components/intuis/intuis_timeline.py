@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Append-only binary log of room and module status changes"""
+import argparse
+import bisect
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"ITL1"
+
+# Record header: record type, Unix time, payload length
+HEADER = struct.Struct("<BdI")
+STRING, KEYFRAME, DIFF = range(3)
+# String record payload: string ID, then the UTF-8 bytes
+STRING_ID = struct.Struct("<I")
+# Change: entity kind, entity ID string, field string, value tag; then the value
+CHANGE = struct.Struct("<BIIB")
+ROOM, MODULE = range(2)
+KINDS = {ROOM: "rooms", MODULE: "modules"}
+NONE, FALSE, TRUE, INT, FLOAT, TEXT = range(6)
+INT_VALUE = struct.Struct("<q")
+FLOAT_VALUE = struct.Struct("<d")
+
+# Change tuples yielded by TimelineReader.scan
+Change = Tuple[float, str, str, str, Any]
+
+
+_UNSET = object()
+
+
+def _same(a: Any, b: Any) -> bool:
+    # 1 == 1.0 == True, but a change of type is still a change
+    return type(a) is type(b) and a == b
+
+
+def flatten_homestatus(homestatus: Dict) -> Dict[Tuple[int, str, str], Any]:
+    """
+    Flatten the scalar fields of rooms and modules in a homestatus response.
+
+    Args:
+        homestatus (Dict): Response from the homestatus endpoint
+
+    Returns:
+        Dict: Value of each (entity kind, entity ID, field)
+    """
+    home = homestatus.get("body", {}).get("home", {})
+    state = {}
+    for kind, entities in ((ROOM, home.get("rooms", [])), (MODULE, home.get("modules", []))):
+        for entity in entities:
+            entity_id = entity.get("id")
+            if entity_id is None:
+                continue
+            for field, value in entity.items():
+                if field != "id" and (value is None or isinstance(value, (bool, int, float, str))):
+                    state[(kind, entity_id, field)] = value
+    return state
+
+
+class TimelineWriter:
+    """Appends status changes to a binary timeline file
+
+    Each appended status only writes the fields that changed since the
+    previous one. A keyframe holding every known field is written first
+    and then every keyframe_every records or keyframe_interval seconds, so
+    readers never replay more than that many diffs. Entity IDs, field names
+    and text values are written once to a string table and then referred to
+    by number.
+
+    Polls filtered by device type or room only update what they contain;
+    entities missing from a response keep their last recorded values.
+    """
+
+    def __init__(self, path: str, keyframe_every: int = 256, keyframe_interval: float = 86400.0) -> None:
+        """Open the timeline, creating it or appending to an existing one
+
+        A record left incomplete by a crash is cut off before appending.
+
+        Args:
+            path (str): Path of the timeline file
+            keyframe_every (int): Diff records between keyframes
+            keyframe_interval (float): Most seconds between keyframes
+        """
+        self.path = path
+        self.keyframe_every = keyframe_every
+        self.keyframe_interval = keyframe_interval
+        self.records = 0
+        self.keyframes = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._state = {}
+        self._strings = {}  # String -> ID
+        self._since_keyframe = None  # Forces a keyframe first
+        self._last_keyframe = 0.0
+        self._last_time = 0.0
+        if os.path.exists(path) and os.path.getsize(path):
+            reader = TimelineReader(path)
+            self._strings = {string: string_id for string_id, string in enumerate(reader.strings)}
+            self._state = reader.final_state()
+            self._last_time = reader.end_time or 0.0
+            end = reader.end
+            reader.close()
+            self._file = open(path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+            self._file.flush()
+
+    def append(self, homestatus: Dict, timestamp: Optional[float] = None) -> int:
+        """
+        Record what changed in a homestatus response.
+
+        Args:
+            homestatus (Dict): Response from the homestatus endpoint
+            timestamp (float, optional): Time of the status. Defaults to the
+                response's time_server, or now.
+
+        Returns:
+            int: Number of fields written
+        """
+        if timestamp is None:
+            timestamp = homestatus.get("time_server") or time.time()
+        status = flatten_homestatus(homestatus)
+        with self._lock:
+            # Readers bisect on time, so it must never go backwards
+            timestamp = max(timestamp, self._last_time)
+            self._last_time = timestamp
+            changes = {key: value for key, value in status.items() if not _same(self._state.get(key, _UNSET), value)}
+            self._state.update(status)
+            keyframe = (self._since_keyframe is None or self._since_keyframe >= self.keyframe_every
+                        or timestamp - self._last_keyframe >= self.keyframe_interval)
+            if keyframe:
+                changes = self._state
+            elif not changes:
+                return 0
+            out = bytearray()
+            payload = bytearray()
+            for (kind, entity_id, field), value in changes.items():
+                entity = self._intern(entity_id, timestamp, out)
+                name = self._intern(field, timestamp, out)
+                payload += self._encode(kind, entity, name, value, timestamp, out)
+            out += HEADER.pack(KEYFRAME if keyframe else DIFF, timestamp, len(payload)) + payload
+            self._file.write(out)
+            self._file.flush()
+            if keyframe:
+                self._since_keyframe = 0
+                self._last_keyframe = timestamp
+                self.keyframes += 1
+            else:
+                self._since_keyframe += 1
+            self.records += 1
+            self.bytes_written += len(out)
+            return len(changes)
+
+    def close(self) -> None:
+        """Close the file"""
+        with self._lock:
+            self._file.close()
+
+    def get_stats(self) -> Dict:
+        """Return counters of records, keyframes and bytes written"""
+        return {"records": self.records, "keyframes": self.keyframes, "bytes_written": self.bytes_written}
+
+    def _intern(self, string: str, timestamp: float, out: bytearray) -> int:
+        """Return the ID of a string, adding a string record to out the first time"""
+        string_id = self._strings.get(string)
+        if string_id is None:
+            string_id = self._strings[string] = len(self._strings)
+            data = STRING_ID.pack(string_id) + string.encode()
+            out += HEADER.pack(STRING, timestamp, len(data)) + data
+        return string_id
+
+    def _encode(self, kind: int, entity: int, field: int, value: Any, timestamp: float, out: bytearray) -> bytes:
+        if value is None:
+            return CHANGE.pack(kind, entity, field, NONE)
+        if isinstance(value, bool):
+            return CHANGE.pack(kind, entity, field, TRUE if value else FALSE)
+        if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+            return CHANGE.pack(kind, entity, field, INT) + INT_VALUE.pack(value)
+        if isinstance(value, (int, float)):
+            return CHANGE.pack(kind, entity, field, FLOAT) + FLOAT_VALUE.pack(value)
+        return CHANGE.pack(kind, entity, field, TEXT) + STRING_ID.pack(self._intern(value, timestamp, out))
+
+
+class TimelineReader:
+    """Reads a timeline written by TimelineWriter
+
+    Opening the file reads the record headers and the string table only;
+    record payloads are read when needed. The index of record times and
+    offsets lets state_at start from the nearest keyframe and scan skip
+    straight to the start of a range.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open a timeline and index its records
+
+        Args:
+            path (str): Path of the timeline file
+
+        Raises:
+            ValueError: If the file is not a timeline
+        """
+        self.path = path
+        self.strings = []
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not an Intuis timeline")
+        self._times = []  # Time of each keyframe and diff record
+        self._offsets = []  # Offset of each record's payload
+        self._sizes = []
+        self._keyframes = []  # Index into the lists above of each keyframe
+        self._keyframe_times = []
+        self.end = len(MAGIC)  # End of the last complete record
+        self._index()
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    @property
+    def start_time(self) -> Optional[float]:
+        """Time of the first record, or None if empty"""
+        return self._times[0] if self._times else None
+
+    @property
+    def end_time(self) -> Optional[float]:
+        """Time of the last record, or None if empty"""
+        return self._times[-1] if self._times else None
+
+    def state_at(self, timestamp: float) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Reconstruct the home as it was at a point in time.
+
+        Args:
+            timestamp (float): Unix time
+
+        Returns:
+            Dict: {"rooms": {room ID: {field: value}}, "modules": {module ID: {field: value}}},
+                empty before the first keyframe
+        """
+        position = bisect.bisect_right(self._keyframe_times, timestamp) - 1
+        state = {name: {} for name in KINDS.values()}
+        if position < 0:
+            return state
+        first = self._keyframes[position]
+        last = bisect.bisect_right(self._times, timestamp)
+        for index in range(first, last):
+            for kind, entity_id, field, value in self._changes(index):
+                state[kind].setdefault(entity_id, {})[field] = value
+        return state
+
+    def scan(self, begin: Optional[float] = None, end: Optional[float] = None,
+             entity_ids: Optional[List[str]] = None, fields: Optional[List[str]] = None) -> Iterator[Change]:
+        """
+        Yield the changes recorded in a time range.
+
+        Keyframes only yield the fields that differ from the previous record.
+
+        Args:
+            begin (float, optional): Start of the range, inclusive. Defaults to the first record.
+            end (float, optional): End of the range, exclusive. Defaults to after the last record.
+            entity_ids (List[str], optional): Only yield changes of these rooms or modules
+            fields (List[str], optional): Only yield changes of these fields
+
+        Returns:
+            Iterator[Change]: (timestamp, "rooms" or "modules", entity ID, field, value) tuples
+        """
+        first = 0 if begin is None else bisect.bisect_left(self._times, begin)
+        last = len(self._times) if end is None else bisect.bisect_left(self._times, end)
+        if first >= last:
+            return
+        entity_ids = None if entity_ids is None else set(entity_ids)
+        fields = None if fields is None else set(fields)
+        # Start from the state before the range so keyframes only yield real changes
+        previous = self.state_at(self._times[first - 1]) if first else {name: {} for name in KINDS.values()}
+        for index in range(first, last):
+            timestamp = self._times[index]
+            for kind, entity_id, field, value in self._changes(index):
+                values = previous[kind].setdefault(entity_id, {})
+                if _same(values.get(field, _UNSET), value):
+                    continue
+                values[field] = value
+                if (entity_ids is None or entity_id in entity_ids) and (fields is None or field in fields):
+                    yield timestamp, kind, entity_id, field, value
+
+    def final_state(self) -> Dict[Tuple[int, str, str], Any]:
+        """Return the last recorded value of every field, keyed like flatten_homestatus"""
+        kinds = {name: kind for kind, name in KINDS.items()}
+        state = self.state_at(self._times[-1]) if self._times else {}
+        return {
+            (kinds[name], entity_id, field): value
+            for name, entities in state.items()
+            for entity_id, values in entities.items()
+            for field, value in values.items()
+        }
+
+    def close(self) -> None:
+        """Close the file"""
+        self._file.close()
+
+    def _index(self) -> None:
+        size = os.fstat(self._file.fileno()).st_size
+        offset = len(MAGIC)
+        while offset + HEADER.size <= size:
+            self._file.seek(offset)
+            record_type, timestamp, length = HEADER.unpack(self._file.read(HEADER.size))
+            payload_offset = offset + HEADER.size
+            if payload_offset + length > size:
+                break  # Cut off by a crash while writing
+            if record_type == STRING:
+                data = self._file.read(length)
+                string_id, = STRING_ID.unpack_from(data)
+                if string_id != len(self.strings):
+                    raise ValueError(f"Corrupt string table in {self.path} at offset {offset}")
+                self.strings.append(data[STRING_ID.size:].decode())
+            else:
+                if record_type == KEYFRAME:
+                    self._keyframes.append(len(self._times))
+                    self._keyframe_times.append(timestamp)
+                self._times.append(timestamp)
+                self._offsets.append(payload_offset)
+                self._sizes.append(length)
+            offset = payload_offset + length
+            self.end = offset
+
+    def _changes(self, index: int) -> Iterator[Tuple[str, str, str, Any]]:
+        """Decode the changes of one keyframe or diff record"""
+        self._file.seek(self._offsets[index])
+        data = self._file.read(self._sizes[index])
+        strings = self.strings
+        position = 0
+        while position < len(data):
+            kind, entity, field, tag = CHANGE.unpack_from(data, position)
+            position += CHANGE.size
+            if tag == INT:
+                value, = INT_VALUE.unpack_from(data, position)
+                position += INT_VALUE.size
+            elif tag == FLOAT:
+                value, = FLOAT_VALUE.unpack_from(data, position)
+                position += FLOAT_VALUE.size
+            elif tag == TEXT:
+                value = strings[STRING_ID.unpack_from(data, position)[0]]
+                position += STRING_ID.size
+            else:
+                value = (None, False, True)[tag]
+            yield KINDS[kind], strings[entity], strings[field], value
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Intuis Netatmo status timeline reader')
+    parser.add_argument('timeline', help='Timeline file written by the client')
+    parser.add_argument('--at', type=float, help='Print the state at this Unix time')
+    parser.add_argument('--begin', type=float, default=None, help='Print changes from this Unix time')
+    parser.add_argument('--end', type=float, default=None, help='Print changes until this Unix time')
+    parser.add_argument('--entity', action='append', metavar='ID', help='Only print changes of this room or module (repeatable)')
+    parser.add_argument('--field', action='append', help='Only print changes of this field (repeatable)')
+    args = parser.parse_args()
+
+    reader = TimelineReader(args.timeline)
+    try:
+        if args.at is not None:
+            print(json.dumps(reader.state_at(args.at), indent=2))
+        else:
+            for change in reader.scan(args.begin, args.end, args.entity, args.field):
+                print(json.dumps(change))
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
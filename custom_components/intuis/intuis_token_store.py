@@ -0,0 +1,163 @@
+"""Access and refresh tokens shared between processes through a locked file"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+
+def token_store_key(username: str, client_id: str) -> str:
+    """
+    Key tokens by account and client without storing the username itself.
+
+    Args:
+        username (str): Intuis account username
+        client_id (str): Intuis client ID
+
+    Returns:
+        str: Hex digest identifying the credentials
+    """
+    return hashlib.sha256(f"{username.lower()}\0{client_id}".encode()).hexdigest()
+
+
+class TokenStore:
+    """File of tokens shared by every process using the same credentials
+
+    The file is only readable by its owner and is replaced atomically on
+    every update. Renewals hold an exclusive lock on a companion .lock
+    file, and the token is read again once the lock is held, so when
+    several processes find the token expired exactly one of them renews it
+    and the others pick up its result.
+    """
+
+    def __init__(self, path: str, margin: float = 60.0) -> None:
+        """Initialize the store
+
+        Args:
+            path (str): Path of the token file
+            margin (float): Seconds before expiry at which a token is renewed
+
+        Raises:
+            RuntimeError: If file locking is not available on this platform
+        """
+        if fcntl is None:
+            raise RuntimeError("The token store needs fcntl file locking, which this platform does not provide")
+        self.path = path
+        self.margin = margin
+        self.renewals = 0
+        self.shared = 0
+        self._lock_path = path + ".lock"
+        self._thread_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the stored token for a key, valid or not, or None"""
+        return self._read().get(key)
+
+    def put(self, key: str, result: Dict, now: Optional[float] = None) -> Dict:
+        """
+        Store a token response.
+
+        Args:
+            key (str): Key from token_store_key
+            result (Dict): Token response with access_token, refresh_token and optionally expires_in
+            now (float, optional): Time the token was issued
+
+        Returns:
+            Dict: The stored entry with access_token, refresh_token and expires_at
+        """
+        with self._locked():
+            return self._put(key, result, now)
+
+    def get_token(self, key: str, renew: Callable[[Optional[Dict]], Dict]) -> Dict:
+        """
+        Return a valid token, renewing it in exactly one process if needed.
+
+        Args:
+            key (str): Key from token_store_key
+            renew (Callable): Called with the expired entry (or None) while the
+                lock is held; returns a new token response
+
+        Returns:
+            Dict: Entry with access_token, refresh_token and expires_at
+        """
+        entry = self.get(key)
+        if self._valid(entry):
+            self.shared += 1
+            return entry
+        with self._locked():
+            # Another process may have renewed while we waited for the lock
+            entry = self._read().get(key)
+            if self._valid(entry):
+                self.shared += 1
+                return entry
+            entry = self._put(key, renew(entry))
+            self.renewals += 1
+            return entry
+
+    def clear(self, key: Optional[str] = None) -> None:
+        """Forget the token for a key, or every token"""
+        with self._locked():
+            tokens = self._read() if key is not None else {}
+            tokens.pop(key, None)
+            self._write(tokens)
+
+    def get_stats(self) -> Dict:
+        """Return how often a token was renewed or reused from the store"""
+        return {"renewals": self.renewals, "shared": self.shared}
+
+    def _valid(self, entry: Optional[Dict]) -> bool:
+        return bool(entry and entry.get("access_token") and time.time() < entry["expires_at"] - self.margin)
+
+    def _put(self, key: str, result: Dict, now: Optional[float] = None) -> Dict:
+        now = time.time() if now is None else now
+        entry = {
+            "access_token": result.get("access_token"),
+            "refresh_token": result.get("refresh_token"),
+            # Assume the token expires in 1 hour unless told otherwise
+            "expires_at": now + result.get("expires_in", 3600),
+        }
+        tokens = self._read()
+        tokens[key] = entry
+        self._write(tokens)
+        return entry
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # flock is per open file, so this also excludes other threads
+        with self._thread_lock:
+            fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                if os.fstat(f.fileno()).st_uid != os.getuid():
+                    print(f"Warning: Ignoring token store {self.path} owned by another user")
+                    return {}
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print(f"Warning: Ignoring unreadable token store {self.path}")
+            return {}
+
+    def _write(self, tokens: Dict) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(tokens, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from intuis_analytics import HEATING, HOT_WATER, TOTAL, MeasureSeries, TimeOfUseTariff
+from intuis_measures import iter_measure_records
+
+HOUR = 3600
+SATURDAY = 2 * 86400  # 1970-01-03
+
+MEASURES = {"body": {"home": {"rooms": [
+    # Columns follow the room's type list; 1970-01-01 was a Thursday
+    {"id": "A", "type": [TOTAL, HEATING], "measures": [
+        {"beg_time": 0, "step_time": HOUR, "value": [[1000, 800], [2000, None], [None, 500]]},
+    ]},
+    # One type per chunk
+    {"id": "B", "measures": [
+        {"beg_time": SATURDAY, "step_time": HOUR, "type": HOT_WATER, "value": [[300], [700]]},
+        {"beg_time": SATURDAY, "step_time": HOUR, "type": TOTAL, "value": [[100], [None], [400]]},
+        {"beg_time": SATURDAY, "step_time": HOUR, "type": "sum_energy_elec$1", "value": [[250]]},
+    ]},
+]}}}
+
+OFF_PEAK = TimeOfUseTariff(0.20, [("22:00", "06:00", 0.10)], weekend_price=0.15)
+SHORT_PEAK = TimeOfUseTariff(0.20, [("00:30", "01:30", 0.50)])
+
+
+@pytest.fixture
+def series():
+    return MeasureSeries.from_measures(MEASURES)
+
+
+def test_loads_the_same_records_as_the_record_path(series):
+    records = MeasureSeries.from_records(iter_measure_records(MEASURES))
+
+    assert len(series) == len(records) == 9
+    for measure_type in (TOTAL, HEATING, HOT_WATER, "sum_energy_elec$1"):
+        assert series.per_room(measure_type) == records.per_room(measure_type)
+
+
+def test_falls_back_for_uneven_rows():
+    measures = {"body": {"home": {"rooms": [{"id": "A", "type": [TOTAL, HEATING], "measures": [
+        {"beg_time": 0, "step_time": HOUR, "value": [[1, 2], [3], 4]},
+    ]}]}}}
+
+    series = MeasureSeries.from_measures(measures)
+
+    assert sorted(zip(series.timestamps.tolist(), series.values.tolist())) == [(0, 1.0), (0, 2.0), (3600, 3.0), (7200, 4.0)]
+    assert series.per_room(HEATING) == {"A": 2.0}
+
+
+def test_per_room_and_split(series):
+    assert series.per_room() == {"A": 3000.0, "B": 500.0}
+    assert series.per_tariff_period() == {"sum_energy_elec$1": {"A": 0.0, "B": 250.0}}
+    assert series.heating_hot_water_split() == pytest.approx(
+        {"heating": 1300.0, "hot_water": 1000.0, "heating_share": 1300 / 2300})
+
+
+def test_per_day(series):
+    day_starts, totals = series.per_day()
+    assert day_starts.tolist() == [0, SATURDAY]
+    assert totals.tolist() == [3000.0, 500.0]
+
+    # At UTC-2, Thursday's buckets fall on Wednesday and Saturday's first one on Friday
+    day_starts, totals = series.per_day(utc_offset=-2 * HOUR)
+    assert day_starts.tolist() == [-86400 + 2 * HOUR, 86400 + 2 * HOUR, SATURDAY + 2 * HOUR]
+    assert totals.tolist() == [3000.0, 100.0, 400.0]
+
+    day_starts, totals = series.per_room_day()
+    assert day_starts.tolist() == [0, 86400, SATURDAY]
+    assert totals.tolist() == [[3000.0, 0.0, 0.0], [0.0, 0.0, 500.0]]
+
+
+def test_load_profile_and_peaks(series):
+    timestamps, load = series.load_profile(HOUR)
+    assert timestamps[0] == 0 and len(load) == 51
+    assert np.flatnonzero(load).tolist() == [0, 1, 48, 50]
+    assert load.sum() == 3500.0
+
+    assert series.peak_windows(2 * HOUR, HOUR, top=2) == [(0, 3000.0), (HOUR, 2000.0)]
+
+
+def test_tariff_prices():
+    # Thursday 00:00 and 12:00, then Saturday 12:00
+    assert OFF_PEAK.prices(np.array([0, 12 * HOUR, SATURDAY + 12 * HOUR])).tolist() == [0.10, 0.20, 0.15]
+    assert SHORT_PEAK.prices(np.array([0, HOUR, 2 * HOUR])).tolist() == [0.20, 0.50, 0.20]
+    # Local time is UTC+1, so 23:00 UTC is already past the 22:00-23:59 window
+    assert TimeOfUseTariff(0.20, [("22:00", "23:59", 0.10)], utc_offset=HOUR).prices(np.array([23 * HOUR])).tolist() == [0.20]
+
+
+def test_costs(series):
+    # A: 1 kWh and 2 kWh off-peak at 0.10; B: 0.1 kWh and 0.4 kWh on Saturday at 0.15
+    assert series.cost(OFF_PEAK) == pytest.approx({"A": 0.30, "B": 0.075, "total": 0.375})
+    # A: 1 kWh at 0.20 and 2 kWh at 0.50; B: 0.5 kWh at 0.20
+    assert series.cost(SHORT_PEAK) == pytest.approx({"A": 1.20, "B": 0.10, "total": 1.30})
+    # Heating: 0.8 kWh and 0.5 kWh off-peak; hot water: 1 kWh on Saturday
+    assert series.cost_split(OFF_PEAK) == pytest.approx({"heating": 0.13, "hot_water": 0.15})
+
+
+def test_empty_series():
+    series = MeasureSeries.from_measures({})
+
+    assert len(series) == 0
+    assert series.per_room() == {}
+    assert series.peak_windows(HOUR) == []
@@ -0,0 +1,21 @@
+import time
+
+from intuis_budget import RequestBudget
+
+
+def test_priority_requests_do_not_wait_but_delay_the_next_slot():
+    budget = RequestBudget(quota=10, window=1.0, safety_margin=0.0)
+    assert budget.acquire()
+    assert not budget.acquire(blocking=False)
+
+    started = time.monotonic()
+    assert budget.acquire(priority=True)
+    assert budget.acquire(priority=True)
+    assert time.monotonic() - started < 0.05
+
+    # The two priority requests took the next two slots
+    started = time.monotonic()
+    assert budget.acquire()
+    assert time.monotonic() - started >= 0.25
+    assert budget.get_stats()["requests"] == 4
+    assert budget.get_stats()["priority_requests"] == 2
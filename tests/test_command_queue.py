@@ -0,0 +1,121 @@
+import requests
+
+from intuis_command_queue import DROPPED, QUEUED, SENT, CommandQueue
+
+
+class FakeClient:
+    """Records sent commands; raises the queued errors first"""
+
+    def __init__(self):
+        self.sent = []
+        self.errors = []
+
+    def _send(self, name, target_id, **params):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((name, target_id, params))
+        return {"status": "ok"}
+
+    def set_room_setpoint(self, room_id, temp, end_time=None):
+        return self._send("set_room_setpoint", room_id, temp=temp)
+
+    def set_room_mode(self, room_id, mode, temperature=None):
+        if mode not in ["program", "away", "hg", "manual"]:
+            raise ValueError("Mode must be one of: program, away, hg, manual")
+        return self._send("set_room_mode", room_id, mode=mode)
+
+
+def test_replays_pending_commands_after_restart(tmp_path):
+    path = str(tmp_path / "commands.jsonl")
+    client = FakeClient()
+    client.errors = [requests.ConnectionError("offline")]
+    queue = CommandQueue(client, path)
+
+    assert queue.submit("room_setpoint", "r1", temp=20.0) == QUEUED
+    assert len(queue.pending()) == 1
+
+    # A new process replays the command from the log
+    client = FakeClient()
+    queue = CommandQueue(client, path)
+    assert queue.flush() == 1
+    assert client.sent == [("set_room_setpoint", "r1", {"temp": 20.0})]
+    assert CommandQueue(FakeClient(), path).pending() == []
+
+
+def test_coalesces_commands_per_room(tmp_path):
+    client = FakeClient()
+    queue = CommandQueue(client, str(tmp_path / "commands.jsonl"))
+
+    queue.enqueue("room_setpoint", "r1", temp=19.0)
+    queue.enqueue("room_setpoint", "r2", temp=18.0)
+    queue.enqueue("room_mode", "r1", mode="program")
+
+    assert queue.flush() == 2
+    assert client.sent == [
+        ("set_room_setpoint", "r2", {"temp": 18.0}),
+        ("set_room_mode", "r1", {"mode": "program"}),
+    ]
+
+
+def test_drops_invalid_commands_without_blocking_the_queue(tmp_path):
+    path = str(tmp_path / "commands.jsonl")
+    client = FakeClient()
+    queue = CommandQueue(client, path)
+
+    assert queue.submit("room_mode", "r1", mode="off") == DROPPED
+    assert queue.submit("room_setpoint", "r2", temp=21.0) == SENT
+    assert queue.get_stats()["dropped"] == 1
+    assert client.sent == [("set_room_setpoint", "r2", {"temp": 21.0})]
+    # The dropped command is not replayed after a restart
+    assert CommandQueue(FakeClient(), path).pending() == []
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"HTTP {status}", response=response)
+
+
+def test_drops_commands_rejected_by_the_api(tmp_path):
+    client = FakeClient()
+    client.errors = [http_error(400)]
+    queue = CommandQueue(client, str(tmp_path / "commands.jsonl"))
+
+    assert queue.submit("room_setpoint", "r1", temp=20.0) == DROPPED
+    assert queue.pending() == []
+    assert queue.get_stats()["dropped"] == 1
+
+
+def test_retries_commands_after_an_auth_error(tmp_path):
+    for status in (401, 403):
+        client = FakeClient()
+        client.errors = [http_error(status)]
+        queue = CommandQueue(client, str(tmp_path / f"commands-{status}.jsonl"), base_backoff=0.0)
+
+        assert queue.submit("room_setpoint", "r1", temp=20.0) == QUEUED
+        assert queue.get_stats()["dropped"] == 0
+        assert queue.flush() == 1
+        assert client.sent == [("set_room_setpoint", "r1", {"temp": 20.0})]
+
+
+def test_retries_commands_after_other_request_errors(tmp_path):
+    client = FakeClient()
+    client.errors = [requests.exceptions.ChunkedEncodingError("connection broken")]
+    queue = CommandQueue(client, str(tmp_path / "commands.jsonl"), base_backoff=60.0)
+
+    assert queue.submit("room_setpoint", "r1", temp=20.0) == QUEUED
+    # Backing off: nothing is sent before the next attempt is due
+    assert queue.flush() == 0
+    queue.next_attempt = 0.0
+    assert queue.flush() == 1
+    assert queue.get_stats()["dropped"] == 0
+
+
+def test_sends_only_the_latest_queued_command(tmp_path):
+    client = FakeClient()
+    client.errors = [requests.ConnectionError("offline")]
+    queue = CommandQueue(client, str(tmp_path / "commands.jsonl"), base_backoff=0.0)
+
+    assert queue.submit("room_setpoint", "r1", temp=19.0) == QUEUED
+    assert queue.submit("room_setpoint", "r1", temp=21.0) == SENT
+    assert client.sent == [("set_room_setpoint", "r1", {"temp": 21.0})]
@@ -0,0 +1,58 @@
+import csv
+import glob
+import os
+
+import pytest
+
+from intuis_export import MeasureExporter
+from intuis_measures import SCALE_SECONDS
+
+
+class FakeClient:
+    """Yields one record per bucket; raises after crash_after records if set"""
+
+    home_id = "h1"
+    measure_cache = None
+
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+
+    def iter_home_measure(self, scale, date_begin, date_end):
+        step = SCALE_SECONDS[scale]
+        for timestamp in range(date_begin, date_end, step):
+            if self.crash_after is not None:
+                if self.crash_after == 0:
+                    raise ConnectionError("connection lost")
+                self.crash_after -= 1
+            yield "r1", "sum_energy_elec", timestamp, float(timestamp // step)
+
+
+def read_rows(directory):
+    rows = {}
+    for path in glob.glob(os.path.join(directory, "*", "*", "*", "measures.csv")):
+        with open(path, newline="") as f:
+            rows[os.path.relpath(path, directory)] = list(csv.reader(f))[1:]
+    return rows
+
+
+@pytest.mark.parametrize("crash_after", [2, 10])
+def test_resume_after_a_crash_mid_window_writes_no_duplicates(tmp_path, crash_after):
+    directory = str(tmp_path)
+    with pytest.raises(ConnectionError):
+        MeasureExporter(FakeClient(crash_after), directory, window_buckets=4).export(0, 12 * 3600, "1hour")
+
+    assert MeasureExporter(FakeClient(), directory, window_buckets=4).export(0, 12 * 3600, "1hour") == 12 - crash_after // 4 * 4
+    rows = read_rows(directory)["home_id=h1/scale=1hour/month=1970-01/measures.csv"]
+    assert [int(row[3]) for row in rows] == list(range(0, 12 * 3600, 3600))
+
+
+def test_scales_are_exported_to_separate_partitions(tmp_path):
+    directory = str(tmp_path)
+    MeasureExporter(FakeClient(), directory).export(0, 2 * 86400, "1day")
+    MeasureExporter(FakeClient(), directory).export(0, 2 * 86400, "1hour")
+
+    rows = read_rows(directory)
+    assert len(rows["home_id=h1/scale=1day/month=1970-01/measures.csv"]) == 2
+    assert len(rows["home_id=h1/scale=1hour/month=1970-01/measures.csv"]) == 48
+    # Each scale resumes on its own
+    assert MeasureExporter(FakeClient(), directory).export(0, 3 * 86400, "1day") == 1
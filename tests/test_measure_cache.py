@@ -0,0 +1,111 @@
+from intuis_measure_cache import MeasureCache, _merge, _subtract
+
+DAY = 86400
+NOW = 1_700_000_000
+TYPES = ["sum_energy_elec"]
+
+
+def response(room_id, begin, values, step=3600):
+    return {"body": {"home": {"rooms": [{
+        "id": room_id,
+        "measures": [{"beg_time": begin, "step_time": step, "type": "sum_energy_elec",
+                      "value": [[value] for value in values]}],
+    }]}}}
+
+
+def coverage(cache):
+    return cache._conn.execute(
+        "SELECT home_id, room_id, scale, date_begin, date_end, expires_at IS NULL FROM coverage "
+        "ORDER BY home_id, room_id, scale, date_begin"
+    ).fetchall()
+
+
+def test_subtract():
+    assert _subtract((0, 100), []) == [(0, 100)]
+    assert _subtract((0, 100), [(0, 100)]) == []
+    assert _subtract((0, 100), [(-50, 20), (40, 60), (90, 200)]) == [(20, 40), (60, 90)]
+    assert _subtract((0, 100), [(20, 40)]) == [(0, 20), (40, 100)]
+
+
+def test_merge():
+    assert _merge([]) == []
+    assert _merge([(50, 60), (0, 10), (10, 20), (5, 15)]) == [(0, 20), (50, 60)]
+
+
+def test_hits_after_a_closed_range_is_stored(tmp_path):
+    cache = MeasureCache(str(tmp_path / "cache.db"))
+    begin = NOW - 2 * DAY
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin, begin + 6 * 3600, now=NOW) == [(begin, begin + 6 * 3600)]
+
+    cache.store("h1", ["r1"], TYPES, "1hour", begin, begin + 6 * 3600, response("r1", begin, [1, 2, None, 4]), now=NOW)
+
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin, begin + 6 * 3600, now=NOW) == []
+    assert cache.missing("h1", ["r1", "r2"], TYPES, "1hour", begin, begin + 7200, now=NOW) == [(begin, begin + 7200)]
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin - 3600, begin + 7 * 3600, now=NOW) == [
+        (begin - 3600, begin), (begin + 6 * 3600, begin + 7 * 3600)]
+    assert cache.get_stats() == {"hits": 1, "misses": 3, "buckets": 3}
+    chunks = cache.load("h1", ["r1"], TYPES, "1hour", begin, begin + 6 * 3600)["body"]["home"]["rooms"][0]["measures"]
+    assert [(chunk["beg_time"], chunk["value"]) for chunk in chunks] == [(begin, [[1], [2]]), (begin + 3 * 3600, [[4]])]
+
+
+def test_touching_closed_ranges_are_merged(tmp_path):
+    cache = MeasureCache(str(tmp_path / "cache.db"))
+    begin = NOW - 2 * DAY
+    cache.store("h1", ["r1"], TYPES, "1hour", begin, begin + 3600, response("r1", begin, [1]), now=NOW)
+    cache.store("h1", ["r1"], TYPES, "1hour", begin + 3600, begin + 7200, response("r1", begin + 3600, [2]), now=NOW)
+
+    assert coverage(cache) == [("h1", "r1", "1hour", begin, begin + 7200, 1)]
+
+
+def test_open_tail_expires(tmp_path):
+    cache = MeasureCache(str(tmp_path / "cache.db"), open_ttl=300)
+    begin = NOW - 4 * 3600
+    cache.store("h1", ["r1"], TYPES, "1hour", begin, NOW, response("r1", begin, [1, 2, 3, 4]), now=NOW)
+
+    # Closed up to one bucket before the fetch, open after it
+    assert coverage(cache) == [
+        ("h1", "r1", "1hour", begin, NOW - 3600, 1),
+        ("h1", "r1", "1hour", NOW - 3600, NOW + 300, 0),
+    ]
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin, NOW + 60, now=NOW + 60) == []
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin, NOW + 60, now=NOW + 301) == [(NOW - 3600, NOW + 60)]
+
+    # A later fetch replaces the open bucket, but not the closed ones
+    cache.store("h1", ["r1"], TYPES, "1hour", begin, NOW, response("r1", begin, [9, 9, 9, 5]), now=NOW + 301)
+    values = cache.load("h1", ["r1"], TYPES, "1hour", begin, NOW)["body"]["home"]["rooms"][0]["measures"][0]["value"]
+    assert values == [[1], [2], [3], [5]]
+
+
+def test_old_queries_are_not_evicted_when_stored(tmp_path):
+    cache = MeasureCache(str(tmp_path / "cache.db"), max_age=400 * DAY)
+    begin = NOW - 500 * DAY
+    cache.store("h1", ["r1"], TYPES, "1hour", begin, begin + 7200, response("r1", begin, [1, 2]), now=NOW)
+    cache.store("h1", ["r1"], TYPES, "1hour", NOW - DAY, NOW - DAY + 3600, response("r1", NOW - DAY, [3]), now=NOW + 1)
+
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin, begin + 7200, now=NOW + 2) == []
+    assert cache.get_stats()["buckets"] == 3
+
+
+def test_evicts_by_fetch_time_and_forgets_the_evicted_range(tmp_path):
+    cache = MeasureCache(str(tmp_path / "cache.db"), max_age=10 * DAY)
+    begin = NOW - 20 * DAY
+    cache.store("h1", ["r1"], TYPES, "1hour", begin, begin + 7200, response("r1", begin, [1, 2]), now=NOW)
+    cache.store("h1", ["r1"], TYPES, "1hour", begin + 7200, begin + 10800, response("r1", begin + 7200, [3]),
+                now=NOW + 5 * DAY)
+
+    assert cache.evict(now=NOW + 11 * DAY) == 2
+    assert cache.get_stats()["buckets"] == 1
+    assert cache.missing("h1", ["r1"], TYPES, "1hour", begin, begin + 10800, now=NOW + 11 * DAY) == [
+        (begin, begin + 7200)]
+
+
+def test_max_rows_only_forgets_the_evicted_rooms_and_scales(tmp_path):
+    cache = MeasureCache(str(tmp_path / "cache.db"), max_age=None, max_rows=2)
+    begin = NOW - 2 * DAY
+    cache.store("h1", ["r1"], TYPES, "1day", begin, begin + DAY, response("r1", begin, [1], step=DAY), now=NOW)
+    cache.store("h2", ["r2"], TYPES, "1hour", begin, begin + 7200, response("r2", begin, [2, 3]), now=NOW + 1)
+
+    # The least recently fetched bucket goes, whatever its timestamp
+    assert cache.get_stats()["buckets"] == 2
+    assert coverage(cache) == [("h2", "r2", "1hour", begin, begin + 7200, 1)]
+    assert cache.missing("h2", ["r2"], TYPES, "1hour", begin, begin + 7200, now=NOW + 2) == []
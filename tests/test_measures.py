@@ -0,0 +1,115 @@
+import io
+import json
+import time
+
+import pytest
+import requests
+
+from intuis_measures import iter_json_array, iter_measure_records, iter_streamed_records
+from intuis_netatmo import IntuisNetatmo
+
+TYPES = ["sum_energy_elec", "sum_energy_elec$0", "sum_energy_elec$1"]
+
+PAYLOAD = {
+    "status": "ok",
+    "body": {
+        "home": {
+            "id": "h1",
+            "name": "Maison d'été \"\\ ☃",
+            "extra": {"rooms": [{"id": "decoy"}], "nested": [[1, 2], {"a": None}]},
+            "rooms": [
+                {
+                    "id": "r1",
+                    "type": TYPES,
+                    "measures": [
+                        {"beg_time": 1700000000, "step_time": 1800,
+                         "value": [[12.5, 1e-3, None], [123456789, -0.25, 7]]},
+                        {"beg_time": 1700007200, "step_time": 1800, "value": [[0, None, 3.14159]]},
+                    ],
+                },
+                {
+                    "id": "réè-2",
+                    "measures": [
+                        {"beg_time": 1700000000, "step_time": 3600, "type": "sum_energy_elec",
+                         "value": [[1.0], [None], [2.5e2]]},
+                    ],
+                },
+                {"id": "r3", "measures": []},
+            ],
+        },
+    },
+    "time_server": 1700010000,
+}
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 13, 64, None])
+def test_streamed_records_match_the_parsed_response(size):
+    body = json.dumps(PAYLOAD, ensure_ascii=False, indent=1).encode()
+    expected = list(iter_measure_records(json.loads(body), TYPES))
+
+    records = list(iter_streamed_records(chunked(body, size or len(body)), TYPES))
+
+    assert records == expected
+    assert len(records) == 9
+
+
+@pytest.mark.parametrize("size", [1, 5, None])
+def test_streams_compact_and_escaped_json(size):
+    body = json.dumps(PAYLOAD, separators=(",", ":")).encode()
+
+    rooms = list(iter_json_array(chunked(body, size or len(body)), ("body", "home", "rooms")))
+
+    assert rooms == PAYLOAD["body"]["home"]["rooms"]
+
+
+def test_streams_empty_and_missing_arrays():
+    assert list(iter_json_array([b'{"body": {"home": {"rooms": [ ]}}}'], ("body", "home", "rooms"))) == []
+    assert list(iter_json_array([b'{"body": {"home": {}}, "status": "ok"}'], ("body", "home", "rooms"))) == []
+
+
+@pytest.mark.parametrize("cut", [10, 200, -30, -1])
+def test_truncated_body_raises(cut):
+    body = json.dumps(PAYLOAD).encode()[:cut]
+
+    with pytest.raises(ValueError):
+        list(iter_streamed_records(chunked(body, 7), TYPES))
+
+
+def test_invalid_json_raises():
+    with pytest.raises(ValueError):
+        list(iter_streamed_records([b'{"body": {"home": {"rooms": [{"id": "r1",}]}}}'], TYPES))
+
+
+class FakeSession:
+    """Answers every request with the same body, streamed from raw like a real response"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(self.body)
+        return response
+
+
+def test_iter_home_measure_streams_the_response():
+    client = IntuisNetatmo("user", "password", "id", "secret", base_url="http://intuis.invalid")
+    client.load_homesdata({"body": {"homes": [{
+        "id": "h1",
+        "name": "Home",
+        "modules": [{"id": "m1", "type": "NMH", "name": "Radiator"}],
+        "rooms": [{"id": "r1", "name": "Living", "type": "livingroom", "module_ids": ["m1"]}],
+    }]}})
+    client.token = "token"
+    client.token_expiry = time.time() + 3600
+    body = json.dumps(PAYLOAD).encode()
+    client.session = FakeSession(body)
+
+    records = list(client.iter_home_measure("30min", 1700000000, 1700010000, types=TYPES))
+
+    assert records == list(iter_measure_records(PAYLOAD, TYPES))
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from intuis_netatmo import IntuisNetatmo, SingleFlight
+
+HOMESTATUS = {
+    "body": {"home": {"id": "h1", "rooms": [{"id": "r1", "therm_measured_temperature": 19.5,
+                                             "therm_setpoint_temperature": 20.0,
+                                             "therm_setpoint_mode": "schedule"}],
+                      "modules": [{"id": "m1", "type": "NMH"}]}},
+    "time_server": 1700000000,
+}
+
+
+class BlockingSession:
+    """Counts requests per endpoint; homestatus requests wait until released"""
+
+    def __init__(self):
+        self.requests = {}
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def count(self, endpoint):
+        with self._lock:
+            return self.requests.get(endpoint, 0)
+
+    def request(self, method, url, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if endpoint == "homestatus":
+            assert self.release.wait(5)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(HOMESTATUS if endpoint == "homestatus" else {"status": "ok"}).encode()
+        return response
+
+
+@pytest.fixture
+def client():
+    client = IntuisNetatmo("user", "password", "id", "secret", base_url="http://intuis.invalid")
+    client.load_homesdata({"body": {"homes": [{
+        "id": "h1",
+        "name": "Home",
+        "modules": [{"id": "m1", "type": "NMH", "name": "Radiator"}],
+        "rooms": [{"id": "r1", "name": "Living", "type": "livingroom", "module_ids": ["m1"]}],
+    }]}})
+    client.token = "token"
+    client.token_expiry = time.time() + 3600
+    client.session = BlockingSession()
+    return client
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def run(target, count):
+    results = [None] * count
+
+    def call(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_reads_share_one_request(client):
+    threads, results = run(client.get_homestatus, 20)
+    wait_for(lambda: client.single_flight.shared == 19)
+    client.session.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert client.session.count("homestatus") == 1
+    assert all(result is results[0] for result in results)
+    assert client.snapshot.rooms["r1"].current_temp == 19.5
+
+
+def test_errors_reach_every_waiter():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("API down")
+
+    threads, results = run(lambda: single_flight.do("key", fail), 10)
+    wait_for(lambda: single_flight.shared == 9)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "API down" for result in results)
+    # A failed call is not remembered
+    assert single_flight.do("key", lambda: "ok") == "ok"
+
+
+def test_write_detaches_an_in_flight_read(client):
+    before, _ = run(client.get_homestatus, 1)
+    wait_for(lambda: client.session.count("homestatus") == 1)
+
+    client.set_room_setpoint("r1", 21.0)
+    after, _ = run(client.get_homestatus, 1)
+
+    # The read after the write does not join the one started before it
+    wait_for(lambda: client.session.count("homestatus") == 2)
+    client.session.release.set()
+    for thread in before + after:
+        thread.join()
+    assert client.single_flight.get_stats()["calls"] == 2
+
+
+def test_write_forgets_recent_reads(client):
+    client.single_flight.freshness_window = 60.0
+    client.session.release.set()
+    client.get_homestatus()
+    client.get_homestatus()
+    assert client.session.count("homestatus") == 1
+
+    client.set_room_setpoint("r1", 21.0)
+    client.get_homestatus()
+
+    assert client.session.count("homestatus") == 2
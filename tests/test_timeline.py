@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from intuis_timeline import TimelineReader, TimelineWriter
+
+
+def status(rooms, modules=()):
+    return {"body": {"home": {"rooms": list(rooms), "modules": list(modules)}}}
+
+
+STATUSES = [
+    (100.0, status([{"id": "r1", "therm_measured_temperature": 19.5, "therm_setpoint_mode": "schedule",
+                     "reachable": True, "heating_power_request": 0, "anticipating": None}],
+                   [{"id": "m1", "boiler_status": False, "last_seen": 99, "rf_strength": 2 ** 70,
+                     "nested": {"ignored": 1}}])),
+    (200.0, status([{"id": "r1", "therm_measured_temperature": 20.0, "therm_setpoint_mode": "schedule",
+                     "reachable": True, "heating_power_request": 0, "anticipating": None}])),
+    (300.0, status([{"id": "r1", "therm_measured_temperature": 20.0, "therm_setpoint_mode": "manual",
+                     "reachable": True, "heating_power_request": 1.0, "anticipating": None},
+                    {"id": "r2", "therm_measured_temperature": 17.0}])),
+    (400.0, status([{"id": "r1", "therm_measured_temperature": 20.0, "therm_setpoint_mode": "manual",
+                     "reachable": False, "heating_power_request": 1.0, "anticipating": None}],
+                   [{"id": "m1", "boiler_status": True, "last_seen": 399}])),
+]
+
+R1_AT_300 = {"therm_measured_temperature": 20.0, "therm_setpoint_mode": "manual", "reachable": True,
+             "heating_power_request": 1.0, "anticipating": None}
+M1_AT_100 = {"boiler_status": False, "last_seen": 99, "rf_strength": float(2 ** 70)}
+
+
+def write(path, statuses, **kwargs):
+    writer = TimelineWriter(path, **kwargs)
+    for timestamp, homestatus in statuses:
+        writer.append(homestatus, timestamp)
+    writer.close()
+
+
+@pytest.mark.parametrize("keyframe_every", [1, 2, 256])
+def test_state_at_round_trips(tmp_path, keyframe_every):
+    path = str(tmp_path / "timeline.itl")
+    write(path, STATUSES, keyframe_every=keyframe_every)
+    reader = TimelineReader(path)
+
+    assert len(reader) == 4
+    assert (reader.start_time, reader.end_time) == (100.0, 400.0)
+    assert reader.state_at(50.0) == {"rooms": {}, "modules": {}}
+    assert reader.state_at(250.0)["rooms"]["r1"]["therm_measured_temperature"] == 20.0
+    state = reader.state_at(300.0)
+    assert state["rooms"] == {"r1": R1_AT_300, "r2": {"therm_measured_temperature": 17.0}}
+    # Modules missing from a poll keep their last values
+    assert state["modules"] == {"m1": M1_AT_100}
+    assert reader.state_at(1000.0)["modules"]["m1"]["boiler_status"] is True
+    reader.close()
+
+
+def test_scan_yields_changes_only(tmp_path):
+    path = str(tmp_path / "timeline.itl")
+    write(path, STATUSES, keyframe_every=2)
+    reader = TimelineReader(path)
+
+    assert list(reader.scan(200.0, 400.0)) == [
+        (200.0, "rooms", "r1", "therm_measured_temperature", 20.0),
+        (300.0, "rooms", "r1", "therm_setpoint_mode", "manual"),
+        # 0 -> 1.0 changes type, so it is a change
+        (300.0, "rooms", "r1", "heating_power_request", 1.0),
+        (300.0, "rooms", "r2", "therm_measured_temperature", 17.0),
+    ]
+    assert list(reader.scan(entity_ids=["m1"], fields=["boiler_status"])) == [
+        (100.0, "modules", "m1", "boiler_status", False),
+        (400.0, "modules", "m1", "boiler_status", True),
+    ]
+    assert list(reader.scan(500.0)) == []
+    reader.close()
+
+
+def test_unchanged_status_writes_nothing(tmp_path):
+    path = str(tmp_path / "timeline.itl")
+    writer = TimelineWriter(path)
+    assert writer.append(STATUSES[0][1], 100.0) == 8
+    size = os.path.getsize(path)
+    assert writer.append(STATUSES[0][1], 200.0) == 0
+    writer.close()
+
+    assert os.path.getsize(path) == size
+
+
+@pytest.mark.parametrize("cut", [1, 5, 13, 20])
+def test_reopening_cuts_off_a_torn_record(tmp_path, cut):
+    path = str(tmp_path / "timeline.itl")
+    write(path, STATUSES[:3], keyframe_every=256)
+    # The last record introduces r2 and "manual", so the cut may also tear string records
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - cut)
+
+    reader = TimelineReader(path)
+    assert len(reader) == 2
+    assert reader.end <= os.path.getsize(path)
+    reader.close()
+
+    write(path, STATUSES[2:])
+    reader = TimelineReader(path)
+    assert reader.end == os.path.getsize(path)
+    assert [reader.state_at(timestamp)["rooms"]["r1"]["therm_measured_temperature"]
+            for timestamp in (100.0, 200.0, 300.0, 400.0)] == [19.5, 20.0, 20.0, 20.0]
+    state = reader.state_at(300.0)
+    assert state["rooms"] == {"r1": R1_AT_300, "r2": {"therm_measured_temperature": 17.0}}
+    assert state["modules"] == {"m1": M1_AT_100}
+    assert reader.state_at(400.0)["rooms"]["r1"]["reachable"] is False
+    assert [change[0] for change in reader.scan(fields=["therm_setpoint_mode"])] == [100.0, 300.0]
+    reader.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "timeline.itl"
+    path.write_bytes(b"not a timeline")
+
+    with pytest.raises(ValueError):
+        TimelineReader(str(path))